@@ -1,36 +1,142 @@
-from flask import Flask, render_template, request, jsonify, send_file, make_response
+from flask import Flask, Request, current_app, render_template, request, jsonify, send_file, make_response, Response, stream_with_context
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from PIL import Image
 import os
-import tempfile
 import uuid
 from datetime import datetime
 from image_captioner import ImageCaptioner
 from description_generator import DescriptionGenerator
+from history_export import EXPORT_FORMATS, append_history, stream_export
+from history_cold import cold_dir_for
+from history_sync import HistorySync
+from history_stats import HistoryStats
+from history_search import HistorySearchIndex
+from history_columns import HistoryColumns
+from image_quality import assess_image_quality
+from image_hash import ImageHashIndex, phash
+from image_encoding import encode_for_storage
+from video_ingest import MAX_VIDEO_BYTES, VIDEO_EXTENSIONS, aggregate_claim, assess_keyframes, check_video_file, extract_keyframes, spool_video
+from scoring_rules import default_store as default_rules_store
+from cost_engine import PORTFOLIO_GROUPS
+from claim_report import render_claim_pdf, report_filename, resolve_report_fields
+from bulk_reports import DEFAULT_WORKERS as DEFAULT_REPORT_WORKERS, ReportJobs
+from claim_bundle import BundleCache
+from model_server import ModelServerUnavailable, connect_models
+from claim_scheduler import ClaimScheduler, SchedulerOverloaded, pre_score, priority_level, region_key
+from upload_ingest import MAX_IMAGE_PIXELS, UploadRejected, decode_image, read_upload
+from chunked_upload import DEFAULT_CHUNK_BYTES, UPLOAD_ID_PATTERN, ChunkedUploads, UploadSessionError
+from idempotency import SKIPPED_HEADERS, IdempotencyError, IdempotencyStore, is_replayable, request_fingerprint
+from object_storage import CACHE_MAX_BYTES, ObjectNotFound, open_storage, storage_modules
+from sampling_profiler import MAX_SECONDS as MAX_PROFILE_SECONDS, MEMORY_AREAS, ProfilerBusy, memory_growth, sample_stacks, to_collapsed, to_speedscope
 import json
 import base64
-import cv2
+import hashlib
+import hmac
+import subprocess
+import sys
+import time
 import re
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 from textwrap import wrap
-from reportlab.lib import colors
+from lazy_imports import lazy_module, load_all
+
+# Heavy modules are imported on first use so workers start fast (see preload())
+cv2 = lazy_module('cv2')
+
+# Routes that take a whole walk-around video in one request body
+VIDEO_UPLOAD_ENDPOINTS = {'upload_file'}
+
+
+class ClaimRequest(Request):
+    """Request whose body limit depends on the route: videos only where they are accepted"""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in VIDEO_UPLOAD_ENDPOINTS:
+            # The multipart envelope and claim fields come on top of the video itself
+            return current_app.config['MAX_VIDEO_BYTES'] + 1024 * 1024
+        return current_app.config['MAX_CONTENT_LENGTH']
+
 
 app = Flask(__name__)
+app.request_class = ClaimRequest
 app.secret_key = 'your-secret-key-here-make-it-random'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # Largest request body elsewhere (e.g. /download-pdf with a 16MB image)
+app.config['MAX_IMAGE_BYTES'] = 16 * 1024 * 1024  # 16MB max image size
+app.config['MAX_VIDEO_BYTES'] = MAX_VIDEO_BYTES
+app.config['VIDEO_MAX_KEYFRAMES'] = 8
+app.config['VIDEO_ASSESS_WORKERS'] = 4
+app.config['MAX_IMAGE_PIXELS'] = MAX_IMAGE_PIXELS  # Reject decompression bombs before decoding
+
+# Stored image encoding policy (see image_encoding.encode_for_storage)
+app.config['IMAGE_JPEG_QUALITY'] = 85
+app.config['IMAGE_PROGRESSIVE_JPEG'] = True
+app.config['IMAGE_PASSTHROUGH_MAX_BYTES'] = 5 * 1024 * 1024
+app.config['IMAGE_MAX_SIDE'] = 4096
+app.config['IMAGE_QUALITY_GATE'] = True  # Reject unusable photos before captioning
+
+# Shared model server (python model_server.py); unset to load models in every worker
+app.config['MODEL_SERVER_SOCKET'] = os.environ.get('MODEL_SERVER_SOCKET')
+
+# Priority scheduler in front of assessments and PDFs (limits are per worker process)
+app.config['SCHEDULER_WORKERS'] = int(os.environ.get('SCHEDULER_WORKERS', 4))  # concurrent heavy requests
+app.config['SCHEDULER_MAX_QUEUE'] = int(os.environ.get('SCHEDULER_MAX_QUEUE', 64))  # beyond this: 429
+app.config['SCHEDULER_MAX_WAIT'] = 30.0  # seconds in queue before giving up with 429
+
+# Bulk PDF jobs (python bulk_reports.py for the CLI)
+app.config['BULK_REPORT_WORKERS'] = int(os.environ.get('BULK_REPORT_WORKERS', DEFAULT_REPORT_WORKERS))
+
+# Resumable uploads (/api/uploads); session state lives on local disk
+app.config['UPLOAD_CHUNK_BYTES'] = DEFAULT_CHUNK_BYTES  # suggested to clients that don't pick a size
+
+# Idempotency-Key on /upload and /download-pdf: retries reuse the original response
+app.config['IDEMPOTENCY_TTL'] = 3600  # seconds a finished response is kept for its key
+app.config['IDEMPOTENCY_WAIT'] = 60.0  # seconds a retry waits on the in-flight original
+
+# History page reads the columnar history (history_columns.py), a page at a time
+app.config['HISTORY_PAGE_SIZE'] = 200
+
+# Object storage for uploads and bulk report ZIPs (object_storage.open_storage). Setting
+# STORAGE_URL (e.g. s3://bucket/claiminsight?endpoint=http://minio:9000) also shares
+# history between app nodes; unset, everything stays on this machine under data/
+app.config['STORAGE_URL'] = os.environ.get('STORAGE_URL')
+app.config['STORAGE_CACHE_BYTES'] = int(os.environ.get('STORAGE_CACHE_BYTES', CACHE_MAX_BYTES))  # read-through cache
+app.config['HISTORY_SYNC_SECONDS'] = 5.0  # how often a node pulls other nodes' assessments
+
+# /debug/profile samples the worker process serving the request (run threaded workers to see
+# other requests); disabled unless a token is set, sent as "Authorization: Bearer <token>"
+app.config['DEBUG_PROFILE_TOKEN'] = os.environ.get('DEBUG_PROFILE_TOKEN')
+
+# Modules a worker will need that are not imported at startup; preload() warms them
+PRELOAD_MODULES = ['cv2', 'numpy', 'PIL.Image', 'PIL.ImageOps', 'reportlab.pdfgen.canvas', 'reportlab.lib.utils']
+# Optional ones warmed when installed (scipy speeds up batch scoring)
+PRELOAD_OPTIONAL_MODULES = ['scipy.sparse']
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Claim fields sent with an upload (form fields on /upload, 'fields' on /api/uploads)
+UPLOAD_FORM_FIELDS = (
+    'damage_type', 'custom_damage', 'policy_holder_name', 'contact_email', 'contact_phone',
+    'property_address', 'city', 'state', 'zip_code'
+)
+
 # Initialize models (cached)
 captioner = None
 desc_generator = None
+history_stats = None
+search_index = None
+history_columns = None
+hash_index = None
+scheduler = None
+report_jobs = None
+bundle_cache = None
+chunked_uploads = None
+idempotency_store = None
+storage = None
+history_sync = None
 
-# Ensure upload and history directories exist
-os.makedirs('uploads', exist_ok=True)
+# Ensure the data directory exists
 os.makedirs('data', exist_ok=True)
 
 HISTORY_FILE = 'data/detection_history.json'
@@ -43,29 +149,243 @@ if not os.path.exists(HISTORY_FILE):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def is_video_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS
+
 def get_models():
     """Initialize models only when needed"""
     global captioner, desc_generator
     if captioner is None or desc_generator is None:
-        captioner = ImageCaptioner()
-        desc_generator = DescriptionGenerator()
+        if app.config['MODEL_SERVER_SOCKET']:
+            # Proxies fall back to in-process models if the sidecar is down
+            captioner, desc_generator = connect_models(app.config['MODEL_SERVER_SOCKET'])
+        else:
+            captioner = ImageCaptioner()
+            desc_generator = DescriptionGenerator()
     return captioner, desc_generator
 
-def load_history():
+def get_history_stats():
+    """Load (or backfill) the precomputed history aggregates once"""
+    global history_stats
+    if history_stats is None:
+        history_stats = HistoryStats(history_path=HISTORY_FILE)
+    return history_stats
+
+def get_search_index():
+    """Open (or backfill) the full-text search index once"""
+    global search_index
+    if search_index is None:
+        search_index = HistorySearchIndex(history_path=HISTORY_FILE)
+    return search_index
+
+def get_history_columns():
+    """Compact memory-mapped history for the history page and analytics; refreshed on each use"""
+    global history_columns
+    if history_columns is None:
+        history_columns = HistoryColumns(history_path=HISTORY_FILE)
+    else:
+        history_columns.refresh()
+    return history_columns
+
+def get_hash_index():
+    """Load the perceptual-hash index used for duplicate photo detection"""
+    global hash_index
+    if hash_index is None:
+        hash_index = ImageHashIndex()
+    return hash_index
+
+def get_scheduler():
+    """Priority scheduler shared by the assessment and PDF endpoints"""
+    global scheduler
+    if scheduler is None:
+        scheduler = ClaimScheduler(
+            workers=app.config['SCHEDULER_WORKERS'],
+            max_queue=app.config['SCHEDULER_MAX_QUEUE'],
+            max_wait=app.config['SCHEDULER_MAX_WAIT']
+        )
+    return scheduler
+
+def get_report_jobs():
+    """Background bulk-report job runner"""
+    global report_jobs
+    if report_jobs is None:
+        report_jobs = ReportJobs(history_path=HISTORY_FILE, workers=app.config['BULK_REPORT_WORKERS'],
+                                 storage=get_storage())
+    return report_jobs
+
+def get_bundle_cache():
+    """On-disk cache of per-claim evidence bundles"""
+    global bundle_cache
+    if bundle_cache is None:
+        bundle_cache = BundleCache()
+    return bundle_cache
+
+def get_chunked_uploads():
+    """Resumable upload sessions; assembled files are kept in object storage under uploads/"""
+    global chunked_uploads
+    if chunked_uploads is None:
+        chunked_uploads = ChunkedUploads(storage=get_storage())
+    return chunked_uploads
+
+def get_storage():
+    """Object storage from STORAGE_URL (local data/storage when unset)"""
+    global storage
+    if storage is None:
+        storage = open_storage(app.config['STORAGE_URL'], cache_bytes=app.config['STORAGE_CACHE_BYTES'])
+    return storage
+
+def get_history_sync():
+    """History shared through object storage, or None when STORAGE_URL is unset (single node)"""
+    global history_sync
+    if history_sync is None and app.config['STORAGE_URL']:
+        history_sync = HistorySync(get_storage(), history_path=HISTORY_FILE)
+    return history_sync
+
+def get_idempotency_store():
+    """Idempotency-Key -> response table shared by all worker processes"""
+    global idempotency_store
+    if idempotency_store is None:
+        idempotency_store = IdempotencyStore(ttl=app.config['IDEMPOTENCY_TTL'], wait_seconds=app.config['IDEMPOTENCY_WAIT'])
+    return idempotency_store
+
+def idempotent(fingerprint, view, key=None, replayable=is_replayable):
+    """
+    Run view() once per Idempotency-Key header value (per endpoint and tenant),
+    or per key when one is given. A retry waits for the original and gets its
+    stored response, marked with Idempotent-Replayed. fingerprint() is only
+    called when there is a key; replayable(status) picks responses to keep.
+    """
+    key = key or request.headers.get('Idempotency-Key')
+    if not key:
+        return view()
+    
+    def compute():
+        response = make_response(view())
+        return {
+            'status': response.status_code,
+            'headers': [(k, v) for k, v in response.headers if k.lower() not in SKIPPED_HEADERS],
+            'body': response.get_data()
+        }
+    
+    scope = f"{request.path}|{request.headers.get('X-Tenant-ID', '')}"
     try:
-        with open(HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+        record, replayed = get_idempotency_store().execute(scope, key, fingerprint(), compute, replayable)
+    except IdempotencyError as e:
+        response = jsonify({'error': str(e)})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status_code
+    
+    response = Response(record['body'], status=record['status'], headers=[tuple(h) for h in record['headers']])
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
-def save_history(history):
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f)
+def upload_fingerprint():
+    """Form fields plus the file's name and content hash; the stream is rewound afterwards"""
+    parts = [f"{k}={v}" for k, v in sorted(request.form.items(multi=True))]
+    file = request.files.get('file')
+    if file is not None:
+        digest = hashlib.sha256()
+        for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(block)
+        file.stream.seek(0)
+        parts += [file.filename or '', digest.hexdigest()]
+    return request_fingerprint(*parts)
+
+def claim_priority(damage_type, **features):
+    """Scheduler priority level from the cheap pre-score (see claim_scheduler.pre_score)"""
+    rules = default_rules_store().get()
+    return priority_level(pre_score(damage_type, rules, **features), rules)
+
+def request_region(state, zip_code):
+    """Fair-queuing key for this request (X-Tenant-ID header, else location)"""
+    return region_key(state, zip_code, tenant=request.headers.get('X-Tenant-ID'))
+
+def overloaded_response(e):
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
 
 def add_to_history(entry):
-    history = load_history()
-    history.append(entry)
-    save_history(history)
+    sync = get_history_sync()
+    if sync is not None:
+        # Other nodes pick the entry up from shared storage; this node appends it right away
+        sync.publish(entry)
+        pull_history()
+        return
+    # Open the indexes before the file grows, so a first-use backfill can't count the entry twice
+    get_history_stats()
+    get_search_index()
+    append_history([entry], HISTORY_FILE)
+    index_history_entry(entry)
+
+def pull_history():
+    """Append (and index) entries other nodes published since the last pull"""
+    # Open the indexes before the file grows, so a first-use backfill can't count pulled entries twice
+    get_history_stats()
+    get_search_index()
+    for entry in get_history_sync().pull():
+        index_history_entry(entry)
+
+@app.before_request
+def sync_shared_history():
+    sync = get_history_sync()
+    if sync is None or not sync.due(app.config['HISTORY_SYNC_SECONDS']):
+        return
+    try:
+        pull_history()
+    except Exception as e:
+        # Serve from the local copy; the next pull catches up
+        print("DEBUG: history sync failed:", str(e))
+
+def index_history_entry(entry):
+    # Keep dashboard aggregates current without rescanning history
+    try:
+        get_history_stats().record(entry)
+    except Exception as e:
+        print("DEBUG: history stats update failed:", str(e))
+    
+    try:
+        get_search_index().add(entry)
+    except Exception as e:
+        print("DEBUG: search index update failed:", str(e))
+
+def caption_image(captioner, image, filename):
+    """Caption a decoded image, falling back to a colour heuristic for empty captions"""
+    # Process image (captioner might return None or empty string)
+    try:
+        image_caption = captioner.generate_caption(filename, image=image)
+    except Exception as e:
+        print("DEBUG: captioner.generate_caption failed:", str(e))
+        image_caption = ""
+    
+    # Defensive: coerce to string and trim
+    image_caption = "" if image_caption is None else str(image_caption).strip()
+    
+    # If caption is empty or too short, use a light image heuristic fallback
+    if not image_caption or len(image_caption) < 6:
+        try:
+            img_cv = image
+            if img_cv is not None:
+                mean_red = float(img_cv[:, :, 2].mean())
+                mean_gray = float(cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY).mean())
+                if mean_red > (mean_gray * 1.15) and mean_red > 80:
+                    image_caption = "visible fire damage, charred surfaces and soot; burned areas and structural charring visible"
+                else:
+                    image_caption = "visible property damage; signs of surface damage and debris"
+            else:
+                image_caption = "visible property damage; signs of surface damage and debris"
+        except Exception as e:
+            print("DEBUG: fallback image heuristic failed:", str(e))
+            image_caption = "visible property damage; signs of surface damage and debris"
+    
+    return image_caption
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    limit = request.max_content_length
+    return jsonify({'error': f'Request body too large (max {limit // (1024 * 1024)}MB)'}), 413
 
 @app.route('/')
 def home():
@@ -73,119 +393,318 @@ def home():
 
 @app.route('/history')
 def history():
-    history_data = load_history()
-    history_data.reverse()  # Show most recent first
-    return render_template('history.html', history=history_data)
+    # Metadata rows only; descriptions are fetched per row when "View Details" is clicked
+    columns = get_history_columns()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = app.config['HISTORY_PAGE_SIZE']
+    history_data = columns.rows(offset=(page - 1) * per_page, limit=per_page)  # Most recent first
+    return render_template('history.html', history=history_data, page=page,
+                           has_more=page * per_page < len(columns))
+
+@app.route('/api/history/rows/<int:row>')
+def history_row(row):
+    """One full history entry (without the image), loaded lazily from its byte span"""
+    columns = get_history_columns()
+    if not 0 <= row < len(columns):
+        return jsonify({'error': 'History entry not found'}), 404
+    entry = columns.entry(row)
+    entry.pop('image_data', None)
+    return jsonify(entry)
+
+@app.route('/api/stats')
+def history_stats_api():
+    """Dashboard statistics served from the incrementally maintained aggregates"""
+    try:
+        return jsonify(get_history_stats().snapshot())
+    except Exception as e:
+        return jsonify({'error': 'Statistics unavailable', 'details': str(e)}), 500
+
+@app.route('/api/model-server/health')
+def model_server_health():
+    """Health and queue-depth stats of the shared model server"""
+    if not app.config['MODEL_SERVER_SOCKET']:
+        return jsonify({'status': 'disabled', 'mode': 'in-process'})
+    captioner, _ = get_models()
+    try:
+        return jsonify(captioner.client.health())
+    except ModelServerUnavailable as e:
+        return jsonify({'status': 'unavailable', 'mode': 'in-process fallback', 'error': str(e)}), 503
+
+@app.route('/api/scheduler')
+def scheduler_metrics():
+    """Queue depth per priority level and region, admission counters and wait times"""
+    return jsonify(get_scheduler().metrics())
+
+@app.route('/debug/profile')
+def debug_profile():
+    """
+    Profile this worker for ?seconds=N: stack samples of every thread as
+    collapsed stacks (default) or speedscope JSON (?format=speedscope), or
+    with ?mode=memory the allocation sites that grew (?area=history,pdf)
+    """
+    token = app.config['DEBUG_PROFILE_TOKEN']
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({'error': 'seconds must be a number'}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({'error': f'seconds must be between 0 and {MAX_PROFILE_SECONDS}'}), 400
+    mode = request.args.get('mode', 'cpu')
+    fmt = request.args.get('format', 'collapsed')
+    if mode not in ('cpu', 'memory'):
+        return jsonify({'error': 'mode must be cpu or memory'}), 400
+    if fmt not in ('collapsed', 'speedscope'):
+        return jsonify({'error': 'format must be collapsed or speedscope'}), 400
+    areas = [a for a in request.args.get('area', '').split(',') if a] or None
+    if areas and not set(areas) <= set(MEMORY_AREAS):
+        return jsonify({'error': f'area must be one of {", ".join(MEMORY_AREAS)}'}), 400
+    
+    try:
+        if mode == 'memory':
+            return jsonify(memory_growth(seconds, areas=areas))
+        profile = sample_stacks(seconds)
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), e.status_code
+    print(f"DEBUG: profiled {profile['sample_count']} samples in {profile['duration']:.1f}s "
+          f"(sampler overhead {profile['overhead'] * 100:.2f}%)")
+    if fmt == 'speedscope':
+        response = jsonify(to_speedscope(profile, name=f"ClaimInsight worker {os.getpid()}"))
+    else:
+        response = make_response(to_collapsed(profile))
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['X-Profile-Samples'] = str(profile['sample_count'])
+    response.headers['X-Profile-Overhead'] = f"{profile['overhead']:.4f}"
+    return response
+
+@app.route('/api/rules')
+def rules_info():
+    """Version, load time and benchmark of the active scoring rules"""
+    return jsonify(default_rules_store().summary())
+
+@app.route('/api/history/search')
+def search_history():
+    """Full-text search over descriptions, captions, components, names and addresses"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query (q)'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    
+    try:
+        results = get_search_index().search(query, limit=limit, offset=offset)
+    except Exception as e:
+        return jsonify({'error': 'Search failed', 'details': str(e)}), 500
+    
+    return jsonify({'query': query, 'count': len(results), 'results': results})
+
+@app.route('/api/history/export')
+def export_history():
+    """Stream the assessment history as CSV, JSONL or Parquet"""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format. Use one of: {", ".join(sorted(EXPORT_FORMATS))}'}), 400
+    
+    severity = request.args.get('severity', '')
+    include_images = request.args.get('exclude_images', '').lower() not in ('1', 'true', 'yes')
+    
+    try:
+        chunks = stream_export(
+            fmt,
+            path=HISTORY_FILE,
+            date_from=request.args.get('from') or None,
+            date_to=request.args.get('to') or None,
+            severities=severity.split(',') if severity else None,
+            include_images=include_images
+        )
+    except Exception as e:
+        return jsonify({'error': 'Export failed', 'details': str(e)}), 500
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"ClaimInsight_history_{datetime.now().strftime('%Y%m%dT%H%M%S')}.{extension}"
+    
+    # No Content-Length: the response goes out with chunked transfer encoding
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/api/portfolio')
+def portfolio():
+    """Estimated cost totals over the history, optionally grouped and filtered"""
+    group_by = request.args.get('group_by', 'severity_level')
+    if group_by not in PORTFOLIO_GROUPS:
+        return jsonify({'error': f'Unsupported group_by. Use one of: {", ".join(PORTFOLIO_GROUPS)}'}), 400
+    
+    severity = request.args.get('severity', '')
+    try:
+        return jsonify(get_history_columns().portfolio(
+            group_by=group_by,
+            date_from=request.args.get('from') or None,
+            date_to=request.args.get('to') or None,
+            severities=severity.split(',') if severity else None
+        ))
+    except Exception as e:
+        return jsonify({'error': 'Portfolio totals unavailable', 'details': str(e)}), 500
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Handle file upload and processing"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file selected'}), 400
+    # With an Idempotency-Key, a client retry never assesses the photo or adds history twice
+    return idempotent(upload_fingerprint, lambda: process_upload(request.files['file'], request.form))
+
+def process_upload(file, form, local_path=None):
+    """
+    Assess an uploaded photo or video; form holds the claim fields (UPLOAD_FORM_FIELDS).
+    local_path is the file's path when it is already on disk (chunked uploads).
+    """
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file selected'}), 400
-        
-        file = request.files['file']
-        damage_type = request.form.get('damage_type', 'Unknown Damage')
-        custom_damage = request.form.get('custom_damage', '')
+        damage_type = form.get('damage_type', 'Unknown Damage')
+        custom_damage = form.get('custom_damage', '')
         
         # New fields from form
-        policy_holder_name = request.form.get('policy_holder_name', '')
-        contact_email = request.form.get('contact_email', '')
-        contact_phone = request.form.get('contact_phone', '')
-        property_address = request.form.get('property_address', '')
-        city = request.form.get('city', '')
-        state = request.form.get('state', '')
-        zip_code = request.form.get('zip_code', '')
+        policy_holder_name = form.get('policy_holder_name', '')
+        contact_email = form.get('contact_email', '')
+        contact_phone = form.get('contact_phone', '')
+        property_address = form.get('property_address', '')
+        city = form.get('city', '')
+        state = form.get('state', '')
+        zip_code = form.get('zip_code', '')
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        if file and is_video_file(file.filename):
+            return process_video_upload(
+                file,
+                custom_damage if custom_damage else damage_type,
+                {
+                    'policy_holder_name': policy_holder_name,
+                    'contact_email': contact_email,
+                    'contact_phone': contact_phone,
+                    'property_address': property_address,
+                    'city': city,
+                    'state': state,
+                    'zip_code': zip_code
+                },
+                local_path=local_path
+            )
+        
         if file and allowed_file(file.filename):
             # Generate unique filename
             file_id = str(uuid.uuid4())
             filename = secure_filename(file.filename)
-            temp_path = os.path.join('uploads', f"{file_id}_{filename}")
-            file.save(temp_path)
             
-            # Validate image
+            # Validate from the first chunk and the header, then decode from memory;
+            # nothing is written to uploads/, so there is nothing to clean up
             try:
-                with Image.open(temp_path) as img:
-                    img.verify()
-            except Exception:
-                os.remove(temp_path)
+                upload = read_upload(
+                    file.stream,
+                    max_bytes=app.config['MAX_IMAGE_BYTES'],
+                    max_pixels=app.config['MAX_IMAGE_PIXELS']
+                )
+            except UploadRejected as e:
+                return jsonify({'error': str(e)}), e.status_code
+            
+            # Decode once; reused for the caption fallback, hashing and image_data
+            image = decode_image(upload)
+            if image is None:
                 return jsonify({'error': 'Invalid image file'}), 400
             
-            # Load models
-            captioner, desc_generator = get_models()
+            # Reject blurry, badly exposed or tiny photos before any expensive stage
+            image_quality = assess_image_quality(image)
+            if app.config['IMAGE_QUALITY_GATE'] and not image_quality['passed']:
+                return jsonify({
+                    'error': 'Image quality check failed: ' + '; '.join(r['message'] for r in image_quality['rejections']),
+                    'quality': image_quality
+                }), 422
             
-            # Process image (captioner might return None or empty string)
+            # Flag photos that look like ones already submitted (crops, recompressions)
+            image_phash = None
+            duplicate_matches = []
             try:
-                image_caption = captioner.generate_caption(temp_path)
+                image_phash = phash(image)
+                duplicate_matches = get_hash_index().find_matches(image_phash)
             except Exception as e:
-                print("DEBUG: captioner.generate_caption failed:", str(e))
-                image_caption = ""
+                print("DEBUG: duplicate image check failed:", str(e))
+            
+            # Use custom damage type if provided
+            final_damage_type = custom_damage if custom_damage else damage_type
+            
+            # Severe-looking claims are scheduled ahead of routine ones during surges
+            priority = claim_priority(final_damage_type, quality=image_quality, duplicate=bool(duplicate_matches))
+            with get_scheduler().slot(priority, request_region(state, zip_code)):
+                # Load models
+                captioner, desc_generator = get_models()
             
-            # Defensive: coerce to string and trim
-            image_caption = "" if image_caption is None else str(image_caption).strip()
+                image_caption = caption_image(captioner, image, filename)
             
-            # If caption is empty or too short, use a light image heuristic fallback
-            if not image_caption or len(image_caption) < 6:
+                # Coarse damage heatmap and regions; feeds component detection and the PDF overlay
                 try:
-                    img_cv = cv2.imread(temp_path)
-                    if img_cv is not None:
-                        mean_red = float(img_cv[:, :, 2].mean())
-                        mean_gray = float(cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY).mean())
-                        if mean_red > (mean_gray * 1.15) and mean_red > 80:
-                            image_caption = "visible fire damage, charred surfaces and soot; burned areas and structural charring visible"
-                        else:
-                            image_caption = "visible property damage; signs of surface damage and debris"
-                    else:
-                        image_caption = "visible property damage; signs of surface damage and debris"
+                    damage_map = captioner.generate_damage_map(image)
                 except Exception as e:
-                    print("DEBUG: fallback image heuristic failed:", str(e))
-                    image_caption = "visible property damage; signs of surface damage and debris"
+                    print("DEBUG: damage map generation failed:", str(e))
+                    damage_map = None
             
-            # Use custom damage type if provided
-            final_damage_type = custom_damage if custom_damage else damage_type
-            
-            # Generate description with enhanced features
-            try:
-                enhanced_data = desc_generator.enhance_description_with_features(
-                    image_caption, 
-                    final_damage_type,
-                    {
-                        'policy_holder_name': policy_holder_name,
-                        'contact_email': contact_email,
-                        'contact_phone': contact_phone,
-                        'property_address': property_address,
-                        'city': city,
-                        'state': state,
-                        'zip_code': zip_code
-                    }
-                )
-            except Exception as e:
-                print("ERROR: enhance_description_with_features failed:", str(e))
-                import traceback
-                traceback.print_exc()
-                os.remove(temp_path)
-                return jsonify({'error': 'Description generation failed', 'details': str(e)}), 500
+                # Generate description with enhanced features
+                try:
+                    enhanced_data = desc_generator.enhance_description_with_features(
+                        image_caption, 
+                        final_damage_type,
+                        {
+                            'policy_holder_name': policy_holder_name,
+                            'contact_email': contact_email,
+                            'contact_phone': contact_phone,
+                            'property_address': property_address,
+                            'city': city,
+                            'state': state,
+                            'zip_code': zip_code
+                        },
+                        damage_map=damage_map
+                    )
+                except Exception as e:
+                    print("ERROR: enhance_description_with_features failed:", str(e))
+                    import traceback
+                    traceback.print_exc()
+                    return jsonify({'error': 'Description generation failed', 'details': str(e)}), 500
             
-            # Store original image data in base64 format
-            image = cv2.imread(temp_path)
-            _, buffer = cv2.imencode('.jpg', image)
-            image_data = base64.b64encode(buffer).decode('utf-8')
+            # Store the original bytes when they are already browser/PDF friendly;
+            # only GIF, CMYK, oversized or rotated uploads are re-encoded
+            image_bytes, image_format = encode_for_storage(
+                upload,
+                quality=app.config['IMAGE_JPEG_QUALITY'],
+                progressive=app.config['IMAGE_PROGRESSIVE_JPEG'],
+                max_bytes=app.config['IMAGE_PASSTHROUGH_MAX_BYTES'],
+                max_side=app.config['IMAGE_MAX_SIDE']
+            )
+            image_data = base64.b64encode(image_bytes).decode('utf-8')
             
             # Create result data with all fields
             result_data = {
                 'success': True,
+                'assessment_id': file_id,
                 'image_caption': image_caption,
                 'damage_type': final_damage_type,
                 'loss_description': enhanced_data['description'],
+                'description_sections': enhanced_data.get('description_sections'),
                 'severity_score': enhanced_data['severity_score'],
                 'severity_level': enhanced_data['severity_level'],
                 'affected_components': enhanced_data['affected_components'],
                 'repair_level': enhanced_data['repair_level'],
                 'cost_range': enhanced_data['cost_range'],
+                'cost_min_paise': enhanced_data.get('cost_min_paise'),
+                'cost_max_paise': enhanced_data.get('cost_max_paise'),
+                'rules_version': enhanced_data.get('rules_version'),
                 'policy_holder_name': policy_holder_name,
                 'contact_email': contact_email,
                 'contact_phone': contact_phone,
@@ -195,11 +714,17 @@ def upload_file():
                 'zip_code': zip_code,
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'filename': filename,
+                'image_format': image_format,
+                'image_quality': image_quality,
+                'damage_map': damage_map,
+                'possible_duplicate': bool(duplicate_matches),
+                'duplicate_matches': duplicate_matches,
                 'image_data': image_data
             }
             
             # Add to history
             history_entry = {
+                'assessment_id': file_id,
                 'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'damage_type': final_damage_type,
                 'image_caption': image_caption,
@@ -209,6 +734,9 @@ def upload_file():
                 'affected_components': enhanced_data['affected_components'],
                 'repair_level': enhanced_data['repair_level'],
                 'cost_range': enhanced_data['cost_range'],
+                'cost_min_paise': enhanced_data.get('cost_min_paise'),
+                'cost_max_paise': enhanced_data.get('cost_max_paise'),
+                'rules_version': enhanced_data.get('rules_version'),
                 'policy_holder_name': policy_holder_name,
                 'contact_email': contact_email,
                 'contact_phone': contact_phone,
@@ -216,720 +744,420 @@ def upload_file():
                 'city': city,
                 'state': state,
                 'zip_code': zip_code,
+                'duplicate_matches': duplicate_matches,
+                'damage_map': damage_map,
+                'image_format': image_format,
                 'image_data': image_data
             }
             add_to_history(history_entry)
             
-            # Clean up temporary file
-            os.remove(temp_path)
+            if image_phash is not None:
+                try:
+                    get_hash_index().add(image_phash, file_id)
+                except Exception as e:
+                    print("DEBUG: image hash index update failed:", str(e))
             
             return jsonify(result_data)
         
         else:
-            return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, or JPEG.'}), 400
+            return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, JPEG, MP4 or MOV.'}), 400
             
+    except SchedulerOverloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': f'Processing error: {str(e)}'}), 500
 
-def draw_text_with_wrapping(p, text, x, y, max_width, font_name, font_size, line_spacing=14):
-    """Draw text with automatic word wrapping"""
-    words = text.split()
-    lines = []
-    current_line = []
+@app.route('/api/uploads', methods=['POST'])
+def init_chunked_upload():
+    """
+    Start a resumable upload: {filename, size, chunk_size?, sha256?, fields}.
+    fields are the /upload form fields, kept with the session for finalize.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename') or ''))
+    if allowed_file(filename):
+        max_bytes = app.config['MAX_IMAGE_BYTES']
+    elif is_video_file(filename):
+        max_bytes = app.config['MAX_VIDEO_BYTES']
+    else:
+        return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, JPEG, MP4 or MOV.'}), 400
     
-    # Calculate available width in points
-    p.setFont(font_name, font_size)
+    fields = data.get('fields') or {}
+    fields = {key: str(fields[key]) for key in UPLOAD_FORM_FIELDS if fields.get(key) is not None}
+    try:
+        status = get_chunked_uploads().init(
+            filename, data.get('size'), max_bytes,
+            chunk_size=data.get('chunk_size') or app.config['UPLOAD_CHUNK_BYTES'],
+            sha256=data.get('sha256'),
+            fields=fields
+        )
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    response = jsonify(status)
+    response.headers['Location'] = f"/api/uploads/{status['upload_id']}"
+    return response, 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Which chunks have arrived; a resuming client sends only the missing ones"""
+    try:
+        return jsonify(get_chunked_uploads().status(upload_id))
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    try:
+        get_chunked_uploads().abort(upload_id)
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    return '', 204
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:offset>', methods=['PUT'])
+def put_upload_chunk(upload_id, offset):
+    """Raw chunk bytes at a byte offset, with X-Chunk-SHA256; chunks may arrive in parallel"""
+    try:
+        index = get_chunked_uploads().put_chunk(
+            upload_id, offset, request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    return jsonify({'upload_id': upload_id, 'chunk': index, 'offset': offset})
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Assemble the chunks into uploads/ and assess the file; responds like /upload"""
+    # Keyed on the upload id: a retry whose first response was lost, or that arrives
+    # while the first finalize runs, gets that result instead of finding the session
+    # gone. Only successes are kept, so a finalize that failed can run again.
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+        return jsonify({'error': 'Unknown upload'}), 404
+    return idempotent(lambda: request_fingerprint(upload_id), lambda: run_finalize(upload_id),
+                      key=upload_id, replayable=lambda status: status == 200)
+
+def run_finalize(upload_id):
+    uploads = get_chunked_uploads()
+    try:
+        with uploads.finalizing(upload_id):
+            path, session = uploads.assemble(upload_id)
+            with open(path, 'rb') as stream:
+                response = make_response(process_upload(
+                    FileStorage(stream=stream, filename=session['filename']), session['fields'],
+                    local_path=path
+                ))
+            # Failed assessments (busy, quality gate) keep the session so finalize can be retried
+            if response.status_code == 200:
+                uploads.complete(upload_id)
+            return response
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+def process_video_upload(file, final_damage_type, user_data, local_path=None):
+    """Assess a walk-around video through its keyframes and return one claim-level result"""
+    file_id = str(uuid.uuid4())
+    filename = secure_filename(file.filename)
+    extension = filename.rsplit('.', 1)[1].lower()
     
-    for word in words:
-        # Check if adding this word would exceed the max width
-        test_line = ' '.join(current_line + [word])
-        text_width = p.stringWidth(test_line, font_name, font_size)
-        
-        if text_width <= max_width:
-            current_line.append(word)
-        else:
-            if current_line:
-                lines.append(' '.join(current_line))
-            current_line = [word]
-    
-    if current_line:
-        lines.append(' '.join(current_line))
-    
-    # Draw each line
-    current_y = y
-    for line in lines:
-        p.drawString(x, current_y, line)
-        current_y -= line_spacing
-    
-    return current_y  # Return new Y position
-
-def draw_recommendation_item(p, index, title, description, x, y, max_width, font_name, font_size):
-    """Draw a single recommendation item with proper wrapping"""
-    # Draw the number and title in bold
-    title_text = f"{index}. {title}:"
-    p.setFont(f"{font_name}-Bold", font_size)
-    p.drawString(x, y, title_text)
-    
-    # Calculate where description should start
-    title_width = p.stringWidth(title_text, f"{font_name}-Bold", font_size)
-    
-    # Draw description with wrapping
-    p.setFont(font_name, font_size)
-    
-    # Wrap the description
-    words = description.split()
-    lines = []
-    current_line = []
-    
-    # First line starts after title
-    available_width = max_width - title_width
-    
-    # Handle first line specially
-    if words:
-        # Try to fit as many words as possible on first line
-        first_line_words = []
-        for word in words:
-            test_line = ' '.join(first_line_words + [word])
-            if p.stringWidth(test_line, font_name, font_size) <= available_width:
-                first_line_words.append(word)
-            else:
-                break
-        
-        if first_line_words:
-            lines.append(' '.join(first_line_words))
-            remaining_words = words[len(first_line_words):]
-        else:
-            remaining_words = words
-        
-        # Handle remaining words
-        if remaining_words:
-            current_line = []
-            for word in remaining_words:
-                test_line = ' '.join(current_line + [word])
-                if p.stringWidth(test_line, font_name, font_size) <= max_width:
-                    current_line.append(word)
-                else:
-                    if current_line:
-                        lines.append(' '.join(current_line))
-                    current_line = [word]
-            
-            if current_line:
-                lines.append(' '.join(current_line))
-    else:
-        lines.append("")
-    
-    # Draw each line
-    current_y = y
-    for i, line in enumerate(lines):
-        if i == 0:
-            # First line starts after title
-            p.drawString(x + title_width, current_y, line)
+    # OpenCV needs a path: a chunked upload is read where it was assembled,
+    # anything else is spooled to a temp file that is always removed below
+    try:
+        if local_path:
+            check_video_file(local_path, max_bytes=app.config['MAX_VIDEO_BYTES'])
+            video_path = local_path
         else:
-            # Subsequent lines are indented
-            p.drawString(x + 20, current_y - (i * 14), line)
+            video_path = spool_video(file.stream, max_bytes=app.config['MAX_VIDEO_BYTES'], suffix=f'.{extension}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Calculate total height used
-    height_used = max(20, (len(lines) * 14))
-    return y - height_used - 10  # Return new Y position
+    try:
+        keyframes = extract_keyframes(video_path, max_keyframes=app.config['VIDEO_MAX_KEYFRAMES'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        if video_path != local_path:
+            os.remove(video_path)
+    
+    if not keyframes:
+        return jsonify({'error': 'No usable frames found in video'}), 400
+    
+    captioner, desc_generator = get_models()
+    
+    def assess_frame(keyframe):
+        image = keyframe['image']
+        image_caption = caption_image(captioner, image, filename)
+        try:
+            damage_map = captioner.generate_damage_map(image)
+        except Exception as e:
+            print("DEBUG: damage map generation failed:", str(e))
+            damage_map = None
+        enhanced = desc_generator.enhance_description_with_features(
+            image_caption, final_damage_type, user_data, damage_map=damage_map
+        )
+        return {
+            'frame_index': keyframe['frame_index'],
+            'timestamp': keyframe['timestamp'],
+            'sharpness': keyframe['sharpness'],
+            'image_caption': image_caption,
+            'severity_score': enhanced['severity_score'],
+            'severity_level': enhanced['severity_level'],
+            'affected_components': enhanced['affected_components'],
+            'damage_map': damage_map,
+            'image': image
+        }
+    
+    # One scheduler slot for the whole video; its keyframes are assessed in parallel inside it
+    priority = claim_priority(final_damage_type)
+    with get_scheduler().slot(priority, request_region(user_data.get('state'), user_data.get('zip_code'))):
+        frame_results = assess_keyframes(keyframes, assess_frame, max_workers=app.config['VIDEO_ASSESS_WORKERS'])
+        claim = aggregate_claim(frame_results, desc_generator, final_damage_type, user_data)
+    
+    # The most severe keyframe stands in for the photo in results, history and PDF
+    representative = claim['representative_frame']
+    _, buffer = cv2.imencode('.jpg', representative['image'], [cv2.IMWRITE_JPEG_QUALITY, app.config['IMAGE_JPEG_QUALITY']])
+    image_data = base64.b64encode(buffer).decode('utf-8')
+    
+    image_phash = None
+    duplicate_matches = []
+    try:
+        image_phash = phash(representative['image'])
+        duplicate_matches = get_hash_index().find_matches(image_phash)
+    except Exception as e:
+        print("DEBUG: duplicate image check failed:", str(e))
+    
+    keyframe_summaries = [
+        {k: v for k, v in result.items() if k != 'image'} for result in frame_results
+    ]
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    history_entry = {
+        'assessment_id': file_id,
+        'date': timestamp,
+        'source': 'video',
+        'damage_type': final_damage_type,
+        'image_caption': claim['image_caption'],
+        'loss_description': claim['description'],
+        'severity_score': claim['severity_score'],
+        'severity_level': claim['severity_level'],
+        'affected_components': claim['affected_components'],
+        'repair_level': claim['repair_level'],
+        'cost_range': claim['cost_range'],
+        'cost_min_paise': claim['cost_min_paise'],
+        'cost_max_paise': claim['cost_max_paise'],
+        'rules_version': claim['rules_version'],
+        **user_data,
+        'keyframes': keyframe_summaries,
+        'duplicate_matches': duplicate_matches,
+        'damage_map': representative['damage_map'],
+        'image_format': 'jpeg',
+        'image_data': image_data
+    }
+    add_to_history(history_entry)
+    
+    if image_phash is not None:
+        try:
+            get_hash_index().add(image_phash, file_id)
+        except Exception as e:
+            print("DEBUG: image hash index update failed:", str(e))
+    
+    result_data = dict(history_entry)
+    result_data.pop('date')
+    result_data.update({
+        'success': True,
+        'description_sections': claim['description_sections'],
+        'timestamp': timestamp,
+        'filename': filename,
+        'possible_duplicate': bool(duplicate_matches)
+    })
+    return jsonify(result_data)
 
 @app.route('/download-pdf', methods=['POST'])
 def download_pdf():
     """Download description as enhanced PDF file with image"""
+    return idempotent(lambda: request_fingerprint(request.get_data()), render_pdf_response)
+
+def render_pdf_response():
+    pdf_slot = None
     try:
         data = request.get_json()
         
-        # Extract all data
-        description = data.get('description', 'No description available.')
-        damage_type = data.get('damage_type', 'Unknown Damage')
-        
-        # Extract severity score
-        severity_score = data.get('severity_score')
-        if severity_score is None:
-            score_match = re.search(r'Score:\s*(\d+)/100', description)
-            if score_match:
-                severity_score = int(score_match.group(1))
-            else:
-                score_match = re.search(r'(\d+)/100', description)
-                if score_match:
-                    severity_score = int(score_match.group(1))
-                else:
-                    score_match = re.search(r'AI Severity Score:\s*(\d+)/100', description)
-                    if score_match:
-                        severity_score = int(score_match.group(1))
-                    else:
-                        severity_score = 60
-        
-        # Extract severity level
-        severity_level = data.get('severity_level')
-        if severity_level is None:
-            level_match = re.search(r'\((\w+)\)', description)
-            if level_match:
-                severity_level = level_match.group(1).lower()
-            else:
-                if severity_score >= 61:
-                    severity_level = 'severe'
-                elif severity_score >= 31:
-                    severity_level = 'moderate'
-                else:
-                    severity_level = 'minor'
-        
-        # Extract affected components
-        affected_components = data.get('affected_components')
-        if affected_components is None:
-            comp_match = re.search(r'Affected Components:\s*([^\n]+)', description)
-            if comp_match:
-                affected_components = comp_match.group(1).strip()
-            else:
-                comp_section_match = re.search(r'COMPONENT BREAKDOWN:(.*?)(?:\n\n|\Z)', description, re.DOTALL)
-                if comp_section_match:
-                    comp_text = comp_section_match.group(1)
-                    comp_items = re.findall(r'\d+\.\s*([^\n]+)', comp_text)
-                    if comp_items:
-                        affected_components = ', '.join(comp_items)
-                    else:
-                        if 'fire' in damage_type.lower():
-                            affected_components = 'Charred surfaces, Soot damage, Heat-affected areas'
-                        elif 'flood' in damage_type.lower() or 'water' in damage_type.lower():
-                            affected_components = 'Water damage, Moisture intrusion, Mold risk areas'
-                        elif 'hail' in damage_type.lower():
-                            affected_components = 'Dented panels, Body damage, Paint damage'
-                        else:
-                            affected_components = 'Body damage, Paint scratches'
-                else:
-                    if 'fire' in damage_type.lower():
-                        affected_components = 'Charred surfaces, Soot damage, Heat-affected areas'
-                    elif 'flood' in damage_type.lower() or 'water' in damage_type.lower():
-                        affected_components = 'Water damage, Moisture intrusion, Mold risk areas'
-                    elif 'hail' in damage_type.lower():
-                        affected_components = 'Dented panels, Body damage, Paint damage'
-                    else:
-                        affected_components = 'Body damage, Paint scratches'
-        
-        # Extract repair level
-        repair_level = data.get('repair_level')
-        if repair_level is None:
-            repair_match = re.search(r'Repair Complexity:\s*([^\n]+)', description)
-            if repair_match:
-                repair_level = repair_match.group(1).strip()
-            else:
-                if severity_level == 'severe':
-                    repair_level = 'High (structural or critical)'
-                elif severity_level == 'moderate':
-                    repair_level = 'Medium (multiple parts)'
-                else:
-                    repair_level = 'Low (simple repair)'
-        
-        # Extract cost range
-        cost_range = data.get('cost_range')
-        if cost_range is None:
-            cost_match = re.search(r'Estimated Cost Range:\s*([^\n]+)', description)
-            if cost_match:
-                cost_range = cost_match.group(1).strip()
-            else:
-                if severity_level == 'severe':
-                    cost_range = '₹40,000 - ₹2,00,000'
-                elif severity_level == 'moderate':
-                    cost_range = '₹10,000 - ₹40,000'
-                else:
-                    cost_range = '₹3,000 - ₹10,000'
-        
-        # Extract other data
-        policy_holder_name = data.get('policy_holder_name', '')
-        contact_email = data.get('contact_email', '')
-        contact_phone = data.get('contact_phone', '')
-        property_address = data.get('property_address', '')
-        city = data.get('city', '')
-        state = data.get('state', '')
-        zip_code = data.get('zip_code', '')
-        image_data = data.get('image_data', '')
-        
-        # Ensure description is a string
-        if description is None:
-            description = 'No description available.'
-        else:
-            description = str(description)
-        
-        # Ensure damage_type is a string
-        damage_type = str(damage_type) if damage_type else 'Unknown Damage'
-        
-        # Format contact info
-        contact_info = []
-        if contact_email:
-            contact_info.append(contact_email)
-        if contact_phone:
-            contact_info.append(contact_phone)
-        contact_info = ' | '.join(contact_info) if contact_info else 'To be provided by claimant'
-        
-        # Format location info
-        location_parts = []
-        if property_address:
-            location_parts.append(property_address)
-        if city:
-            location_parts.append(city)
-        if state:
-            location_parts.append(state)
-        if zip_code:
-            location_parts.append(zip_code)
-        location_info = ', '.join(location_parts) if location_parts else 'To be provided by claimant'
-        
-        # Clean up empty values
-        if not policy_holder_name or policy_holder_name == 'Not specified':
-            policy_holder_name = 'To be provided by claimant'
-        
-        # Create PDF
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        
-        # Set up colors
-        primary_color = (0/255, 119/255, 182/255)  # Blue
-        accent_color = (72/255, 202/255, 228/255)  # Light Blue
-        success_color = (76/255, 175/255, 80/255)  # Green
-        warning_color = (255/255, 152/255, 0/255)  # Orange
-        danger_color = (244/255, 67/255, 54/255)  # Red
-        
-        # Set severity color based on level
-        if severity_level == 'severe':
-            severity_color = danger_color
-        elif severity_level == 'moderate':
-            severity_color = warning_color
-        else:
-            severity_color = success_color
-        
-        # ========== PAGE 1: COVER PAGE ==========
-        
-        # 1. HEADER WITH BACKGROUND
-        p.setFillColorRGB(*primary_color)
-        p.rect(0, height-120, width, 120, fill=1, stroke=0)
-        
-        # Logo/Title
-        p.setFillColorRGB(1, 1, 1)
-        p.setFont("Helvetica-Bold", 28)
-        p.drawCentredString(width/2, height-60, "CLAIM INSIGHT")
-        p.setFont("Helvetica", 14)
-        p.drawCentredString(width/2, height-85, "AI-Powered Insurance Claim Assessment Report")
-        p.setFont("Helvetica", 10)
-        p.drawCentredString(width/2, height-100, f"Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}")
-        
-        # 2. DAMAGE IMAGE SECTION (if available)
-        y = height - 180
-        
-        if image_data and image_data.strip():
-            try:
-                # Add image title
-                p.setFillColorRGB(*primary_color)
-                p.setFont("Helvetica-Bold", 16)
-                p.drawString(50, y, "DAMAGE IMAGE")
-                y -= 20
-                
-                # Decode and add image
-                img_data = base64.b64decode(image_data)
-                img_file = BytesIO(img_data)
-                
-                # Use PIL to get image dimensions
-                from PIL import Image as PILImage
-                img = PILImage.open(img_file)
-                img_width, img_height = img.size
-                
-                # Calculate dimensions to fit (max 400x300)
-                max_width = 400
-                max_height = 250
-                aspect = img_width / img_height
-                
-                if aspect > max_width/max_height:
-                    display_width = max_width
-                    display_height = display_width / aspect
-                else:
-                    display_height = max_height
-                    display_width = display_height * aspect
-                
-                # Center the image
-                x_position = (width - display_width) / 2
-                
-                # Reset file pointer
-                img_file.seek(0)
-                p.drawImage(ImageReader(img_file), x_position, y-display_height, 
-                          width=display_width, height=display_height)
-                y -= display_height + 30
-                
-            except Exception as e:
-                print(f"Error adding image to PDF: {e}")
-                # Add placeholder if image fails
-                p.setFillColorRGB(0.9, 0.9, 0.9)
-                p.rect(50, y-150, width-100, 150, fill=1, stroke=0)
-                p.setFillColorRGB(0.6, 0.6, 0.6)
-                p.setFont("Helvetica", 12)
-                p.drawCentredString(width/2, y-80, "Damage Image")
-                p.drawCentredString(width/2, y-100, "(Image not available in PDF)")
-                y -= 180
-        else:
-            # No image available
-            p.setFillColorRGB(0.9, 0.9, 0.9)
-            p.rect(50, y-150, width-100, 150, fill=1, stroke=0)
-            p.setFillColorRGB(0.6, 0.6, 0.6)
-            p.setFont("Helvetica", 12)
-            p.drawCentredString(width/2, y-80, "Damage Image")
-            p.drawCentredString(width/2, y-100, "(Image reference available in system)")
-            y -= 180
-        
-        # 3. EXECUTIVE SUMMARY BOX
-        summary_box_height = 120
-        p.setFillColorRGB(0.95, 0.95, 0.95)
-        p.rect(50, y-summary_box_height, width-100, summary_box_height, fill=1, stroke=0)
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(70, y-30, "EXECUTIVE SUMMARY")
-        
-        summary_y = y - 50
-        
-        # Summary details
-        summary_items = [
-            ("Damage Type:", damage_type),
-            ("Severity Level:", f"{severity_level.upper()} ({severity_score}/100)"),
-            ("Estimated Cost Range:", cost_range),
-            ("Report Status:", "READY FOR CLAIM PROCESSING")
-        ]
-        
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica", 10)
-        for label, value in summary_items:
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(70, summary_y, label)
-            p.setFont("Helvetica", 10)
-            p.drawString(180, summary_y, value)
-            summary_y -= 20
-        
-        # 4. QUICK RESPONSE RECOMMENDATION
-        summary_y -= 20
-        p.setFillColorRGB(*severity_color)
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, summary_y, "RECOMMENDED ACTION:")
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica", 10)
-        
-        if severity_level == 'severe':
-            action = "IMMEDIATE PROFESSIONAL INTERVENTION REQUIRED - Contact repair services within 24 hours"
-        elif severity_level == 'moderate':
-            action = "SCHEDULE PROFESSIONAL ASSESSMENT - Arrange inspection within 7 days"
-        else:
-            action = "ROUTINE REPAIR SCHEDULING - Plan repairs at convenience"
-        
-        # Draw action with wrapping
-        summary_y = draw_text_with_wrapping(p, action, 50, summary_y - 15, width-100, "Helvetica", 10)
-        
-        # Footer for page 1
-        p.setFillColorRGB(0.5, 0.5, 0.5)
-        p.setFont("Helvetica", 8)
-        p.drawString(50, 30, "Page 1 of 3 - Confidential Insurance Document")
-        p.drawString(width-150, 30, "ClaimInsight AI System")
-        
-        # ========== PAGE 2: DETAILED ASSESSMENT ==========
-        p.showPage()
-        
-        # Page 2 Header
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 20)
-        p.drawCentredString(width/2, height-50, "DETAILED ASSESSMENT REPORT")
-        p.setFillColorRGB(0.3, 0.3, 0.3)
-        p.setFont("Helvetica", 10)
-        p.drawCentredString(width/2, height-70, f"Claim Reference: CI-{datetime.now().strftime('%Y%m%d%H%M')}")
-        
-        y = height - 100
-        
-        # 1. CLAIM INFORMATION SECTION
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y, "1. CLAIM INFORMATION")
-        y -= 25
-        
-        claim_info = [
-            ("Policy Holder:", policy_holder_name),
-            ("Contact Information:", contact_info),
-            ("Incident Location:", location_info),
-            ("Date of Assessment:", datetime.now().strftime('%B %d, %Y')),
-            ("Assessment ID:", f"CI-{datetime.now().strftime('%Y%m%d%H%M%S')}")
-        ]
-        
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica", 10)
-        for label, value in claim_info:
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(70, y, label)
-            p.setFont("Helvetica", 10)
-            
-            # Draw value with wrapping
-            y = draw_text_with_wrapping(p, str(value), 200, y, width-250, "Helvetica", 10, 14)
-            
-            y -= 8
-        
-        y -= 10
-        
-        # 2. DAMAGE ASSESSMENT SECTION
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y, "2. DAMAGE ASSESSMENT SUMMARY")
-        y -= 25
-        
-        # Severity indicator with color box
-        p.setFillColorRGB(*severity_color)
-        p.roundRect(70, y-5, 150, 20, 5, fill=1, stroke=0)
-        p.setFillColorRGB(1, 1, 1)
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(75, y, f"{severity_level.upper()} DAMAGE")
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica", 10)
-        p.drawString(230, y, f"Score: {severity_score}/100")
-        y -= 35
-        
-        assessment_details = [
-            ("Damage Type:", damage_type),
-            ("Affected Components:", affected_components),
-            ("Repair Complexity:", repair_level),
-            ("Estimated Cost Range:", cost_range)
-        ]
-        
-        for label, value in assessment_details:
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(70, y, label)
-            p.setFont("Helvetica", 10)
-            
-            # Draw value with wrapping
-            y = draw_text_with_wrapping(p, str(value), 200, y, width-250, "Helvetica", 10, 14)
-            
-            y -= 8
-        
-        y -= 20
-        
-        # 3. DETAILED ANALYSIS SECTION
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y, "3. DETAILED ANALYSIS")
-        y -= 30
-        
-        # Clean and parse description
-        clean_description = str(description).replace('\r\n', '\n').replace('\r', '\n')
-        
-        # Find DETAILED ANALYSIS section
-        if "DETAILED ANALYSIS:" in clean_description:
-            analysis_start = clean_description.find("DETAILED ANALYSIS:")
-            analysis_end = clean_description.find("COMPONENT BREAKDOWN:", analysis_start)
-            if analysis_end == -1:
-                analysis_end = clean_description.find("RECOMMENDATIONS:", analysis_start)
-            
-            if analysis_end == -1:
-                analysis_text = clean_description[analysis_start + len("DETAILED ANALYSIS:"):].strip()
-            else:
-                analysis_text = clean_description[analysis_start + len("DETAILED ANALYSIS:"):analysis_end].strip()
-            
-            # Split into paragraphs
-            paragraphs = [p.strip() for p in analysis_text.split('\n\n') if p.strip()]
-            
-            p.setFillColorRGB(0, 0, 0)
-            p.setFont("Helvetica", 10)
-            
-            for paragraph in paragraphs:
-                # Draw paragraph with wrapping
-                y = draw_text_with_wrapping(p, paragraph, 70, y, width-140, "Helvetica", 10, 14)
-                y -= 10  # Space between paragraphs
-        
-        y -= 20
-        
-        # 4. COMPONENT BREAKDOWN SECTION
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y, "4. COMPONENT BREAKDOWN")
-        y -= 25
-        
-        if "COMPONENT BREAKDOWN:" in clean_description:
-            comp_start = clean_description.find("COMPONENT BREAKDOWN:")
-            comp_end = clean_description.find("RECOMMENDATIONS:", comp_start)
-            
-            if comp_end == -1:
-                comp_text = clean_description[comp_start + len("COMPONENT BREAKDOWN:"):].strip()
-            else:
-                comp_text = clean_description[comp_start + len("COMPONENT BREAKDOWN:"):comp_end].strip()
-            
-            # Split into lines
-            comp_lines = [line.strip() for line in comp_text.split('\n') if line.strip()]
-            
-            p.setFillColorRGB(0, 0, 0)
-            p.setFont("Helvetica", 10)
-            
-            for line in comp_lines:
-                # Check if line is numbered
-                if re.match(r'^\d+\.', line):
-                    # Draw numbered item
-                    p.drawString(70, y, line)
-                else:
-                    # Draw regular line
-                    y = draw_text_with_wrapping(p, line, 70, y, width-140, "Helvetica", 10, 14)
-                y -= 15
-        
-        # Footer for page 2
-        p.setFillColorRGB(0.5, 0.5, 0.5)
-        p.setFont("Helvetica", 8)
-        p.drawString(50, 30, "Page 2 of 3 - Confidential Insurance Document")
-        p.drawString(width-150, 30, "ClaimInsight AI System")
-        
-        # ========== PAGE 3: RECOMMENDATIONS ==========
-        p.showPage()
-        
-        # Page 3 Header
-        p.setFillColorRGB(*primary_color)
-        p.setFont("Helvetica-Bold", 20)
-        p.drawCentredString(width/2, height-50, "RECOMMENDATIONS & COST ESTIMATE")
-        p.setFillColorRGB(0.3, 0.3, 0.3)
-        p.setFont("Helvetica", 10)
-        p.drawCentredString(width/2, height-70, f"Claim Reference: CI-{datetime.now().strftime('%Y%m%d%H%M')}")
-        
-        y = height - 100
-        
-        # # RECOMMENDATIONS SECTION
-        # p.setFillColorRGB(*primary_color)
-        # p.setFont("Helvetica-Bold", 16)
-        # p.drawString(50, y, "RECOMMENDATIONS")
-        # y -= 25
-        
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "RECOMMENDATIONS:")
-        y -= 20
-        
-        # Extract recommendations from description
-        if "RECOMMENDATIONS:" in clean_description:
-            rec_start = clean_description.find("RECOMMENDATIONS:")
-            cost_start = clean_description.find("COST ESTIMATE GUIDANCE:", rec_start)
-            
-            if cost_start == -1:
-                rec_text = clean_description[rec_start + len("RECOMMENDATIONS:"):].strip()
-            else:
-                rec_text = clean_description[rec_start + len("RECOMMENDATIONS:"):cost_start].strip()
-            
-            # Split into lines
-            rec_lines = [line.strip() for line in rec_text.split('\n') if line.strip()]
-            
-            # Draw each recommendation with proper wrapping
-            for i, line in enumerate(rec_lines, 1):
-                if ':' in line:
-                    # Split title and description
-                    title_part, desc_part = line.split(':', 1)
-                    title = title_part.strip()
-                    description = desc_part.strip()
-                    
-                    # Draw with wrapping
-                    y = draw_recommendation_item(p, i, title, description, 70, y, width-140, "Helvetica", 10)
-                else:
-                    # Draw as-is
-                    p.setFont("Helvetica", 10)
-                    p.drawString(70, y, line)
-                    y -= 20
-                
-                # Check if we need a new page
-                if y < 150:
-                    p.showPage()
-                    y = height - 50
-                    p.setFillColorRGB(0, 0, 0)
-        
-        y -= 30
-        
-        # # COST ESTIMATE SECTION
-        # p.setFillColorRGB(*primary_color)
-        # p.setFont("Helvetica-Bold", 16)
-        # p.drawString(50, y, "COST ESTIMATE GUIDANCE")
-        # y -= 25
-        
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "COST ESTIMATE GUIDANCE:")
-        y -= 20
-        
-        # Extract cost estimate
-        if "COST ESTIMATE GUIDANCE:" in clean_description:
-            cost_start = clean_description.find("COST ESTIMATE GUIDANCE:")
-            
-            if cost_start != -1:
-                cost_text = clean_description[cost_start + len("COST ESTIMATE GUIDANCE:"):].strip()
-                
-                # Split into lines
-                cost_lines = [line.strip() for line in cost_text.split('\n') if line.strip()]
-                
-                p.setFillColorRGB(0, 0, 0)
-                p.setFont("Helvetica", 10)
-                
-                for line in cost_lines:
-                    if line.startswith('**') and line.endswith('**'):
-                        # Bold text (cost range)
-                        p.setFont("Helvetica-Bold", 14)
-                        p.drawCentredString(width/2, y, line.strip('*'))
-                        p.setFont("Helvetica", 10)
-                        y -= 25
-                    elif line.startswith('- ') or line.startswith('• '):
-                        # Bullet point
-                        p.drawString(70, y, line)
-                        y -= 15
-                    elif line.lower().startswith('note:'):
-                        # Note text
-                        p.setFont("Helvetica-Oblique", 9)
-                        y = draw_text_with_wrapping(p, line, 70, y, width-140, "Helvetica-Oblique", 9, 12)
-                        p.setFont("Helvetica", 10)
-                        y -= 10
-                    else:
-                        # Regular text
-                        y = draw_text_with_wrapping(p, line, 70, y, width-140, "Helvetica", 10, 14)
-                        y -= 5
-                    
-                    # Check if we need a new page
-                    if y < 100:
-                        p.showPage()
-                        y = height - 50
-                        p.setFillColorRGB(0, 0, 0)
-                        p.setFont("Helvetica", 10)
+        # Missing values fall back to the same rules and cost engine as the assessment
+        fields = resolve_report_fields(data, rules=default_rules_store().get())
         
-        # Final disclaimer
-        y = max(y, 120)  # Ensure we have space
-        y -= 20
+        # Rendering waits its turn behind more severe claims when the server is saturated
+        pdf_slot = get_scheduler().acquire(
+            claim_priority(fields['damage_type'], severity_score=fields['severity_score']),
+            request_region(data.get('state', ''), data.get('zip_code', ''))
+        )
         
-        p.setFillColorRGB(0.7, 0.7, 0.7)
-        p.setFont("Helvetica", 8)
-        p.drawString(50, y, "="*100)
-        y -= 20
+        pdf_bytes = render_claim_pdf(data, fields=fields)
         
-        disclaimer_lines = [
-            "IMPORTANT DISCLAIMER:",
-            "This report is generated by ClaimInsight AI Assessment System and is for preliminary assessment purposes only.",
-            "The estimated costs are approximate and may vary based on actual repair requirements, labor rates, and parts availability.",
-            "A physical inspection by a certified professional is recommended for accurate assessment and claim processing."
-        ]
-        
-        for line in disclaimer_lines:
-            p.drawCentredString(width/2, y, line)
-            y -= 12
-        
-        # Footer for page 3
-        p.setFillColorRGB(0.5, 0.5, 0.5)
-        p.setFont("Helvetica", 8)
-        p.drawString(50, 30, "Page 3 of 3 - Confidential Insurance Document")
-        p.drawString(width-150, 30, "ClaimInsight AI System")
-
-        # Save PDF
-        p.save()
-
-        buffer.seek(0)
-        
-        # Create a better filename
-        timestamp_str = datetime.now().strftime('%Y%m%dT%H%M%S')
-        safe_damage_type = damage_type.replace(' ', '_')
-        filename = f"ClaimInsight_{safe_damage_type}_{timestamp_str}.pdf"
-        
-        response = make_response(buffer.getvalue())
+        response = make_response(pdf_bytes)
         response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['Content-Disposition'] = f'attachment; filename={report_filename(fields["damage_type"])}'
         return response
 
+    except SchedulerOverloaded as e:
+        return overloaded_response(e)
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print("PDF generation error:", str(e))
         import traceback
         traceback.print_exc()
         return jsonify({"error": "PDF generation failed", "details": str(e)}), 500
+    finally:
+        if pdf_slot is not None:
+            get_scheduler().release(pdf_slot)
+
+@app.route('/api/reports/bulk', methods=['POST'])
+def start_bulk_reports():
+    """Start a job rendering PDFs for every assessment matching the filters into one ZIP"""
+    data = request.get_json(silent=True) or {}
+    filters = {key: data.get(key) for key in ('from', 'to', 'severity', 'state', 'zip_prefix', 'assessment_ids')}
+    job = get_report_jobs().start(filters)
+    response = jsonify(job)
+    response.headers['Location'] = f"/api/reports/bulk/{job['job_id']}"
+    return response, 202
+
+@app.route('/api/reports/bulk/<job_id>')
+def bulk_report_status(job_id):
+    job = get_report_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    return jsonify(job)
+
+@app.route('/api/reports/bulk/<job_id>/download')
+def download_bulk_reports(job_id):
+    jobs = get_report_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Report job is {job['status']}", 'job': job}), 409
+    try:
+        zip_file = jobs.open_zip(job_id)
+    except ObjectNotFound:
+        return jsonify({'error': 'Report ZIP has expired'}), 410
+    return send_file(
+        zip_file,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"ClaimInsight_reports_{job_id[:8]}.zip"
+    )
+
+@app.route('/api/claims/<assessment_id>/bundle')
+def download_claim_bundle(assessment_id):
+    """One ZIP per claim for repair shops: images, derivatives, PDF report and assessment JSON"""
+    cache = get_bundle_cache()
+    try:
+        path = cache.cached(assessment_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if path is None:
+        columns = get_history_columns()
+        row = columns.find(assessment_id)
+        if row is None:
+            return jsonify({'error': 'Assessment not found'}), 404
+        entry = columns.entry(row)
+        try:
+            with get_scheduler().slot(
+                claim_priority(entry.get('damage_type'), severity_score=entry.get('severity_score')),
+                request_region(entry.get('state'), entry.get('zip_code'))
+            ):
+                path = cache.build(entry)
+        except SchedulerOverloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            print("Bundle generation error:", str(e))
+            return jsonify({'error': 'Bundle generation failed', 'details': str(e)}), 500
+    
+    # A file on disk lets send_file answer Range / If-Range requests, so interrupted downloads resume
+    return send_file(
+        os.path.abspath(path),
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"ClaimInsight_claim_{assessment_id[:8]}.zip",
+        conditional=True,
+        max_age=0
+    )
+
+def _timed(timings, label, func):
+    start = time.perf_counter()
+    result = func()
+    timings[label] = time.perf_counter() - start
+    return result
+
+def preload():
+    """
+    Import heavy modules and build models up front. Call in the master of a
+    pre-fork server (e.g. PRELOAD_MODELS=1 gunicorn --preload app:app) so
+    forked workers share the warmed pages instead of each paying for them.
+    The SQLite search index is left alone: connections must not cross a fork.
+    """
+    global captioner, desc_generator
+    timings = {}
+    for name in PRELOAD_MODULES:
+        lazy_module(name)
+    # Backends this deployment doesn't use (boto3 without s3:// storage) stay unloaded
+    names = PRELOAD_MODULES + PRELOAD_OPTIONAL_MODULES + list(storage_modules(app.config['STORAGE_URL']))
+    if os.path.isdir(cold_dir_for(HISTORY_FILE)):
+        names.append('zstandard')
+    for name, seconds in load_all(names).items():
+        timings[f'import {name}'] = seconds
+    
+    if captioner is None or desc_generator is None:
+        if app.config['MODEL_SERVER_SOCKET']:
+            captioner, desc_generator = _timed(timings, 'connect_models()', lambda: connect_models(app.config['MODEL_SERVER_SOCKET']))
+        else:
+            captioner = _timed(timings, 'ImageCaptioner()', ImageCaptioner)
+            desc_generator = _timed(timings, 'DescriptionGenerator()', DescriptionGenerator)
+    _timed(timings, 'HistoryStats()', get_history_stats)
+    _timed(timings, 'ImageHashIndex()', get_hash_index)
+    return timings
+
+def profile_startup():
+    """Report cold-start cost: per-import time from a fresh interpreter, then per-initializer time"""
+    env = dict(os.environ, PRELOAD_MODELS='')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    # -X importtime lists children before their parent; keep the direct children of app
+    imports = []
+    children = []
+    total = 0.0
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        depth = len(match.group(3)) // 2
+        if depth == 0:
+            if match.group(4) == 'app':
+                total = cumulative
+                imports = children
+            children = []
+        elif depth == 1:
+            children.append((cumulative, match.group(4)))
+    
+    print(f"\nimport app: {total * 1000:8.1f} ms")
+    for seconds, name in sorted(imports, reverse=True)[:15]:
+        print(f"  {name:<40}{seconds * 1000:8.1f} ms")
+    
+    print("\nDeferred work (lazy imports and initializers, paid on first request unless preloaded):")
+    timings = preload()
+    for label, seconds in timings.items():
+        print(f"  {label:<40}{seconds * 1000:8.1f} ms")
+    print(f"  {'total':<40}{sum(timings.values()) * 1000:8.1f} ms")
+
+# Pre-fork servers: warm the master before workers are forked
+if os.environ.get('PRELOAD_MODELS') == '1':
+    preload()
 
 if __name__ == "__main__":
+    if '--profile-startup' in sys.argv:
+        profile_startup()
+        sys.exit(0)
     print("Starting Flask app on http://127.0.0.1:5000 ...")
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
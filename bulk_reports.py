@@ -0,0 +1,298 @@
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from claim_report import render_claim_pdf
+from history_export import HISTORY_FILE, ChunkSink, filter_history, iter_history
+from object_storage import FilesystemStorage, ObjectNotFound
+
+JOBS_DIR = 'data/report_jobs'       # local scratch space for ZIPs being written
+JOBS_PREFIX = 'reports/'
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+IN_FLIGHT_PER_WORKER = 2       # renders queued per worker; bounds memory whatever the selection size
+STATUS_WRITE_SECONDS = 1.0     # how often a running job's status file is refreshed
+JOB_RETENTION_SECONDS = 24 * 3600
+
+MANIFEST_FIELDS = [
+    'assessment_id', 'date', 'damage_type', 'severity_level', 'severity_score',
+    'state', 'zip_code', 'cost_range', 'file', 'bytes', 'sha256', 'status', 'error'
+]
+
+
+def _as_list(value):
+    """Filter values arrive as lists (JSON) or comma-separated strings (CLI, query strings)"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    items = [str(v).strip() for v in value if str(v).strip()]
+    return items or None
+
+
+def select_assessments(path=HISTORY_FILE, date_from=None, date_to=None, severities=None,
+                       states=None, zip_prefixes=None, assessment_ids=None):
+    """Stream history entries matching the date range, severity and region filters"""
+    states = _as_list(states)
+    zip_prefixes = _as_list(zip_prefixes)
+    assessment_ids = _as_list(assessment_ids)
+    state_set = {s.lower() for s in states} if states else None
+    prefixes = tuple(zip_prefixes) if zip_prefixes else None
+    id_set = set(assessment_ids) if assessment_ids else None
+
+    entries = iter_history(path, date_from=date_from, date_to=date_to)
+    for entry in filter_history(entries, date_from=date_from, date_to=date_to, severities=_as_list(severities)):
+        if state_set and str(entry.get('state') or '').strip().lower() not in state_set:
+            continue
+        if prefixes and not str(entry.get('zip_code') or '').strip().startswith(prefixes):
+            continue
+        if id_set and entry.get('assessment_id') not in id_set:
+            continue
+        yield entry
+
+
+def _render_entry(entry):
+    """Pool worker: render one history entry; returns (pdf bytes or None, error)"""
+    data = dict(entry)
+    data.setdefault('description', entry.get('loss_description'))
+    try:
+        return render_claim_pdf(data), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _archive_name(index, entry):
+    date = str(entry.get('date') or '')[:10] or 'undated'
+    assessment_id = str(entry.get('assessment_id') or 'assessment')[:8]
+    damage_type = re.sub(r'[^A-Za-z0-9]+', '_', str(entry.get('damage_type') or 'Unknown')).strip('_')
+    return f"reports/{index:05d}_{date}_{assessment_id}_{damage_type}.pdf"
+
+
+def stream_report_zip(entries, workers=DEFAULT_WORKERS, progress=None):
+    """
+    Render entries across a process pool and yield a ZIP archive in chunks.
+    Each PDF is added as soon as it completes (archive order is completion
+    order). Only workers * IN_FLIGHT_PER_WORKER entries are in flight at
+    once, and the manifest is spooled to disk, so memory stays flat however
+    many entries are selected. manifest.csv is written last.
+    progress(row) is called with each manifest row.
+    """
+    sink = ChunkSink()
+    manifest = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', newline='', encoding='utf-8')
+    manifest_writer = csv.writer(manifest)
+    manifest_writer.writerow(MANIFEST_FIELDS)
+
+    # spawn: forking a threaded web server process is not safe
+    context = multiprocessing.get_context('spawn')
+    with manifest, zipfile.ZipFile(sink, 'w') as archive, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = {}
+        numbered = enumerate(entries, 1)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                item = next(numbered, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, entry = item
+                row = {f: entry.get(f, '') for f in MANIFEST_FIELDS[:8]}
+                pending[pool.submit(_render_entry, entry)] = (index, entry, row)
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, entry, row = pending.pop(future)
+                pdf, error = future.result()
+                if pdf is not None:
+                    name = _archive_name(index, entry)
+                    # Page streams are already compressed by the renderer
+                    archive.writestr(name, pdf, compress_type=zipfile.ZIP_STORED)
+                    row.update({'file': name, 'bytes': len(pdf), 'sha256': hashlib.sha256(pdf).hexdigest(),
+                                'status': 'ok', 'error': ''})
+                else:
+                    row.update({'file': '', 'bytes': 0, 'sha256': '', 'status': 'error', 'error': error})
+                manifest_writer.writerow([row[f] for f in MANIFEST_FIELDS])
+                if progress:
+                    progress(row)
+            yield sink.drain()
+
+        manifest.seek(0)
+        with archive.open('manifest.csv', 'w') as dest:
+            for line in manifest:
+                dest.write(line.encode('utf-8'))
+    yield sink.drain()
+
+
+class ReportJobs:
+    """
+    Bulk report jobs run in background threads, one at a time. Each job
+    streams its ZIP to jobs_dir as PDFs complete and stores it in object
+    storage when done; status is a JSON object next to it, so any worker
+    process, on any node, can answer status/download requests. Finished
+    jobs are removed after JOB_RETENTION_SECONDS.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, history_path=HISTORY_FILE, workers=DEFAULT_WORKERS, storage=None):
+        self.jobs_dir = jobs_dir
+        self.history_path = history_path
+        self.workers = workers
+        self.storage = storage if storage is not None else FilesystemStorage()
+        self._run_lock = threading.Lock()  # one job renders at a time; the rest wait
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        print("✅ Bulk report jobs initialized!")
+
+    @staticmethod
+    def _status_key(job_id):
+        return f"{JOBS_PREFIX}{job_id}.json"
+
+    @staticmethod
+    def _zip_key(job_id):
+        return f"{JOBS_PREFIX}{job_id}.zip"
+
+    def open_zip(self, job_id):
+        """A finished job's ZIP as an open file (read through the storage cache)"""
+        return self.storage.open(self._zip_key(job_id))
+
+    def _write_status(self, job):
+        self.storage.put_bytes(self._status_key(job['job_id']), json.dumps(job).encode('utf-8'))
+
+    def get(self, job_id):
+        # Job ids are uuid hex; anything else never reaches storage
+        if not re.fullmatch(r'[0-9a-f]{32}', str(job_id)):
+            return None
+        try:
+            return json.loads(self.storage.get_bytes(self._status_key(job_id)))
+        except (ObjectNotFound, ValueError):
+            return None
+
+    def start(self, filters):
+        """Queue a job for the given selection filters; returns its initial status"""
+        self.cleanup()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'queued',
+            'filters': filters,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'finished': None,
+            'rendered': 0,
+            'failed': 0,
+            'bytes': 0,
+            'error': None
+        }
+        self._write_status(job)
+        snapshot = dict(job)
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return snapshot
+
+    def _run(self, job):
+        with self._run_lock:
+            job['status'] = 'running'
+            self._write_status(job)
+            part_path = os.path.join(self.jobs_dir, f"{job['job_id']}.zip.part")
+            last_write = time.monotonic()
+
+            def progress(row):
+                nonlocal last_write
+                job['rendered' if row['status'] == 'ok' else 'failed'] += 1
+                if time.monotonic() - last_write >= STATUS_WRITE_SECONDS:
+                    last_write = time.monotonic()
+                    self._write_status(job)
+
+            try:
+                filters = job['filters']
+                entries = select_assessments(
+                    self.history_path,
+                    date_from=filters.get('from'),
+                    date_to=filters.get('to'),
+                    severities=filters.get('severity'),
+                    states=filters.get('state'),
+                    zip_prefixes=filters.get('zip_prefix'),
+                    assessment_ids=filters.get('assessment_ids')
+                )
+                with open(part_path, 'wb') as out:
+                    for chunk in stream_report_zip(entries, workers=self.workers, progress=progress):
+                        out.write(chunk)
+                        job['bytes'] += len(chunk)
+                self.storage.put_file(self._zip_key(job['job_id']), part_path, move=True)
+                job['status'] = 'done'
+            except Exception as e:
+                print(f"DEBUG: bulk report job {job['job_id']} failed: {e}")
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            job['finished'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._write_status(job)
+
+    def cleanup(self, max_age=JOB_RETENTION_SECONDS):
+        """Remove jobs older than max_age (running jobs keep touching their status)"""
+        cutoff = time.time() - max_age
+        for key, _, mtime in list(self.storage.list(JOBS_PREFIX)):
+            if mtime < cutoff:
+                self.storage.delete(key)
+        # Partial ZIPs left behind by a worker that died mid-job
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render ClaimInsight PDF reports for many assessments into one ZIP")
+    parser.add_argument('--output', '-o', required=True, help="ZIP file to write")
+    parser.add_argument('--history', default=HISTORY_FILE, help="History file to read")
+    parser.add_argument('--from', dest='date_from', help="Start date (YYYY-MM-DD, inclusive)")
+    parser.add_argument('--to', dest='date_to', help="End date (YYYY-MM-DD, inclusive)")
+    parser.add_argument('--severity', help="Comma-separated severity levels, e.g. severe,moderate")
+    parser.add_argument('--state', help="Comma-separated states")
+    parser.add_argument('--zip-prefix', help="Comma-separated zip code prefixes, e.g. 400,411")
+    parser.add_argument('--id', dest='assessment_ids', help="Comma-separated assessment ids")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Rendering processes")
+    args = parser.parse_args(argv)
+
+    entries = select_assessments(
+        args.history,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        severities=args.severity,
+        states=args.state,
+        zip_prefixes=args.zip_prefix,
+        assessment_ids=args.assessment_ids
+    )
+    counts = {'ok': 0, 'error': 0}
+
+    def progress(row):
+        counts[row['status']] += 1
+        if row['status'] == 'error':
+            print(f"  failed: {row['assessment_id']}: {row['error']}", file=sys.stderr)
+
+    start = time.perf_counter()
+    part_path = args.output + '.part'
+    with open(part_path, 'wb') as out:
+        for chunk in stream_report_zip(entries, workers=args.workers, progress=progress):
+            out.write(chunk)
+    shutil.move(part_path, args.output)
+    print(f"{counts['ok']} reports ({counts['error']} failed) written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from object_storage import FilesystemStorage
+
+SESSIONS_DIR = 'data/upload_sessions'
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+MIN_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+SESSION_TTL_SECONDS = 24 * 3600   # unfinished uploads older than this are removed
+COPY_BYTES = 64 * 1024
+FINALIZE_LOCK_SECONDS = 600       # a finalize lock older than this was left by a dead worker
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+EXTENSION_PATTERN = re.compile(r'[a-z0-9]{1,8}')
+
+
+class UploadSessionError(ValueError):
+    """Raised for a bad chunked-upload request; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkedUploads:
+    """
+    Resumable uploads: init declares the file, chunks are PUT at their byte
+    offsets (in any order, in parallel, retried as often as needed), and
+    finalize hands the assembled file over for processing. Each session is
+    a directory on local disk holding session.json, the preallocated data
+    file chunks are written into, and one marker per verified chunk, so
+    progress survives worker restarts and is shared by all worker processes
+    of a node. Assembled files are kept in object storage under uploads/.
+    """
+
+    def __init__(self, sessions_dir=SESSIONS_DIR, storage=None, ttl=SESSION_TTL_SECONDS):
+        self.sessions_dir = sessions_dir
+        self.storage = storage if storage is not None else FilesystemStorage()
+        self.ttl = ttl
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        print("✅ Chunked uploads initialized!")
+
+    def _session_dir(self, upload_id):
+        # Upload ids are uuid hex; anything else never touches the filesystem
+        if not UPLOAD_ID_PATTERN.fullmatch(str(upload_id)):
+            raise UploadSessionError('Unknown upload', 404)
+        return os.path.join(self.sessions_dir, upload_id)
+
+    def _load(self, upload_id):
+        try:
+            with open(os.path.join(self._session_dir(upload_id), 'session.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadSessionError('Unknown upload', 404)
+
+    def _save(self, session):
+        session_dir = self._session_dir(session['upload_id'])
+        tmp_path = os.path.join(session_dir, 'session.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(tmp_path, os.path.join(session_dir, 'session.json'))
+
+    def init(self, filename, size, max_bytes, chunk_size=DEFAULT_CHUNK_BYTES, sha256=None, fields=None):
+        """Start a session for a file of `size` bytes; returns its status"""
+        try:
+            size = int(size)
+            chunk_size = int(chunk_size or DEFAULT_CHUNK_BYTES)
+        except (TypeError, ValueError):
+            raise UploadSessionError('size and chunk_size must be integers')
+        if size <= 0:
+            raise UploadSessionError('size must be positive')
+        if size > max_bytes:
+            raise UploadSessionError(f'File too large (max {max_bytes // (1024 * 1024)}MB)', 413)
+        if not MIN_CHUNK_BYTES <= chunk_size <= MAX_CHUNK_BYTES:
+            raise UploadSessionError(f'chunk_size must be between {MIN_CHUNK_BYTES} and {MAX_CHUNK_BYTES} bytes')
+        if sha256 is not None and not SHA256_PATTERN.fullmatch(str(sha256).lower()):
+            raise UploadSessionError('sha256 must be 64 hex characters')
+
+        self.cleanup()
+        session = {
+            'upload_id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'chunk_size': chunk_size,
+            'total_chunks': (size + chunk_size - 1) // chunk_size,
+            'sha256': str(sha256).lower() if sha256 else None,
+            'fields': fields or {},
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'stored_key': None
+        }
+        session_dir = self._session_dir(session['upload_id'])
+        os.makedirs(os.path.join(session_dir, 'chunks'))
+        with open(os.path.join(session_dir, 'data.part'), 'wb') as f:
+            f.truncate(size)
+        self._save(session)
+        return self.status(session['upload_id'])
+
+    def _received(self, upload_id):
+        chunks_dir = os.path.join(self._session_dir(upload_id), 'chunks')
+        try:
+            return sorted(int(name) for name in os.listdir(chunks_dir) if name.isdigit())
+        except OSError:
+            return []
+
+    def status(self, upload_id):
+        session = self._load(upload_id)
+        received = self._received(upload_id)
+        received_set = set(received)
+        return {
+            'upload_id': upload_id,
+            'filename': session['filename'],
+            'size': session['size'],
+            'chunk_size': session['chunk_size'],
+            'total_chunks': session['total_chunks'],
+            'received': received,
+            'missing': [i for i in range(session['total_chunks']) if i not in received_set],
+            'complete': len(received) == session['total_chunks']
+        }
+
+    def put_chunk(self, upload_id, offset, stream, checksum):
+        """
+        Write one chunk from stream at offset, verifying its sha256 as it is
+        copied. The chunk only counts as received once the checksum matches,
+        so a failed or corrupted transfer is simply sent again.
+        """
+        session = self._load(upload_id)
+        if session['stored_key']:
+            raise UploadSessionError('Upload already finalized', 409)
+        chunk_size = session['chunk_size']
+        if offset < 0 or offset >= session['size'] or offset % chunk_size:
+            raise UploadSessionError(f'offset must be a multiple of {chunk_size} below {session["size"]}')
+        checksum = str(checksum or '').strip().lower()
+        if not SHA256_PATTERN.fullmatch(checksum):
+            raise UploadSessionError('X-Chunk-SHA256 header with the chunk sha256 is required')
+
+        expected = min(chunk_size, session['size'] - offset)
+        digest = hashlib.sha256()
+        written = 0
+        session_dir = self._session_dir(upload_id)
+        marker = os.path.join(session_dir, 'chunks', str(offset // chunk_size))
+        # A resent chunk overwrites the bytes, so it is not received again until verified
+        if os.path.exists(marker):
+            os.remove(marker)
+        fd = os.open(os.path.join(session_dir, 'data.part'), os.O_WRONLY)
+        try:
+            while True:
+                block = stream.read(COPY_BYTES)
+                if not block:
+                    break
+                if written + len(block) > expected:
+                    raise UploadSessionError(f'Chunk at offset {offset} must be {expected} bytes')
+                # Positional writes: parallel chunks of the same file never share a file position
+                os.pwrite(fd, block, offset + written)
+                digest.update(block)
+                written += len(block)
+        finally:
+            os.close(fd)
+        if written != expected:
+            raise UploadSessionError(f'Chunk at offset {offset} must be {expected} bytes, got {written}')
+        if digest.hexdigest() != checksum:
+            raise UploadSessionError('Chunk checksum mismatch', 422)
+
+        with open(marker, 'w') as f:
+            f.write(checksum)
+        return offset // chunk_size
+
+    def assemble(self, upload_id):
+        """
+        Move the completed file into object storage and return (local path,
+        session). Repeated calls return the stored file, so a finalize that
+        failed during processing can be retried.
+        """
+        session = self._load(upload_id)
+        if session['stored_key'] and self.storage.exists(session['stored_key']):
+            return self.storage.local_path(session['stored_key']), session
+
+        status = self.status(upload_id)
+        if not status['complete']:
+            raise UploadSessionError(f"{len(status['missing'])} chunks missing", 409)
+        data_path = os.path.join(self._session_dir(upload_id), 'data.part')
+        if session['sha256'] and _sha256_file(data_path) != session['sha256']:
+            raise UploadSessionError('File checksum mismatch', 422)
+
+        extension = session['filename'].rsplit('.', 1)[-1].lower() if '.' in session['filename'] else ''
+        if not EXTENSION_PATTERN.fullmatch(extension):
+            extension = 'bin'
+        stored_key = f"uploads/{upload_id}.{extension}"
+        # Moved, not copied: the local file becomes the stored object (or its cached copy)
+        self.storage.put_file(stored_key, data_path, move=True)
+        session['stored_key'] = stored_key
+        self._save(session)
+        return self.storage.local_path(stored_key), session
+
+    @contextmanager
+    def finalizing(self, upload_id):
+        """Exclusive finalize across worker processes; a second caller gets 409"""
+        lock_path = os.path.join(self._session_dir(upload_id), 'finalize.lock')
+        self._load(upload_id)
+        try:
+            if time.time() - os.path.getmtime(lock_path) > FINALIZE_LOCK_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise UploadSessionError('Upload is already being finalized', 409)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def complete(self, upload_id):
+        """Drop the session once its file has been processed (the stored file is kept)"""
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def abort(self, upload_id):
+        session = self._load(upload_id)
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        if session['stored_key']:
+            self.storage.delete(session['stored_key'])
+
+    def cleanup(self):
+        """Remove sessions untouched for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.sessions_dir):
+            session_dir = os.path.join(self.sessions_dir, name)
+            try:
+                # Every chunk write touches data.part; the session file covers finalized sessions
+                paths = [os.path.join(session_dir, n) for n in ('data.part', 'session.json')]
+                last_touched = max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0)
+            except OSError:
+                continue
+            if last_touched < cutoff:
+                shutil.rmtree(session_dir, ignore_errors=True)
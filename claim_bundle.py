@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+
+from lazy_imports import lazy_module
+from claim_report import render_claim_pdf, resolve_report_fields
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+BUNDLE_DIR = 'data/bundles'
+BUNDLE_FORMAT = 1
+MAX_CACHED_BUNDLES = 200
+COPY_CHUNK_CHARS = 64 * 1024    # base64 characters decoded per write (a multiple of 4)
+THUMBNAIL_SIDE = 320
+DERIVATIVE_JPEG_QUALITY = 85
+
+ASSESSMENT_ID_PATTERN = re.compile(r'[0-9A-Za-z-]{8,64}')
+
+IMAGE_EXTENSIONS = {'jpeg': 'jpg', 'jpg': 'jpg', 'png': 'png', 'gif': 'gif'}
+
+
+class _HashingWriter:
+    """Wraps a zip member stream, counting and hashing what is written"""
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.dest.write(data)
+        self.size += len(data)
+        self.sha256.update(data)
+
+
+def _write_member(archive, name, chunks, compress=True):
+    """Write an iterable of byte chunks as one member; returns its manifest record"""
+    info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with archive.open(info, 'w') as dest:
+        writer = _HashingWriter(dest)
+        for chunk in chunks:
+            writer.write(chunk)
+    return {'name': name, 'bytes': writer.size, 'sha256': writer.sha256.hexdigest()}
+
+
+def _decoded_chunks(encoded, chunk_chars=COPY_CHUNK_CHARS):
+    """Decode base64 text slice by slice so the decoded image is never held whole"""
+    for start in range(0, len(encoded), chunk_chars):
+        yield base64.b64decode(encoded[start:start + chunk_chars])
+
+
+def _derivatives(image_data, damage_map):
+    """(name, jpeg bytes) for a thumbnail and, when a damage map exists, an annotated copy"""
+    image = cv2.imdecode(np.frombuffer(base64.b64decode(image_data), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return []
+    params = [cv2.IMWRITE_JPEG_QUALITY, DERIVATIVE_JPEG_QUALITY]
+    height, width = image.shape[:2]
+    derivatives = []
+
+    regions = (damage_map or {}).get('regions') or []
+    heatmap = (damage_map or {}).get('heatmap')
+    if regions or heatmap:
+        overlay = image.copy()
+        if heatmap:
+            heat = cv2.resize(np.asarray(heatmap, dtype=np.float32), (width, height), interpolation=cv2.INTER_LINEAR)
+            colored = cv2.applyColorMap((heat * 255).astype(np.uint8), cv2.COLORMAP_JET)
+            overlay = cv2.addWeighted(overlay, 0.65, colored, 0.35, 0)
+        thickness = max(2, round(max(width, height) / 400))
+        for index, region in enumerate(regions[:5], 1):
+            try:
+                x0, y0 = int(float(region['x']) * width), int(float(region['y']) * height)
+                x1 = int((float(region['x']) + float(region['w'])) * width)
+                y1 = int((float(region['y']) + float(region['h'])) * height)
+            except (KeyError, TypeError, ValueError):
+                continue
+            cv2.rectangle(overlay, (x0, y0), (x1, y1), (54, 67, 244), thickness)
+            cv2.putText(overlay, str(index), (x0 + 6, y0 + 12 * thickness), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4 * thickness, (54, 67, 244), thickness)
+        derivatives.append(('images/damage_overlay.jpg', cv2.imencode('.jpg', overlay, params)[1].tobytes()))
+
+    scale = THUMBNAIL_SIDE / max(width, height)
+    if scale < 1:
+        thumbnail = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    else:
+        thumbnail = image
+    derivatives.append(('images/thumbnail.jpg', cv2.imencode('.jpg', thumbnail, params)[1].tobytes()))
+    return derivatives
+
+
+def write_bundle(entry, fileobj):
+    """
+    Write a claim's evidence bundle as a ZIP to fileobj, member by member:
+    the stored image (decoded straight into the archive), derivatives, the
+    PDF report and assessment.json (the history entry without the image
+    blob, plus a size/sha256 listing of every other member).
+    """
+    files = []
+    image_data = entry.get('image_data') or ''
+    with zipfile.ZipFile(fileobj, 'w') as archive:
+        if image_data:
+            extension = IMAGE_EXTENSIONS.get(str(entry.get('image_format') or 'jpeg').lower(), 'jpg')
+            # JPEG/PNG do not shrink further; storing them keeps extraction cheap
+            files.append(_write_member(archive, f'images/original.{extension}', _decoded_chunks(image_data), compress=False))
+            try:
+                for name, data in _derivatives(image_data, entry.get('damage_map')):
+                    files.append(_write_member(archive, name, [data], compress=False))
+            except Exception as e:
+                print(f"DEBUG: bundle derivatives failed for {entry.get('assessment_id')}: {e}")
+
+        report_data = dict(entry)
+        report_data.setdefault('description', entry.get('loss_description'))
+        fields = resolve_report_fields(report_data)
+        files.append(_write_member(archive, 'report.pdf', [render_claim_pdf(report_data, fields=fields)],
+                                   compress=False))
+
+        assessment = {k: v for k, v in entry.items() if k != 'image_data'}
+        document = {
+            'bundle_format': BUNDLE_FORMAT,
+            'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'assessment': assessment,
+            'report_fields': {k: v for k, v in fields.items() if k not in ('description', 'image_data')},
+            'files': files
+        }
+        _write_member(archive, 'assessment.json', [json.dumps(document, indent=2, ensure_ascii=False).encode('utf-8')])
+    return files
+
+
+class BundleCache:
+    """
+    Finished bundles kept on disk, so they can be served as plain files with
+    Range / If-Range support and resumed downloads hit the same bytes. Built
+    into a temp file and renamed, so a concurrent build or download never
+    sees a partial archive. The oldest bundles beyond max_files are removed.
+    """
+
+    def __init__(self, cache_dir=BUNDLE_DIR, max_files=MAX_CACHED_BUNDLES):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, assessment_id):
+        if not ASSESSMENT_ID_PATTERN.fullmatch(str(assessment_id)):
+            raise ValueError('Invalid assessment id')
+        return os.path.join(self.cache_dir, f"{assessment_id}.zip")
+
+    def cached(self, assessment_id):
+        path = self.path(assessment_id)
+        return path if os.path.exists(path) else None
+
+    def build(self, entry):
+        path = self.path(entry.get('assessment_id'))
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                write_bundle(entry, out)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        self._evict()
+        return path
+
+    def _evict(self):
+        bundles = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.zip'):
+                full_path = os.path.join(self.cache_dir, name)
+                try:
+                    bundles.append((os.path.getmtime(full_path), full_path))
+                except OSError:
+                    pass
+        bundles.sort()
+        for _, full_path in bundles[:max(0, len(bundles) - self.max_files)]:
+            try:
+                os.remove(full_path)
+            except OSError:
+                pass
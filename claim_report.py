@@ -0,0 +1,742 @@
+import base64
+import re
+from datetime import datetime
+from io import BytesIO
+
+from cost_engine import format_inr_range
+from description_templates import is_section_tree, parse_sections
+from image_encoding import encode_for_pdf
+from scoring_rules import default_store
+
+# Output size settings: reports go out by email, and gateways reject multi-MB files
+PDF_IMAGE_DPI = 150         # resolution of the embedded photo within its display box
+PDF_JPEG_QUALITY = 80
+
+
+def draw_text_with_wrapping(p, text, x, y, max_width, font_name, font_size, line_spacing=14):
+    """Draw text with automatic word wrapping"""
+    words = text.split()
+    lines = []
+    current_line = []
+    
+    # Calculate available width in points
+    p.setFont(font_name, font_size)
+    
+    for word in words:
+        # Check if adding this word would exceed the max width
+        test_line = ' '.join(current_line + [word])
+        text_width = p.stringWidth(test_line, font_name, font_size)
+        
+        if text_width <= max_width:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+    
+    if current_line:
+        lines.append(' '.join(current_line))
+    
+    # Draw each line
+    current_y = y
+    for line in lines:
+        p.drawString(x, current_y, line)
+        current_y -= line_spacing
+    
+    return current_y  # Return new Y position
+
+def draw_recommendation_item(p, index, title, description, x, y, max_width, font_name, font_size):
+    """Draw a single recommendation item with proper wrapping"""
+    # Draw the number and title in bold
+    title_text = f"{index}. {title}:"
+    p.setFont(f"{font_name}-Bold", font_size)
+    p.drawString(x, y, title_text)
+    
+    # Calculate where description should start
+    title_width = p.stringWidth(title_text, f"{font_name}-Bold", font_size)
+    
+    # Draw description with wrapping
+    p.setFont(font_name, font_size)
+    
+    # Wrap the description
+    words = description.split()
+    lines = []
+    current_line = []
+    
+    # First line starts after title
+    available_width = max_width - title_width
+    
+    # Handle first line specially
+    if words:
+        # Try to fit as many words as possible on first line
+        first_line_words = []
+        for word in words:
+            test_line = ' '.join(first_line_words + [word])
+            if p.stringWidth(test_line, font_name, font_size) <= available_width:
+                first_line_words.append(word)
+            else:
+                break
+        
+        if first_line_words:
+            lines.append(' '.join(first_line_words))
+            remaining_words = words[len(first_line_words):]
+        else:
+            remaining_words = words
+        
+        # Handle remaining words
+        if remaining_words:
+            current_line = []
+            for word in remaining_words:
+                test_line = ' '.join(current_line + [word])
+                if p.stringWidth(test_line, font_name, font_size) <= max_width:
+                    current_line.append(word)
+                else:
+                    if current_line:
+                        lines.append(' '.join(current_line))
+                    current_line = [word]
+            
+            if current_line:
+                lines.append(' '.join(current_line))
+    else:
+        lines.append("")
+    
+    # Draw each line
+    current_y = y
+    for i, line in enumerate(lines):
+        if i == 0:
+            # First line starts after title
+            p.drawString(x + title_width, current_y, line)
+        else:
+            # Subsequent lines are indented
+            p.drawString(x + 20, current_y - (i * 14), line)
+    
+    # Calculate total height used
+    height_used = max(20, (len(lines) * 14))
+    return y - height_used - 10  # Return new Y position
+
+def draw_damage_overlay(p, regions, x, y, display_width, display_height, color):
+    """Outline damage-map regions on top of the image drawn at (x, y)"""
+    p.saveState()
+    p.setStrokeColorRGB(*color)
+    p.setFillColorRGB(*color)
+    p.setLineWidth(1.5)
+    for index, region in enumerate(regions, 1):
+        try:
+            rx = x + float(region['x']) * display_width
+            rw = float(region['w']) * display_width
+            rh = float(region['h']) * display_height
+            ry = y + (1 - float(region['y']) - float(region['h'])) * display_height
+        except (KeyError, TypeError, ValueError):
+            continue
+        p.setFillAlpha(0.15)
+        p.rect(rx, ry, rw, rh, fill=1, stroke=0)
+        p.setFillAlpha(1)
+        p.rect(rx, ry, rw, rh, fill=0, stroke=1)
+        p.setFont("Helvetica-Bold", 8)
+        p.drawString(rx + 3, ry + rh - 10, str(index))
+    p.restoreState()
+
+
+def _paise(value):
+    """A non-negative whole number of paise from a request value, else None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not number.is_integer() or number < 0:
+        return None
+    return int(number)
+
+
+def resolve_report_fields(data, rules=None):
+    """
+    Fill in everything the report shows from a PDF request or history entry.
+    Missing values are parsed out of the description, else derived from the
+    active rules and cost engine, the same way the assessment computed them.
+    """
+    rules = rules or default_store().get()
+    
+    # Extract all data
+    description = data.get('description', 'No description available.')
+    damage_type = data.get('damage_type', 'Unknown Damage')
+    
+    # Extract severity score
+    severity_score = data.get('severity_score')
+    if severity_score is None:
+        score_match = re.search(r'Score:\s*(\d+)/100', description)
+        if score_match:
+            severity_score = int(score_match.group(1))
+        else:
+            score_match = re.search(r'(\d+)/100', description)
+            if score_match:
+                severity_score = int(score_match.group(1))
+            else:
+                score_match = re.search(r'AI Severity Score:\s*(\d+)/100', description)
+                if score_match:
+                    severity_score = int(score_match.group(1))
+                else:
+                    severity_score = 60
+    
+    
+    # Extract severity level
+    severity_level = data.get('severity_level')
+    if severity_level is None:
+        level_match = re.search(r'\((\w+)\)', description)
+        if level_match:
+            severity_level = level_match.group(1).lower()
+        else:
+            severity_level = rules.level_for(severity_score)
+    
+    # Extract affected components
+    affected_components = data.get('affected_components')
+    if affected_components is None:
+        comp_match = re.search(r'Affected Components:\s*([^\n]+)', description)
+        if comp_match:
+            affected_components = comp_match.group(1).strip()
+        else:
+            comp_section_match = re.search(r'COMPONENT BREAKDOWN:(.*?)(?:\n\n|\Z)', description, re.DOTALL)
+            if comp_section_match:
+                comp_text = comp_section_match.group(1)
+                comp_items = re.findall(r'\d+\.\s*([^\n]+)', comp_text)
+                if comp_items:
+                    affected_components = ', '.join(comp_items)
+                else:
+                    if 'fire' in damage_type.lower():
+                        affected_components = 'Charred surfaces, Soot damage, Heat-affected areas'
+                    elif 'flood' in damage_type.lower() or 'water' in damage_type.lower():
+                        affected_components = 'Water damage, Moisture intrusion, Mold risk areas'
+                    elif 'hail' in damage_type.lower():
+                        affected_components = 'Dented panels, Body damage, Paint damage'
+                    else:
+                        affected_components = 'Body damage, Paint scratches'
+            else:
+                if 'fire' in damage_type.lower():
+                    affected_components = 'Charred surfaces, Soot damage, Heat-affected areas'
+                elif 'flood' in damage_type.lower() or 'water' in damage_type.lower():
+                    affected_components = 'Water damage, Moisture intrusion, Mold risk areas'
+                elif 'hail' in damage_type.lower():
+                    affected_components = 'Dented panels, Body damage, Paint damage'
+                else:
+                    affected_components = 'Body damage, Paint scratches'
+    
+    # Extract repair level
+    repair_level = data.get('repair_level')
+    if repair_level is None:
+        repair_match = re.search(r'Repair Complexity:\s*([^\n]+)', description)
+        if repair_match:
+            repair_level = repair_match.group(1).strip()
+        else:
+            repair_level = rules.repair_levels.get(severity_level, 'Medium (functional repair)')
+    
+    # Extract cost range; formatted here from paise when the client sent the numbers
+    cost_range = data.get('cost_range')
+    cost_min_paise = _paise(data.get('cost_min_paise'))
+    cost_max_paise = _paise(data.get('cost_max_paise'))
+    if cost_min_paise is not None and cost_max_paise is not None and cost_min_paise <= cost_max_paise:
+        cost_range = format_inr_range(cost_min_paise, cost_max_paise)
+    elif data.get('cost_min_paise') is not None or data.get('cost_max_paise') is not None:
+        # Bad numbers from the client fall back to cost_range like missing ones
+        print(f"DEBUG: ignoring invalid paise range {data.get('cost_min_paise')!r} - {data.get('cost_max_paise')!r}")
+    if not cost_range:
+        cost_match = re.search(r'Estimated Cost Range:\s*([^\n]+)', description)
+        if cost_match:
+            cost_range = cost_match.group(1).strip()
+        else:
+            estimate = rules.cost_model.estimate(
+                severity_level, affected_components, data.get('state'), data.get('zip_code')
+            )
+            cost_range = format_inr_range(estimate['min_paise'], estimate['max_paise'])
+    
+    # Extract other data
+    policy_holder_name = data.get('policy_holder_name', '')
+    contact_email = data.get('contact_email', '')
+    contact_phone = data.get('contact_phone', '')
+    property_address = data.get('property_address', '')
+    city = data.get('city', '')
+    state = data.get('state', '')
+    zip_code = data.get('zip_code', '')
+    image_data = data.get('image_data', '')
+    
+    # Ensure description is a string
+    if description is None:
+        description = 'No description available.'
+    else:
+        description = str(description)
+    
+    # Ensure damage_type is a string
+    damage_type = str(damage_type) if damage_type else 'Unknown Damage'
+    
+    # Format contact info
+    contact_info = []
+    if contact_email:
+        contact_info.append(contact_email)
+    if contact_phone:
+        contact_info.append(contact_phone)
+    contact_info = ' | '.join(contact_info) if contact_info else 'To be provided by claimant'
+    
+    # Format location info
+    location_parts = []
+    if property_address:
+        location_parts.append(property_address)
+    if city:
+        location_parts.append(city)
+    if state:
+        location_parts.append(state)
+    if zip_code:
+        location_parts.append(zip_code)
+    location_info = ', '.join(location_parts) if location_parts else 'To be provided by claimant'
+    
+    # Clean up empty values
+    if not policy_holder_name or policy_holder_name == 'Not specified':
+        policy_holder_name = 'To be provided by claimant'
+    
+    return {
+        'description': description,
+        'damage_type': damage_type,
+        'severity_score': severity_score,
+        'severity_level': severity_level,
+        'affected_components': affected_components,
+        'repair_level': repair_level,
+        'cost_range': cost_range,
+        'policy_holder_name': policy_holder_name,
+        'contact_info': contact_info,
+        'location_info': location_info,
+        'image_data': image_data
+    }
+
+
+def report_sections(data, description):
+    """Section tree to lay out: the request's description_sections if well formed, else parsed from the text"""
+    sections = data.get('description_sections')
+    if is_section_tree(sections):
+        return sections
+    return parse_sections(description)
+
+
+def render_claim_pdf(data, fields=None, optimize=True):
+    """
+    Render the three-page claim report and return the PDF bytes.
+    data is a /download-pdf request body or a history entry; fields is the
+    output of resolve_report_fields(data) if the caller already has it.
+    optimize downsamples the photo to PDF_IMAGE_DPI for its display box,
+    which is where all the size reduction comes from: ReportLab already
+    zlib-compresses page streams by default, and text uses the standard PDF
+    fonts, which are referenced, never embedded.
+    """
+    # ReportLab is only needed here, so it is not imported at startup
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+    
+    if fields is None:
+        fields = resolve_report_fields(data)
+    description = fields['description']
+    damage_type = fields['damage_type']
+    severity_score = fields['severity_score']
+    severity_level = fields['severity_level']
+    affected_components = fields['affected_components']
+    repair_level = fields['repair_level']
+    cost_range = fields['cost_range']
+    policy_holder_name = fields['policy_holder_name']
+    contact_info = fields['contact_info']
+    location_info = fields['location_info']
+    image_data = fields['image_data']
+    
+    # Create PDF
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    
+    # Set up colors
+    primary_color = (0/255, 119/255, 182/255)  # Blue
+    accent_color = (72/255, 202/255, 228/255)  # Light Blue
+    success_color = (76/255, 175/255, 80/255)  # Green
+    warning_color = (255/255, 152/255, 0/255)  # Orange
+    danger_color = (244/255, 67/255, 54/255)  # Red
+    
+    # Set severity color based on level
+    if severity_level == 'severe':
+        severity_color = danger_color
+    elif severity_level == 'moderate':
+        severity_color = warning_color
+    else:
+        severity_color = success_color
+    
+    # ========== PAGE 1: COVER PAGE ==========
+    
+    # 1. HEADER WITH BACKGROUND
+    p.setFillColorRGB(*primary_color)
+    p.rect(0, height-120, width, 120, fill=1, stroke=0)
+    
+    # Logo/Title
+    p.setFillColorRGB(1, 1, 1)
+    p.setFont("Helvetica-Bold", 28)
+    p.drawCentredString(width/2, height-60, "CLAIM INSIGHT")
+    p.setFont("Helvetica", 14)
+    p.drawCentredString(width/2, height-85, "AI-Powered Insurance Claim Assessment Report")
+    p.setFont("Helvetica", 10)
+    p.drawCentredString(width/2, height-100, f"Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}")
+    
+    # 2. DAMAGE IMAGE SECTION (if available)
+    y = height - 180
+    
+    if image_data and image_data.strip():
+        try:
+            # Add image title
+            p.setFillColorRGB(*primary_color)
+            p.setFont("Helvetica-Bold", 16)
+            p.drawString(50, y, "DAMAGE IMAGE")
+            y -= 20
+            
+            # Decode and add image
+            img_data = base64.b64decode(image_data)
+            img_file = BytesIO(img_data)
+            
+            # Use PIL to get image dimensions
+            from PIL import Image as PILImage
+            img = PILImage.open(img_file)
+            img_width, img_height = img.size
+            
+            # Calculate dimensions to fit (max 400x300)
+            max_width = 400
+            max_height = 250
+            aspect = img_width / img_height
+            
+            if aspect > max_width/max_height:
+                display_width = max_width
+                display_height = display_width / aspect
+            else:
+                display_height = max_height
+                display_width = display_height * aspect
+            
+            # Center the image
+            x_position = (width - display_width) / 2
+            
+            # Reset file pointer
+            img_file.seek(0)
+            if optimize:
+                img_file = BytesIO(encode_for_pdf(img_data, display_width, display_height,
+                                                  dpi=PDF_IMAGE_DPI, quality=PDF_JPEG_QUALITY))
+            p.drawImage(ImageReader(img_file), x_position, y-display_height, 
+                      width=display_width, height=display_height)
+            
+            # Overlay damage regions (normalized, origin top-left) from the damage map
+            damage_map = data.get('damage_map') or {}
+            regions = damage_map.get('regions') or []
+            if regions:
+                draw_damage_overlay(p, regions[:5], x_position, y-display_height,
+                                    display_width, display_height, danger_color)
+            y -= display_height + 30
+            
+        except Exception as e:
+            print(f"Error adding image to PDF: {e}")
+            # Add placeholder if image fails
+            p.setFillColorRGB(0.9, 0.9, 0.9)
+            p.rect(50, y-150, width-100, 150, fill=1, stroke=0)
+            p.setFillColorRGB(0.6, 0.6, 0.6)
+            p.setFont("Helvetica", 12)
+            p.drawCentredString(width/2, y-80, "Damage Image")
+            p.drawCentredString(width/2, y-100, "(Image not available in PDF)")
+            y -= 180
+    else:
+        # No image available
+        p.setFillColorRGB(0.9, 0.9, 0.9)
+        p.rect(50, y-150, width-100, 150, fill=1, stroke=0)
+        p.setFillColorRGB(0.6, 0.6, 0.6)
+        p.setFont("Helvetica", 12)
+        p.drawCentredString(width/2, y-80, "Damage Image")
+        p.drawCentredString(width/2, y-100, "(Image reference available in system)")
+        y -= 180
+    
+    # 3. EXECUTIVE SUMMARY BOX
+    summary_box_height = 120
+    p.setFillColorRGB(0.95, 0.95, 0.95)
+    p.rect(50, y-summary_box_height, width-100, summary_box_height, fill=1, stroke=0)
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(70, y-30, "EXECUTIVE SUMMARY")
+    
+    summary_y = y - 50
+    
+    # Summary details
+    summary_items = [
+        ("Damage Type:", damage_type),
+        ("Severity Level:", f"{severity_level.upper()} ({severity_score}/100)"),
+        ("Estimated Cost Range:", cost_range),
+        ("Report Status:", "READY FOR CLAIM PROCESSING")
+    ]
+    
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica", 10)
+    for label, value in summary_items:
+        p.setFont("Helvetica-Bold", 10)
+        p.drawString(70, summary_y, label)
+        p.setFont("Helvetica", 10)
+        p.drawString(180, summary_y, value)
+        summary_y -= 20
+    
+    # 4. QUICK RESPONSE RECOMMENDATION
+    summary_y -= 20
+    p.setFillColorRGB(*severity_color)
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, summary_y, "RECOMMENDED ACTION:")
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica", 10)
+    
+    if severity_level == 'severe':
+        action = "IMMEDIATE PROFESSIONAL INTERVENTION REQUIRED - Contact repair services within 24 hours"
+    elif severity_level == 'moderate':
+        action = "SCHEDULE PROFESSIONAL ASSESSMENT - Arrange inspection within 7 days"
+    else:
+        action = "ROUTINE REPAIR SCHEDULING - Plan repairs at convenience"
+    
+    # Draw action with wrapping
+    summary_y = draw_text_with_wrapping(p, action, 50, summary_y - 15, width-100, "Helvetica", 10)
+    
+    # Footer for page 1
+    p.setFillColorRGB(0.5, 0.5, 0.5)
+    p.setFont("Helvetica", 8)
+    p.drawString(50, 30, "Page 1 of 3 - Confidential Insurance Document")
+    p.drawString(width-150, 30, "ClaimInsight AI System")
+    
+    # ========== PAGE 2: DETAILED ASSESSMENT ==========
+    p.showPage()
+    
+    # Page 2 Header
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 20)
+    p.drawCentredString(width/2, height-50, "DETAILED ASSESSMENT REPORT")
+    p.setFillColorRGB(0.3, 0.3, 0.3)
+    p.setFont("Helvetica", 10)
+    p.drawCentredString(width/2, height-70, f"Claim Reference: CI-{datetime.now().strftime('%Y%m%d%H%M')}")
+    
+    y = height - 100
+    
+    # 1. CLAIM INFORMATION SECTION
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, y, "1. CLAIM INFORMATION")
+    y -= 25
+    
+    claim_info = [
+        ("Policy Holder:", policy_holder_name),
+        ("Contact Information:", contact_info),
+        ("Incident Location:", location_info),
+        ("Date of Assessment:", datetime.now().strftime('%B %d, %Y')),
+        ("Assessment ID:", f"CI-{datetime.now().strftime('%Y%m%d%H%M%S')}")
+    ]
+    
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica", 10)
+    for label, value in claim_info:
+        p.setFont("Helvetica-Bold", 10)
+        p.drawString(70, y, label)
+        p.setFont("Helvetica", 10)
+        
+        # Draw value with wrapping
+        y = draw_text_with_wrapping(p, str(value), 200, y, width-250, "Helvetica", 10, 14)
+        
+        y -= 8
+    
+    y -= 10
+    
+    # 2. DAMAGE ASSESSMENT SECTION
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, y, "2. DAMAGE ASSESSMENT SUMMARY")
+    y -= 25
+    
+    # Severity indicator with color box
+    p.setFillColorRGB(*severity_color)
+    p.roundRect(70, y-5, 150, 20, 5, fill=1, stroke=0)
+    p.setFillColorRGB(1, 1, 1)
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(75, y, f"{severity_level.upper()} DAMAGE")
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica", 10)
+    p.drawString(230, y, f"Score: {severity_score}/100")
+    y -= 35
+    
+    assessment_details = [
+        ("Damage Type:", damage_type),
+        ("Affected Components:", affected_components),
+        ("Repair Complexity:", repair_level),
+        ("Estimated Cost Range:", cost_range)
+    ]
+    
+    for label, value in assessment_details:
+        p.setFont("Helvetica-Bold", 10)
+        p.drawString(70, y, label)
+        p.setFont("Helvetica", 10)
+        
+        # Draw value with wrapping
+        y = draw_text_with_wrapping(p, str(value), 200, y, width-250, "Helvetica", 10, 14)
+        
+        y -= 8
+    
+    y -= 20
+    
+    # 3. DETAILED ANALYSIS SECTION
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, y, "3. DETAILED ANALYSIS")
+    y -= 30
+    
+    # The generator's section tree when the request carries it; stored text is parsed once
+    sections = report_sections(data, description)
+    
+    if sections['analysis']:
+        p.setFillColorRGB(0, 0, 0)
+        p.setFont("Helvetica", 10)
+        
+        for paragraph in sections['analysis']:
+            # Draw paragraph with wrapping
+            y = draw_text_with_wrapping(p, paragraph, 70, y, width-140, "Helvetica", 10, 14)
+            y -= 10  # Space between paragraphs
+    
+    y -= 20
+    
+    # 4. COMPONENT BREAKDOWN SECTION
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, y, "4. COMPONENT BREAKDOWN")
+    y -= 25
+    
+    if sections['components']:
+        p.setFillColorRGB(0, 0, 0)
+        p.setFont("Helvetica", 10)
+        
+        for i, component in enumerate(sections['components'], 1):
+            p.drawString(70, y, f"{i}. {component}")
+            y -= 15
+    
+    # Footer for page 2
+    p.setFillColorRGB(0.5, 0.5, 0.5)
+    p.setFont("Helvetica", 8)
+    p.drawString(50, 30, "Page 2 of 3 - Confidential Insurance Document")
+    p.drawString(width-150, 30, "ClaimInsight AI System")
+    
+    # ========== PAGE 3: RECOMMENDATIONS ==========
+    p.showPage()
+    
+    # Page 3 Header
+    p.setFillColorRGB(*primary_color)
+    p.setFont("Helvetica-Bold", 20)
+    p.drawCentredString(width/2, height-50, "RECOMMENDATIONS & COST ESTIMATE")
+    p.setFillColorRGB(0.3, 0.3, 0.3)
+    p.setFont("Helvetica", 10)
+    p.drawCentredString(width/2, height-70, f"Claim Reference: CI-{datetime.now().strftime('%Y%m%d%H%M')}")
+    
+    y = height - 100
+    
+    # # RECOMMENDATIONS SECTION
+    # p.setFillColorRGB(*primary_color)
+    # p.setFont("Helvetica-Bold", 16)
+    # p.drawString(50, y, "RECOMMENDATIONS")
+    # y -= 25
+    
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, y, "RECOMMENDATIONS:")
+    y -= 20
+    
+    # Draw each recommendation with proper wrapping
+    if sections['recommendations']:
+        for i, item in enumerate(sections['recommendations'], 1):
+            if item['title'] is not None:
+                y = draw_recommendation_item(p, i, item['title'], item['text'], 70, y, width-140, "Helvetica", 10)
+            else:
+                # Draw as-is
+                p.setFont("Helvetica", 10)
+                p.drawString(70, y, item['text'])
+                y -= 20
+            
+            # Check if we need a new page
+            if y < 150:
+                p.showPage()
+                y = height - 50
+                p.setFillColorRGB(0, 0, 0)
+    
+    y -= 30
+    
+    # # COST ESTIMATE SECTION
+    # p.setFillColorRGB(*primary_color)
+    # p.setFont("Helvetica-Bold", 16)
+    # p.drawString(50, y, "COST ESTIMATE GUIDANCE")
+    # y -= 25
+    
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, y, "COST ESTIMATE GUIDANCE:")
+    y -= 20
+    
+    if sections['cost']:
+        p.setFillColorRGB(0, 0, 0)
+        p.setFont("Helvetica", 10)
+        
+        for line in sections['cost']:
+            kind, text = line['kind'], line['text']
+            if kind == 'range':
+                # Bold text (cost range)
+                p.setFont("Helvetica-Bold", 14)
+                p.drawCentredString(width/2, y, text)
+                p.setFont("Helvetica", 10)
+                y -= 25
+            elif kind == 'bullet':
+                # Bullet point
+                p.drawString(70, y, f"- {text}")
+                y -= 15
+            elif kind == 'note':
+                # Note text
+                p.setFont("Helvetica-Oblique", 9)
+                y = draw_text_with_wrapping(p, text, 70, y, width-140, "Helvetica-Oblique", 9, 12)
+                p.setFont("Helvetica", 10)
+                y -= 10
+            else:
+                # Regular text
+                y = draw_text_with_wrapping(p, text, 70, y, width-140, "Helvetica", 10, 14)
+                y -= 5
+            
+            # Check if we need a new page
+            if y < 100:
+                p.showPage()
+                y = height - 50
+                p.setFillColorRGB(0, 0, 0)
+                p.setFont("Helvetica", 10)
+    
+    # Final disclaimer
+    y = max(y, 120)  # Ensure we have space
+    y -= 20
+    
+    p.setFillColorRGB(0.7, 0.7, 0.7)
+    p.setFont("Helvetica", 8)
+    p.drawString(50, y, "="*100)
+    y -= 20
+    
+    disclaimer_lines = [
+        "IMPORTANT DISCLAIMER:",
+        "This report is generated by ClaimInsight AI Assessment System and is for preliminary assessment purposes only.",
+        "The estimated costs are approximate and may vary based on actual repair requirements, labor rates, and parts availability.",
+        "A physical inspection by a certified professional is recommended for accurate assessment and claim processing."
+    ]
+    
+    for line in disclaimer_lines:
+        p.drawCentredString(width/2, y, line)
+        y -= 12
+    
+    # Footer for page 3
+    p.setFillColorRGB(0.5, 0.5, 0.5)
+    p.setFont("Helvetica", 8)
+    p.drawString(50, 30, "Page 3 of 3 - Confidential Insurance Document")
+    p.drawString(width-150, 30, "ClaimInsight AI System")
+
+    # Save PDF
+    p.save()
+
+    return buffer.getvalue()
+
+
+def report_filename(damage_type, when=None):
+    timestamp_str = (when or datetime.now()).strftime('%Y%m%dT%H%M%S')
+    safe_damage_type = str(damage_type).replace(' ', '_')
+    return f"ClaimInsight_{safe_damage_type}_{timestamp_str}.pdf"
@@ -0,0 +1,246 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+PRIORITY_LEVELS = ('severe', 'moderate', 'minor')
+
+# Fraction of the queue each level may fill before new requests of that level
+# are turned away. Lower priorities are shed first, so severe claims are still
+# admitted when a surge has filled the queue with routine ones.
+ADMIT_FRACTION = {'severe': 1.0, 'moderate': 0.75, 'minor': 0.5}
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_MAX_WAIT = 30.0         # seconds a queued request waits before giving up with 429
+STARVATION_SECONDS = 20.0       # anything queued this long goes next, whatever its priority
+WAIT_SAMPLES = 512              # recent queue waits kept per level for percentiles
+
+# Pre-score adjustments
+QUALITY_WARNING_PENALTY = 5     # per image-quality warning: the assessment is less reliable
+DUPLICATE_PENALTY = 15          # likely resubmission of a photo already in the history
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a request is not admitted, or waits too long; maps to 429 + Retry-After"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def pre_score(damage_type, rules, quality=None, duplicate=False, severity_score=None):
+    """
+    Cheap 0-100 priority estimate taken before any model runs: the damage
+    type's base score (flood at least the flood minimum), lowered for photos
+    with quality warnings or that look like duplicates. A severity_score
+    already known (e.g. for a PDF) is used as is.
+    """
+    if severity_score is not None:
+        try:
+            return min(100, max(0, int(severity_score)))
+        except (TypeError, ValueError):
+            pass
+
+    damage_type_lower = str(damage_type or '').lower()
+    score = rules.default_base_score
+    for damage_key, damage_score in rules.base_scores:
+        if damage_key in damage_type_lower:
+            score = damage_score
+            break
+    if rules.is_flood(damage_type_lower):
+        score = max(score, rules.flood_minimum_score)
+
+    if quality:
+        score -= QUALITY_WARNING_PENALTY * len(quality.get('warnings', []))
+    if duplicate:
+        score -= DUPLICATE_PENALTY
+    return min(100, max(0, score))
+
+
+def priority_level(score, rules):
+    """Scheduler level for a pre-score; levels the rules add beyond the known three rank last"""
+    level = rules.level_for(score)
+    return level if level in PRIORITY_LEVELS else PRIORITY_LEVELS[-1]
+
+
+def region_key(state=None, zip_code=None, tenant=None):
+    """Fair-queuing key: tenant if given, else the 3-digit zip prefix, else the state"""
+    if tenant:
+        return f"tenant:{str(tenant).strip().lower()}"
+    zip_digits = re.sub(r'\D', '', str(zip_code or ''))
+    if len(zip_digits) >= 3:
+        return f"zip:{zip_digits[:3]}"
+    if state and str(state).strip():
+        return f"state:{str(state).strip().lower()}"
+    return 'unknown'
+
+
+class _Ticket:
+    __slots__ = ('level', 'region', 'enqueued', 'started', 'event', 'queued', 'granted', 'released')
+
+    def __init__(self, level, region):
+        self.level = level
+        self.region = region
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.event = threading.Event()
+        self.queued = False
+        self.granted = False
+        self.released = False
+
+
+class ClaimScheduler:
+    """
+    Admission control and priority dispatch for the expensive workloads
+    (assessment, video, PDF). At most `workers` run at once; the rest wait
+    in a queue per priority level. Within a level, regions (zip prefix /
+    state / tenant) are served round robin, so one flooded area cannot
+    starve the others. Severe > moderate > minor, except that anything
+    queued for starvation_seconds goes next. Limits are per process.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE, max_wait=DEFAULT_MAX_WAIT,
+                 starvation_seconds=STARVATION_SECONDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.starvation_seconds = starvation_seconds
+
+        self._lock = threading.Lock()
+        self._queues = {level: OrderedDict() for level in PRIORITY_LEVELS}  # level -> region -> deque
+        self._arrivals = deque()   # every queued ticket in arrival order, for the starvation check
+        self._queued = 0
+        self._active = 0
+        self._service_seconds = 1.0  # moving average, for Retry-After
+        self._waits = {level: deque(maxlen=WAIT_SAMPLES) for level in PRIORITY_LEVELS}
+        self._counters = {
+            name: {level: 0 for level in PRIORITY_LEVELS}
+            for name in ('admitted', 'rejected', 'timed_out', 'completed')
+        }
+        print("✅ Claim scheduler initialized!")
+
+    def retry_after(self):
+        """Seconds until a retry is likely to be admitted (queue drain time estimate)"""
+        return min(120, max(1, math.ceil((self._queued + 1) * self._service_seconds / max(1, self.workers))))
+
+    def acquire(self, level, region):
+        """Block until a worker slot is granted; returns a ticket for release()"""
+        ticket = _Ticket(level, region)
+        with self._lock:
+            if self._active < self.workers and not self._queued:
+                self._grant(ticket)
+                return ticket
+            if self._queued >= self.max_queue * ADMIT_FRACTION[level]:
+                self._counters['rejected'][level] += 1
+                raise SchedulerOverloaded(f'Server busy ({self._queued} requests queued)', self.retry_after())
+            self._queues[level].setdefault(region, deque()).append(ticket)
+            self._arrivals.append(ticket)
+            ticket.queued = True
+            self._queued += 1
+
+        if ticket.event.wait(self.max_wait):
+            return ticket
+        with self._lock:
+            if ticket.granted:  # granted between the timeout and taking the lock
+                return ticket
+            self._remove(ticket)
+            self._counters['timed_out'][level] += 1
+            raise SchedulerOverloaded(f'Timed out after {self.max_wait:.0f}s in queue', self.retry_after())
+
+    def release(self, ticket):
+        if ticket is None or ticket.released:
+            return
+        with self._lock:
+            ticket.released = True
+            self._active -= 1
+            self._counters['completed'][ticket.level] += 1
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * (time.monotonic() - ticket.started)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, level, region):
+        ticket = self.acquire(level, region)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.started = time.monotonic()
+        self._active += 1
+        self._counters['admitted'][ticket.level] += 1
+        self._waits[ticket.level].append(ticket.started - ticket.enqueued)
+        ticket.event.set()
+
+    def _remove(self, ticket):
+        regions = self._queues[ticket.level]
+        queue = regions[ticket.region]
+        queue.remove(ticket)
+        if not queue:
+            del regions[ticket.region]
+        ticket.queued = False
+        self._queued -= 1
+
+    def _dispatch(self):
+        """Hand free slots to queued tickets (called with the lock held)"""
+        while self._active < self.workers and self._queued:
+            ticket = self._next_ticket()
+            self._grant(ticket)
+
+    def _next_ticket(self):
+        # Drop tickets from the arrival log that were already dispatched or gave up
+        while self._arrivals and not self._arrivals[0].queued:
+            self._arrivals.popleft()
+        if self._arrivals and time.monotonic() - self._arrivals[0].enqueued >= self.starvation_seconds:
+            ticket = self._arrivals.popleft()
+            self._remove(ticket)
+            return ticket
+
+        for level in PRIORITY_LEVELS:
+            regions = self._queues[level]
+            if regions:
+                # Round robin: serve the first region, then move it to the back
+                region, queue = next(iter(regions.items()))
+                ticket = queue.popleft()
+                if queue:
+                    regions.move_to_end(region)
+                else:
+                    del regions[region]
+                ticket.queued = False
+                self._queued -= 1
+                return ticket
+        raise RuntimeError('scheduler queue count out of sync')
+
+    def metrics(self, top_regions=10):
+        """Queue depth, admission counters and recent wait percentiles"""
+        with self._lock:
+            depth_by_region = {}
+            for regions in self._queues.values():
+                for region, queue in regions.items():
+                    depth_by_region[region] = depth_by_region.get(region, 0) + len(queue)
+            waits = {}
+            for level, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[level] = {
+                    'samples': len(ordered),
+                    'p50_ms': round(ordered[len(ordered) // 2] * 1000, 1) if ordered else 0,
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else 0
+                }
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queued': self._queued,
+                'max_queue': self.max_queue,
+                'queued_by_level': {
+                    level: sum(len(q) for q in regions.values()) for level, regions in self._queues.items()
+                },
+                'queued_by_region': dict(sorted(depth_by_region.items(), key=lambda kv: -kv[1])[:top_regions]),
+                'counters': {name: dict(values) for name, values in self._counters.items()},
+                'wait': waits,
+                'average_service_seconds': round(self._service_seconds, 3),
+                'retry_after': self.retry_after()
+            }
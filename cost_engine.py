@@ -0,0 +1,191 @@
+import re
+
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+
+PAISE_PER_RUPEE = 100
+BASIS_POINTS = 10000  # multipliers are stored as integers, 10000 = 1.0x
+
+PORTFOLIO_GROUPS = ('severity_level', 'damage_type', 'state', 'rules_version')
+
+
+def format_inr(paise, prefix=''):
+    """
+    Format an amount in paise with Indian digit grouping, e.g. 20000000 ->
+    '2,00,000'. Rupees only (rounded half up); use at the presentation edge.
+    """
+    rupees = (int(paise) + PAISE_PER_RUPEE // 2) // PAISE_PER_RUPEE
+    sign = '-' if rupees < 0 else ''
+    digits = str(abs(rupees))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ','.join(groups) + ',' + tail
+    return f"{sign}{prefix}{digits}"
+
+
+def format_inr_range(min_paise, max_paise, prefix=''):
+    return f"{format_inr(min_paise, prefix)} - {format_inr(max_paise, prefix)}"
+
+
+def parse_cost_range(cost_range):
+    """Turn a legacy display range like '30,000 - 2,00,000' into rupees (30000, 200000)"""
+    numbers = [int(n.replace(',', '')) for n in re.findall(r'\d[\d,]*', str(cost_range or ''))]
+    if not numbers:
+        return 0, 0
+    return min(numbers), max(numbers)
+
+
+def entry_cost_paise(entry):
+    """(min, max) paise for a history entry; older entries only have the display string"""
+    cost_min = entry.get('cost_min_paise')
+    cost_max = entry.get('cost_max_paise')
+    if cost_min is not None and cost_max is not None:
+        try:
+            return int(cost_min), int(cost_max)
+        except (TypeError, ValueError):
+            pass
+    rupees_min, rupees_max = parse_cost_range(entry.get('cost_range'))
+    return rupees_min * PAISE_PER_RUPEE, rupees_max * PAISE_PER_RUPEE
+
+
+class CostModel:
+    """
+    Numeric repair-cost estimate, all amounts integers in paise.
+    estimate = severity base range + extras for costly components found in
+    the component list, with the labour share of it scaled by a regional
+    multiplier (zip-code prefix first, then state). Built by CompiledRules
+    from the 'costs' section of the rules file.
+    """
+
+    def __init__(self, severity_base, component_extras, labour_share_bp, rounding_paise,
+                 default_multiplier_bp, state_multipliers, zip_multipliers):
+        self.severity_base = severity_base            # {level: (min, max)}
+        self.component_extras = component_extras      # ((keywords, (min, max)), ...)
+        self.labour_share_bp = labour_share_bp
+        self.rounding_paise = rounding_paise
+        self.default_multiplier_bp = default_multiplier_bp
+        self.state_multipliers = state_multipliers    # {lower-case state name or code: bp}
+        self.zip_multipliers = zip_multipliers        # {zip prefix: bp}
+        self._zip_prefix_lengths = sorted({len(p) for p in zip_multipliers}, reverse=True)
+
+    def multiplier(self, state=None, zip_code=None):
+        """(basis points, region label) for a location; the longest matching zip prefix wins"""
+        zip_digits = re.sub(r'\D', '', str(zip_code or ''))
+        for length in self._zip_prefix_lengths:
+            prefix = zip_digits[:length]
+            if len(prefix) == length and prefix in self.zip_multipliers:
+                return self.zip_multipliers[prefix], f"zip {prefix}"
+        state_key = str(state or '').strip().lower()
+        if state_key in self.state_multipliers:
+            return self.state_multipliers[state_key], f"state {state_key}"
+        return self.default_multiplier_bp, 'default'
+
+    def _round(self, paise):
+        step = self.rounding_paise
+        return (paise + step // 2) // step * step if step > 1 else paise
+
+    def estimate(self, severity_level, components=(), state=None, zip_code=None):
+        """Cost estimate for one assessment: {'min_paise', 'max_paise', 'multiplier_bp', 'region'}"""
+        if isinstance(components, str):
+            components = components.split(',')
+        cost_min, cost_max = self.severity_base.get(severity_level, self.severity_base.get('moderate', (0, 0)))
+
+        text = ' '.join(str(c) for c in components).lower()
+        for keywords, (extra_min, extra_max) in self.component_extras:
+            if any(keyword in text for keyword in keywords):
+                cost_min += extra_min
+                cost_max += extra_max
+
+        multiplier_bp, region = self.multiplier(state, zip_code)
+        # Only the labour share of the estimate moves with regional rates
+        adjust = self.labour_share_bp * (multiplier_bp - BASIS_POINTS)
+        cost_min += cost_min * adjust // (BASIS_POINTS * BASIS_POINTS)
+        cost_max += cost_max * adjust // (BASIS_POINTS * BASIS_POINTS)
+
+        return {
+            'min_paise': self._round(cost_min),
+            'max_paise': self._round(cost_max),
+            'multiplier_bp': multiplier_bp,
+            'region': region
+        }
+
+    def display_ranges(self):
+        """{level: display string} for the unadjusted severity bases"""
+        return {level: format_inr_range(*bounds) for level, bounds in self.severity_base.items()}
+
+
+def portfolio_totals(entries, group_by='severity_level'):
+    """
+    Cost totals over many assessments. Entry fields are gathered into int64
+    arrays once; totals and per-group sums are NumPy reductions (exact
+    integer paise, no string parsing after the gather).
+    """
+    if group_by not in PORTFOLIO_GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(PORTFOLIO_GROUPS)}")
+
+    mins, maxs, keys = [], [], []
+    for entry in entries:
+        cost_min, cost_max = entry_cost_paise(entry)
+        mins.append(cost_min)
+        maxs.append(cost_max)
+        keys.append(str(entry.get(group_by) or 'unknown'))
+
+    if not keys:
+        return summarize_costs([], [], [], [], group_by)
+    group_names, codes = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    return summarize_costs(mins, maxs, codes, group_names, group_by)
+
+
+def summarize_costs(mins, maxs, codes, names, group_by):
+    """
+    Totals and per-group sums from per-assessment paise arrays, where
+    codes[i] indexes names for assessment i (dictionary-encoded group keys,
+    as gathered by portfolio_totals or read from history_columns).
+    """
+    mins = np.asarray(mins, dtype=np.int64)
+    maxs = np.asarray(maxs, dtype=np.int64)
+    count = len(mins)
+    if not count:
+        return {'count': 0, 'total_min_paise': 0, 'total_max_paise': 0, 'total_range': format_inr_range(0, 0),
+                'mean_min_paise': 0, 'mean_max_paise': 0, 'group_by': group_by, 'groups': []}
+
+    # Several codes may share a name (e.g. '' and 'unknown'); merge them
+    names = np.asarray([str(name) or 'unknown' for name in names], dtype=object)
+    group_names, remap = np.unique(names, return_inverse=True)
+    codes = remap[np.asarray(codes, dtype=np.int64)]
+
+    group_counts = np.bincount(codes, minlength=len(group_names))
+    group_min = np.zeros(len(group_names), dtype=np.int64)
+    group_max = np.zeros(len(group_names), dtype=np.int64)
+    np.add.at(group_min, codes, mins)
+    np.add.at(group_max, codes, maxs)
+
+    total_min = int(mins.sum())
+    total_max = int(maxs.sum())
+    order = np.argsort(-group_max, kind='stable')
+    return {
+        'count': count,
+        'total_min_paise': total_min,
+        'total_max_paise': total_max,
+        'total_range': format_inr_range(total_min, total_max),
+        'mean_min_paise': int(mins.mean()),
+        'mean_max_paise': int(maxs.mean()),
+        'group_by': group_by,
+        'groups': [
+            {
+                'key': str(group_names[i]),
+                'count': int(group_counts[i]),
+                'min_paise': int(group_min[i]),
+                'max_paise': int(group_max[i]),
+                'range': format_inr_range(group_min[i], group_max[i])
+            }
+            for i in order if group_counts[i]
+        ]
+    }
@@ -2,230 +2,199 @@ import re
 import random
 from datetime import datetime
 
+from cost_engine import format_inr_range
+from description_templates import render_description
+from lazy_imports import lazy_module, optional_module
+from scoring_rules import default_store
+
+np = lazy_module('numpy')
+# SciPy is optional; score_batch falls back to dense matrices
+sparse = optional_module('scipy.sparse')
+
 class DescriptionGenerator:
-    def __init__(self):
-        print("✅ Enhanced Description Generator initialized!")
-        
-        # Define damage component keywords
-        self.component_keywords = {
-            'glass': ['windshield', 'window', 'glass', 'pane', 'mirror'],
-            'body': ['roof', 'hood', 'door', 'fender', 'bumper', 'panel', 'quarter panel'],
-            'paint': ['paint', 'finish', 'clear coat', 'primer', 'color'],
-            'structural': ['frame', 'chassis', 'support', 'beam', 'pillar'],
-            'electrical': ['headlight', 'taillight', 'signal', 'wiring', 'battery'],
-            'interior': ['seat', 'dashboard', 'carpet', 'upholstery', 'console'],
-            'flood': ['water', 'moisture', 'damp', 'wet', 'flood', 'submerged']  # Added flood keywords
-        }
-        
-        # Cost ranges in INR - ADJUSTED FOR REALISM
-        self.cost_ranges = {
-            'minor': '2,000 - 8,000',      # Very minor cosmetic fixes
-            'moderate': '8,000 - 30,000',  # Functional repairs
-            'severe': '30,000 - 2,00,000'  # Major structural repairs
-        }
-        
-        # Repair levels - ADJUSTED
-        self.repair_levels = {
-            'minor': 'Low (cosmetic repair)',
-            'moderate': 'Medium (functional repair)',
-            'severe': 'High (structural/critical repair)'
+    def __init__(self, seed=None, rules=None, quiet=False):
+        # quiet skips the banner for throwaway instances (rules benchmarking)
+        if not quiet:
+            print("✅ Enhanced Description Generator initialized!")
+        
+        # Random source for the flood bias and component wording; pass a seed
+        # for deterministic scoring (evaluation runs, batch/scalar comparisons)
+        self.rng = random.Random(seed) if seed is not None else random
+        
+        # Scoring tables come from the versioned rules file (rules/scoring_rules.json).
+        # Pass a CompiledRules to pin one rule set; by default the shared store
+        # is used, which picks up edits to the file without a restart.
+        self._rules = rules if rules is not None else default_store()
+
+    @property
+    def rules(self):
+        """The active CompiledRules; take it once per assessment so a reload can't split one"""
+        # Either a pinned CompiledRules or a RulesStore that hot-reloads
+        if hasattr(self._rules, 'get'):
+            return self._rules.get()
+        return self._rules
+
+    @property
+    def cost_ranges(self):
+        return self.rules.cost_ranges
+
+    @property
+    def repair_levels(self):
+        return self.rules.repair_levels
+
+    def estimate_cost(self, severity_level, affected_components, user_data=None, rules=None):
+        """Numeric estimate (paise) for the claimant's region plus its display string"""
+        rules = rules or self.rules
+        user_data = user_data or {}
+        estimate = rules.cost_model.estimate(
+            severity_level, affected_components, user_data.get('state'), user_data.get('zip_code')
+        )
+        return estimate, format_inr_range(estimate['min_paise'], estimate['max_paise'])
+
+    @staticmethod
+    def cost_fields(estimate):
+        """Numeric cost fields stored alongside the display cost_range"""
+        return {
+            'cost_min_paise': estimate['min_paise'],
+            'cost_max_paise': estimate['max_paise'],
+            'cost_multiplier_bp': estimate['multiplier_bp']
         }
 
-    def calculate_severity_score(self, caption, damage_type):
+    def calculate_severity_score(self, caption, damage_type, rules=None):
         """Calculate AI-based severity score 0-100 based on keywords and damage type."""
+        rules = rules or self.rules
+        
         # Defensive coercion
         caption_text = "" if caption is None else str(caption)
         caption_lower = caption_text.lower()
         damage_type_lower = str(damage_type).lower() if damage_type else ""
         
-        # Start with SIGNIFICANTLY INCREASED base scores for FLOOD damage
-        base_scores = {
-            # Severe damage types (INCREASED FLOOD SCORE)
-            'fire': 40, 'burn': 40, 'blaze': 50,
-            'collision': 45, 'crash': 50, 'accident': 45, 'impact': 40,
-            
-            # FLOOD/WATER damage types (SIGNIFICANTLY INCREASED)
-            'flood': 65, 'water': 60, 'submerged': 70, 'inundated': 68,
-            
-            # Moderate damage types
-            'storm': 30, 'wind': 25, 'tree': 35, 'branch': 25,
-            
-            # Mild damage types
-            'hail': 20, 'ice': 15, 'stone': 10,
-            'rain': 25, 'leak': 20,
-            'vandalism': 20, 'scratch': 5, 'broken': 25,
-            'theft': 15, 'burglary': 10,
-            'smoke': 25
-        }
+        # Every scoring keyword is looked up once; the tables below test this set
+        hits = rules.matches(caption_lower)
+        is_flood = rules.is_flood(damage_type_lower)
         
         # Find matching damage type for base score - FLOOD GETS HIGH SCORE
-        score = 15  # Default base for unknown/mild damage
+        score = rules.default_base_score  # Default base for unknown/mild damage
         
-        for damage_key, damage_score in base_scores.items():
+        for damage_key, damage_score in rules.base_scores:
             if damage_key in damage_type_lower:
                 score = damage_score
                 print(f"DEBUG: Matched damage type '{damage_key}' with base score {damage_score}")
                 break
         
         # FLOOD-SPECIFIC BOOST: If flood damage, add extra points for specific indicators
-        if any(flood_word in damage_type_lower for flood_word in ['flood', 'water', 'submerged']):
+        if is_flood:
             # Check for severity indicators in caption that would increase flood severity
-            flood_severity_indicators = {
-                'severe': [('completely', 25), ('fully', 20), ('entirely', 18), 
-                          ('submerged', 30), ('deep', 20), ('standing', 15),
-                          ('sewage', 25), ('contaminated', 20), ('mud', 15),
-                          ('electrical', 20), ('engine', 25), ('interior', 20),
-                          ('seat', 15), ('carpet', 15), ('upholstery', 15)],
-                
-                'moderate': [('partially', 10), ('water', 15), ('moisture', 10),
-                            ('damp', 8), ('wet', 8), ('leak', 10), ('rain', 12)],
-                
-                'minor': [('splash', -10), ('spray', -10), ('light', -15)]
-            }
-            
             # Apply flood-specific indicators
             applied_flood_indicators = []
             
             # First check for severe flood indicators
-            for keyword, points in flood_severity_indicators['severe']:
-                if keyword in caption_lower:
+            for keyword, points in rules.flood_severity_indicators['severe']:
+                if keyword in hits:
                     score += points
                     applied_flood_indicators.append((f"flood_severe_{keyword}", points))
                     print(f"DEBUG: Applied flood severe indicator '{keyword}': +{points}")
             
             # Then moderate
-            for keyword, points in flood_severity_indicators['moderate']:
-                if keyword in caption_lower:
+            for keyword, points in rules.flood_severity_indicators['moderate']:
+                if keyword in hits:
                     score += points
                     applied_flood_indicators.append((f"flood_moderate_{keyword}", points))
                     print(f"DEBUG: Applied flood moderate indicator '{keyword}': +{points}")
             
             # Minor indicators reduce score
-            for keyword, points in flood_severity_indicators['minor']:
-                if keyword in caption_lower:
+            for keyword, points in rules.flood_severity_indicators['minor']:
+                if keyword in hits:
                     score += points
                     applied_flood_indicators.append((f"flood_minor_{keyword}", points))
                     print(f"DEBUG: Applied flood minor indicator '{keyword}': +{points}")
             
             # Special FLOOD SEVERITY BOOST: Ensure flood mostly shows severe
             # Add a random boost to ensure 70% severe, 30% moderate
-            flood_random_boost = random.randint(0, 100)
-            if flood_random_boost < 70:  # 70% chance for severe boost
-                boost_amount = random.randint(15, 25)
+            flood_random_boost = self.rng.randint(0, 100)
+            if flood_random_boost < rules.flood_boost_chance:  # 70% chance for severe boost
+                boost_amount = self.rng.randint(*rules.flood_boost_range)
                 score += boost_amount
                 applied_flood_indicators.append(("flood_severity_boost", boost_amount))
                 print(f"DEBUG: Applied flood severity boost: +{boost_amount}")
             
             print(f"DEBUG: Flood-specific indicators applied: {applied_flood_indicators}")
         
-        # Severity indicators from caption - COMPLETELY REBALANCED POINTS
-        severity_indicators = {
-            'severe': [('severe', 40), ('major', 35), ('extensive', 40), ('destroyed', 50), 
-                      ('totaled', 50), ('demolished', 45), ('structural', 35),
-                      ('critical', 40), ('dangerous', 35), ('unsafe', 35),
-                      ('frame', 30), ('chassis', 30), ('support', 25)],
-            
-            'moderate': [('moderate', 20), ('multiple', 15), ('several', 12), ('significant', 18),
-                        ('bent', 17), ('twisted', 20), ('cracks', 15),
-                        ('broken', 20), ('shattered', 25), ('smashed', 25)],
-            
-            'minor': [('minor', -10), ('small', -10), ('slight', -15), ('light', -20),
-                     ('few', -12), ('scratch', -15), ('scratches', -15), ('ding', -10),
-                     ('chip', -10), ('mark', -20), ('cosmetic', -25), ('superficial', -30),
-                     ('surface', -15), ('paint', -10), ('finish', -10), ('touch', -12)]
-        }
-        
         # Apply severity adjustments from caption - ALLOW MULTIPLE
         applied_indicators = []
         
         # Check minor indicators first - these should strongly reduce score
-        for keyword, points in severity_indicators['minor']:
-            if keyword in caption_lower:
+        for keyword, points in rules.severity_indicators['minor']:
+            if keyword in hits:
                 score += points
                 applied_indicators.append((keyword, points))
         
         # Then check moderate indicators
-        for keyword, points in severity_indicators['moderate']:
-            if keyword in caption_lower:
+        for keyword, points in rules.severity_indicators['moderate']:
+            if keyword in hits:
                 score += points
                 applied_indicators.append((keyword, points))
         
         # Finally check severe indicators
-        for keyword, points in severity_indicators['severe']:
-            if keyword in caption_lower:
+        for keyword, points in rules.severity_indicators['severe']:
+            if keyword in hits:
                 score += points
                 applied_indicators.append((keyword, points))
         
-        # Add score for damage extent indicators - REBALANCED
-        extent_indicators = [
-            ('completely', 35), ('fully', 30), ('entirely', 28),
-            ('partially', 15), ('mostly', 20), ('largely', 18),
-            ('slightly', -25), ('lightly', -30), ('barely', -35)
-        ]
-        
-        for indicator, points in extent_indicators:
-            if indicator in caption_lower:
+        # Add score for damage extent indicators (first match only)
+        for indicator, points in rules.extent_indicators:
+            if indicator in hits:
                 score += points
                 applied_indicators.append((indicator, points))
                 break
         
-        # Add score for urgency indicators - REBALANCED
-        urgency_indicators = [
-            ('urgent', 30), ('immediate', 35), ('emergency', 40),
-            ('prompt', 25), ('quick', 20), ('asap', 30)
-        ]
-        
-        for indicator, points in urgency_indicators:
-            if indicator in caption_lower:
+        # Add score for urgency indicators (first match only)
+        for indicator, points in rules.urgency_indicators:
+            if indicator in hits:
                 score += points
                 applied_indicators.append((indicator, points))
                 break
         
         # Additional contextual adjustments - FLOOD-SPECIFIC
-        if any(flood_word in damage_type_lower for flood_word in ['flood', 'water', 'submerged']):
+        if is_flood:
             # Flood-specific adjustments
-            if 'engine' in caption_lower or 'electrical' in caption_lower:
-                score += 25  # Severe if engine/electrical affected
-            if 'interior' in caption_lower or 'seat' in caption_lower or 'carpet' in caption_lower:
-                score += 20  # Interior flood damage is severe
-            if 'mold' in caption_lower or 'mildew' in caption_lower:
-                score += 15  # Mold risk increases severity
-            if 'sewage' in caption_lower or 'contaminated' in caption_lower:
-                score += 25  # Contaminated water is very severe
+            for keywords, points in rules.flood_context_adjustments:
+                if any(keyword in hits for keyword in keywords):
+                    score += points
         else:
             # Original adjustments for non-flood damage
-            if 'dent' in caption_lower or 'dents' in caption_lower:
-                if any(word in caption_lower for word in ['small dent', 'minor dent', 'tiny dent', 'little dent']):
-                    score -= 15
-                elif 'large dent' in caption_lower or 'big dent' in caption_lower:
-                    score += 20
+            if 'dent' in hits:
+                if any(word in hits for word in rules.small_dent_phrases):
+                    score += rules.small_dent_points
+                elif any(word in hits for word in rules.large_dent_phrases):
+                    score += rules.large_dent_points
                 else:
-                    score += 10
+                    score += rules.other_dent_points
             
-            if 'scratch' in caption_lower:
-                if any(word in caption_lower for word in ['deep scratch', 'long scratch', 'severe scratch']):
-                    score += 15
+            if 'scratch' in hits:
+                if any(word in hits for word in rules.deep_scratch_phrases):
+                    score += rules.deep_scratch_points
                 else:
-                    score -= 20
+                    score += rules.other_scratch_points
         
         # FLOOD FINAL ADJUSTMENT: Ensure minimum score for flood
-        if any(flood_word in damage_type_lower for flood_word in ['flood', 'water', 'submerged']):
+        if is_flood:
             # Set minimum score to ensure mostly severe/moderate
-            if score < 40:  # If score is too low, boost it
-                score = random.randint(40, 80)
+            if score < rules.flood_minimum_score:  # If score is too low, boost it
+                score = self.rng.randint(*rules.flood_minimum_range)
                 print(f"DEBUG: Adjusted low flood score to: {score}")
             
             # Apply flood bias: 70% chance severe, 30% chance moderate
-            if random.randint(1, 100) <= 70:
+            if self.rng.randint(1, 100) <= rules.flood_severe_chance:
                 # Ensure severe range
-                if score < 51:
-                    score = random.randint(51, 85)
+                if score < rules.flood_severe_range[0]:
+                    score = self.rng.randint(*rules.flood_severe_range)
             else:
                 # Ensure moderate range
-                if score < 26:
-                    score = random.randint(26, 50)
-                elif score > 50:
-                    score = random.randint(40, 50)
+                if score < rules.flood_moderate_floor_range[0]:
+                    score = self.rng.randint(*rules.flood_moderate_floor_range)
+                elif score > rules.flood_moderate_floor_range[1]:
+                    score = self.rng.randint(*rules.flood_moderate_cap_range)
         
         # Ensure score is within bounds
         score = min(100, max(0, score))
@@ -238,58 +207,225 @@ class DescriptionGenerator:
         
         return score
 
-    def determine_severity_level(self, score):
+    def determine_severity_level(self, score, rules=None):
         """Convert score to severity level"""
-        if score >= 51:
-            return 'severe'
-        elif score >= 26:
-            return 'moderate'
+        return (rules or self.rules).level_for(score)
+
+    @staticmethod
+    def _factorize(values):
+        """Hash-based dictionary encoding: (distinct values, int code per value)"""
+        values = list(values)
+        index = {v: i for i, v in enumerate(dict.fromkeys(values))}
+        codes = np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+        return list(index), codes
+
+    @staticmethod
+    def _keyword_hits(texts, vocabulary):
+        """
+        (row, column) of every keyword occurrence in texts, in one pass over
+        the UTF-8 bytes of all texts joined: positions whose first two bytes
+        start some keyword are the candidates, each keyword then checks the
+        rest of its bytes only at its own candidates. Byte substring matches
+        are the same as `keyword in text` on the strings, and the NUL that
+        joins texts can't be part of a match (rules keywords never hold one).
+        """
+        encoded = [t.encode('utf-8', 'surrogatepass') for t in texts]
+        keywords = [(keyword.encode('utf-8', 'surrogatepass'), j) for keyword, j in vocabulary.items() if keyword]
+        pad = max((len(k) for k, _ in keywords), default=0)
+        data = np.frombuffer(b'\x00'.join(encoded) + b'\x00' * pad, dtype=np.uint8)
+        starts = np.cumsum([0] + [len(e) + 1 for e in encoded[:-1]])
+        
+        # Candidate positions grouped by their leading byte pair
+        pairs = (data[:-1].astype(np.uint16) << 8) | data[1:]
+        wanted = np.zeros(1 << 16, dtype=bool)
+        wanted[[(k[0] << 8) | k[1] for k, _ in keywords if len(k) > 1]] = True
+        candidates = np.flatnonzero(wanted[pairs])
+        candidate_pairs = pairs[candidates]
+        order = np.argsort(candidate_pairs, kind='stable')
+        candidates, candidate_pairs = candidates[order], candidate_pairs[order]
+        
+        rows, cols = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for keyword, j in keywords:
+            if len(keyword) == 1:
+                positions = np.flatnonzero(data == keyword[0])
+            else:
+                lo, hi = np.searchsorted(candidate_pairs, [(keyword[0] << 8) | keyword[1], ((keyword[0] << 8) | keyword[1]) + 1])
+                positions = candidates[lo:hi]
+                for i in range(2, len(keyword)):
+                    positions = positions[data[positions + i] == keyword[i]]
+            hits = np.unique(np.searchsorted(starts, positions, side='right') - 1)
+            rows.append(hits)
+            cols.append(np.full(hits.size, j, dtype=np.int64))
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def score_batch(self, captions, damage_types, seed=None):
+        """
+        Vectorized calculate_severity_score + determine_severity_level for many
+        captions at once. Captions are deduplicated and matched against the
+        keyword vocabulary once, producing a sparse caption-by-keyword matrix;
+        scores are then matrix products plus vectorized clamping and banding.
+        Flood rows still draw their random bias in row order, so with the same
+        seed the results equal calling the scalar path row by row.
+        Returns {'severity_score': int array, 'severity_level': str array,
+        'rules_version': str}.
+        
+        Speed versus the scalar loop (50k rows, debug output discarded): ~45x
+        when captions repeat (300 distinct) and no row is flood, ~20x with a
+        quarter flood rows, ~15x at 5k distinct captions and only ~6-7x when
+        every caption is distinct. The 50-100x target is reached only in the
+        first case: each flood row's random draws stay a Python loop (needed
+        for scalar-equal results), and every distinct caption is still
+        lowercased and scanned once.
+        """
+        if len(captions) != len(damage_types):
+            raise ValueError("captions and damage_types must have the same length")
+        rng = random.Random(seed) if seed is not None else self.rng
+        rules = self.rules
+        
+        if len(captions) == 0:
+            return {'severity_score': np.zeros(0, dtype=np.int64), 'severity_level': np.array([], dtype=str),
+                    'rules_version': rules.version}
+        
+        # Tokenize once: unique lowercased captions and damage types. The raw
+        # values are deduplicated first, so only distinct ones are lowercased
+        raw_captions, raw_caption_index = self._factorize(captions)
+        unique_captions, caption_remap = self._factorize("" if c is None else str(c).lower() for c in raw_captions)
+        caption_index = caption_remap[raw_caption_index]
+        raw_types, raw_type_index = self._factorize(damage_types)
+        unique_types, type_remap = self._factorize(str(d).lower() if d else "" for d in raw_types)
+        type_index = type_remap[raw_type_index]
+        
+        # Base score and flood flag per distinct damage type
+        type_base = np.full(len(unique_types), rules.default_base_score, dtype=np.int64)
+        type_flood = np.zeros(len(unique_types), dtype=bool)
+        for t, damage_type_lower in enumerate(unique_types):
+            for damage_key, damage_score in rules.base_scores:
+                if damage_key in damage_type_lower:
+                    type_base[t] = damage_score
+                    break
+            type_flood[t] = rules.is_flood(damage_type_lower)
+        
+        # Keyword vocabulary and per-table column/points lists are precompiled in
+        # the rules; the presence matrix uses substring matches, exactly like the
+        # scalar `keyword in caption_lower` checks
+        vocabulary = rules.vocabulary
+        flood_weights = rules.flood_weight_columns
+        severity_weights = rules.severity_weight_columns
+        extent_columns = rules.extent_columns
+        urgency_columns = rules.urgency_columns
+        context_columns = rules.context_columns
+        dent_column = rules.dent_column
+        small_dent_columns = list(rules.small_dent_columns)
+        large_dent_columns = list(rules.large_dent_columns)
+        scratch_column = rules.scratch_column
+        deep_scratch_columns = list(rules.deep_scratch_columns)
+        
+        rows, cols = self._keyword_hits(unique_captions, vocabulary)
+        shape = (len(unique_captions), len(vocabulary))
+        if sparse is not None:
+            terms = sparse.csr_matrix((np.ones(rows.size, dtype=np.int64), (rows, cols)), shape=shape)
+            dense_columns = lambda js: terms[:, js].toarray().astype(bool)
         else:
-            return 'minor'
+            terms = np.zeros(shape, dtype=np.int64)
+            terms[rows, cols] = 1
+            dense_columns = lambda js: terms[:, js].astype(bool)
+        
+        def weight_vector(pairs):
+            w = np.zeros(len(vocabulary), dtype=np.int64)
+            for j, points in pairs:
+                w[j] += points
+            return w
+        
+        def first_match(pairs):
+            present = dense_columns([j for j, _ in pairs])
+            points = np.array([p for _, p in pairs], dtype=np.int64)
+            return np.where(present.any(axis=1), points[present.argmax(axis=1)], 0)
+        
+        flood_add = np.asarray(terms @ weight_vector(flood_weights)).ravel()
+        caption_add = (np.asarray(terms @ weight_vector(severity_weights)).ravel()
+                       + first_match(extent_columns) + first_match(urgency_columns))
+        
+        flood_context = np.zeros(len(unique_captions), dtype=np.int64)
+        for js, points in context_columns:
+            flood_context += np.where(dense_columns(js).any(axis=1), points, 0)
+        
+        dent = dense_columns([dent_column])[:, 0]
+        small_dent = dense_columns(small_dent_columns).any(axis=1)
+        large_dent = dense_columns(large_dent_columns).any(axis=1)
+        scratch = dense_columns([scratch_column])[:, 0]
+        deep_scratch = dense_columns(deep_scratch_columns).any(axis=1)
+        other_context = (np.where(dent, np.where(small_dent, rules.small_dent_points,
+                                                 np.where(large_dent, rules.large_dent_points, rules.other_dent_points)), 0)
+                         + np.where(scratch, np.where(deep_scratch, rules.deep_scratch_points, rules.other_scratch_points), 0))
+        
+        # Expand back to rows
+        is_flood = type_flood[type_index]
+        before_boost = type_base[type_index] + np.where(is_flood, flood_add[caption_index], 0)
+        after_boost = caption_add[caption_index] + np.where(
+            is_flood, flood_context[caption_index], other_context[caption_index])
+        scores = before_boost + after_boost
+        
+        # Flood rows: random bias drawn in row order, same sequence as the scalar path
+        flood_rows = np.flatnonzero(is_flood)
+        randint = rng.randint
+        boost_chance, boost_range = rules.flood_boost_chance, rules.flood_boost_range
+        minimum_score, minimum_range = rules.flood_minimum_score, rules.flood_minimum_range
+        severe_chance, severe_range = rules.flood_severe_chance, rules.flood_severe_range
+        floor_range, cap_range = rules.flood_moderate_floor_range, rules.flood_moderate_cap_range
+        flood_scores = []
+        for score, boost in zip(before_boost[flood_rows].tolist(), after_boost[flood_rows].tolist()):
+            if randint(0, 100) < boost_chance:
+                score += randint(*boost_range)
+            score += boost
+            if score < minimum_score:
+                score = randint(*minimum_range)
+            if randint(1, 100) <= severe_chance:
+                if score < severe_range[0]:
+                    score = randint(*severe_range)
+            else:
+                if score < floor_range[0]:
+                    score = randint(*floor_range)
+                elif score > floor_range[1]:
+                    score = randint(*cap_range)
+            flood_scores.append(score)
+        scores[flood_rows] = flood_scores
+        
+        scores = np.clip(scores, 0, 100)
+        levels = np.select(
+            [scores >= minimum for minimum, _ in rules.severity_bands],
+            [level for _, level in rules.severity_bands],
+            default=rules.default_level
+        )
+        return {'severity_score': scores, 'severity_level': levels, 'rules_version': rules.version}
+
+    @staticmethod
+    def _region_zone(region):
+        """Vertical band of the photo ('upper', 'central' or 'lower') a damage map region is centred in"""
+        cy = region['y'] + region['h'] / 2
+        return 'upper' if cy < 0.4 else 'lower' if cy > 0.6 else 'central'
 
-    def detect_affected_components(self, caption, damage_type):
-        """Detect affected components from caption and damage type"""
+    def detect_affected_components(self, caption, damage_type, damage_map=None, rules=None):
+        """Detect affected components from caption, damage type and optional damage map"""
+        rules = rules or self.rules
         caption_text = "" if caption is None else str(caption)
         caption_lower = caption_text.lower()
         damage_type_lower = str(damage_type).lower() if damage_type else ""
         detected_components = []
         
-        # Damage-type specific components - ENHANCED FLOOD COMPONENTS
-        damage_components = {
-            'fire': ['Charred surfaces', 'Soot damage', 'Heat-affected areas', 'Burn marks'],
-            'flood': ['Water damage throughout vehicle', 'Moisture intrusion in interior', 
-                     'Electrical system damage', 'Engine compartment flooding',
-                     'Upholstery and carpet water damage', 'Potential mold/mildew growth',
-                     'Corroded metal components', 'Contaminated fluid systems'],
-            'water': ['Water damage throughout vehicle', 'Moisture intrusion in interior', 
-                     'Electrical system damage', 'Engine compartment flooding',
-                     'Upholstery and carpet water damage', 'Potential mold/mildew growth',
-                     'Corroded metal components', 'Contaminated fluid systems'],
-            'hail': ['Dented body panels', 'Broken glass', 'Pitted surfaces', 'Cracked trim'],
-            'storm': ['Wind damage', 'Debris impact', 'Water intrusion', 'Structural stress'],
-            'collision': ['Body damage', 'Structural misalignment', 'Paint scratches', 'Broken parts'],
-            'vandalism': ['Paint scratches', 'Broken glass', 'Dented panels', 'Graffiti damage']
-        }
-        
         # Add damage-type specific components
-        for damage_key, components in damage_components.items():
+        for damage_key, components in rules.damage_components.items():
             if damage_key in damage_type_lower:
                 for component in components:
                     if component not in detected_components:
                         detected_components.append(component)
         
         # Detect from caption keywords - ADDED FLOOD-SPECIFIC DETECTION
-        for component_type, keywords in self.component_keywords.items():
+        for component_type, keywords in rules.component_keywords.items():
             for keyword in keywords:
                 if keyword in caption_lower:
                     # Format component names with FLOOD-SPECIFIC enhancements
                     if component_type == 'flood':
-                        comp_name = random.choice([
-                            'Complete water immersion damage',
-                            'Flood water contamination',
-                            'Submerged component failure',
-                            'Water damage to all systems'
-                        ])
+                        comp_name = self.rng.choice(rules.flood_component_choices)
                     elif component_type == 'glass':
                         comp_name = 'Broken windshield' if 'windshield' in caption_lower else 'Window glass damage'
                     elif component_type == 'body':
@@ -315,45 +451,59 @@ class DescriptionGenerator:
         
         # Default components if none detected - ENHANCED FOR FLOOD
         if not detected_components:
-            if any(word in damage_type_lower for word in ['flood', 'water', 'submerged']):
-                detected_components = [
-                    'Complete water damage assessment required',
-                    'Electrical system inspection needed',
-                    'Interior water extraction required',
-                    'Potential mold remediation',
-                    'Engine and mechanical system evaluation'
-                ]
-            elif 'fire' in damage_type_lower:
-                detected_components = ['Charred surfaces', 'Soot damage', 'Heat-affected areas']
-            elif 'hail' in damage_type_lower:
-                detected_components = ['Dented panels', 'Body damage', 'Paint damage']
-            else:
-                detected_components = ['Body damage', 'Paint scratches']
+            for match, components in rules.default_components:
+                if not match or any(word in damage_type_lower for word in match):
+                    detected_components = list(components)
+                    break
+        
+        # Damage map regions (ImageCaptioner.generate_damage_map) don't name components;
+        # components usually seen where the hot regions are move to the front
+        if damage_map and damage_map.get('regions'):
+            zone_weight = {}
+            for region in damage_map['regions']:
+                zone = self._region_zone(region)
+                zone_weight[zone] = zone_weight.get(zone, 0) + region.get('score', 0) * region.get('tiles', 1)
+            
+            def located_weight(component):
+                name = component.lower()
+                return max((weight for zone, weight in zone_weight.items()
+                            if any(word in name for word in rules.component_zones.get(zone, ()))), default=0)
+            
+            # Stable sort: components without a zone keep their order
+            detected_components.sort(key=located_weight, reverse=True)
         
         return detected_components
 
-    def enhance_description_with_features(self, image_caption, damage_type, user_data=None):
-        """Generate enhanced description with all new features - FIXED VERSION"""
+    def enhance_description_with_features(self, image_caption, damage_type, user_data=None, damage_map=None,
+                                          severity_score=None, rules=None):
+        """
+        Generate enhanced description with all new features - FIXED VERSION.
+        severity_score / rules let enhance_batch pass in a score it already
+        computed with score_batch.
+        """
         # Defensive: ensure caption is string to avoid attribute errors
         image_caption_text = "" if image_caption is None else str(image_caption)
+        # One rule set for the whole assessment, even if a reload lands mid-way
+        rules = rules or self.rules
         try:
             # Calculate severity score and level
-            severity_score = self.calculate_severity_score(image_caption_text, damage_type)
-            severity_level = self.determine_severity_level(severity_score)
+            if severity_score is None:
+                severity_score = self.calculate_severity_score(image_caption_text, damage_type, rules=rules)
+            severity_level = self.determine_severity_level(severity_score, rules=rules)
             
             # Detect affected components
-            affected_components = self.detect_affected_components(image_caption_text, damage_type)
+            affected_components = self.detect_affected_components(image_caption_text, damage_type, damage_map, rules=rules)
             
-            # Get cost range and repair level - USE CONSISTENT VALUES
-            cost_range = self.cost_ranges.get(severity_level, '₹8,000 - ₹30,000')
-            repair_level = self.repair_levels.get(severity_level, 'Medium (functional repair)')
+            # Get cost estimate and repair level - USE CONSISTENT VALUES
+            cost_estimate, cost_range = self.estimate_cost(severity_level, affected_components, user_data, rules=rules)
+            repair_level = rules.repair_levels.get(severity_level, 'Medium (functional repair)')
             
             print(f"DEBUG: Generator returning - Score: {severity_score}, Level: {severity_level}")
             print(f"DEBUG: Components: {affected_components}")
             print(f"DEBUG: Repair: {repair_level}, Cost: {cost_range}")
             
             # Create professional description with THE SAME VALUES
-            description = self.create_enhanced_description(
+            description, sections = self.create_enhanced_report(
                 image_caption_text, 
                 damage_type, 
                 severity_level,
@@ -366,11 +516,14 @@ class DescriptionGenerator:
             
             return {
                 'description': description,
+                'description_sections': sections,
                 'severity_score': severity_score,  # Same as above
                 'severity_level': severity_level,  # Same as above
                 'affected_components': ', '.join(affected_components),  # Consistent format
                 'repair_level': repair_level,  # Same as above
-                'cost_range': cost_range  # Same as above
+                'cost_range': cost_range,  # Same as above
+                **self.cost_fields(cost_estimate),
+                'rules_version': rules.version
             }
             
         except Exception as e:
@@ -382,47 +535,76 @@ class DescriptionGenerator:
             # Determine fallback based on damage type
             damage_type_lower = str(damage_type).lower() if damage_type else ""
             
-            # FLOOD GETS HIGHER FALLBACK SCORE
-            if any(word in damage_type_lower for word in ['flood', 'water', 'submerged']):
-                # Flood gets severe/moderate fallback
-                fallback_score = random.choice([55, 60, 65, 70, 75, 45, 48, 50])  # Mostly severe, some moderate
-                print(f"DEBUG: Using flood fallback score: {fallback_score}")
-            elif 'fire' in damage_type_lower:
-                fallback_score = 45
-            elif 'collision' in damage_type_lower or 'crash' in damage_type_lower:
-                fallback_score = 45
-            else:
-                fallback_score = 20
+            # FLOOD GETS HIGHER FALLBACK SCORE (choices: mostly severe, some moderate)
+            fallback_score = 20
+            for match, score in rules.fallback_scores:
+                if not match or any(word in damage_type_lower for word in match):
+                    if isinstance(score, tuple):
+                        fallback_score = self.rng.choice(score)
+                        print(f"DEBUG: Using fallback score: {fallback_score}")
+                    else:
+                        fallback_score = score
+                    break
             
-            fallback_level = self.determine_severity_level(fallback_score)
-            fallback_components = self.detect_affected_components("", damage_type)
-            fallback_cost = self.cost_ranges.get(fallback_level, '₹8,000 - ₹30,000')
-            fallback_repair = self.repair_levels.get(fallback_level, 'Medium (functional repair)')
+            fallback_level = self.determine_severity_level(fallback_score, rules=rules)
+            fallback_components = self.detect_affected_components("", damage_type, rules=rules)
+            fallback_estimate, fallback_cost = self.estimate_cost(fallback_level, fallback_components, user_data, rules=rules)
+            fallback_repair = rules.repair_levels.get(fallback_level, 'Medium (functional repair)')
             fallback_description = f"Professional assessment confirms {damage_type}. AI analysis indicates {fallback_level} damage level."
             
             print(f"DEBUG: Fallback - Score: {fallback_score}, Level: {fallback_level}")
             
             return {
                 'description': fallback_description,
+                'description_sections': None,
                 'severity_score': fallback_score,
                 'severity_level': fallback_level,
                 'affected_components': ', '.join(fallback_components),
                 'repair_level': fallback_repair,
-                'cost_range': fallback_cost
+                'cost_range': fallback_cost,
+                **self.cost_fields(fallback_estimate),
+                'rules_version': rules.version
             }
 
+    def enhance_batch(self, requests):
+        """
+        enhance_description_with_features for many (caption, damage_type,
+        user_data, damage_map) requests: their severity scores come from one
+        score_batch call, the rest (components, cost, text) is per request.
+        """
+        if not requests:
+            return []
+        rules = self.rules
+        try:
+            captions = ["" if caption is None else str(caption) for caption, _, _, _ in requests]
+            scores = self.score_batch(captions, [damage_type for _, damage_type, _, _ in requests])
+            if scores['rules_version'] == rules.version:
+                scores = scores['severity_score'].tolist()
+            else:
+                scores = [None] * len(requests)  # a reload landed in between; score each one below
+        except Exception as e:
+            print(f"DEBUG: batch scoring failed, scoring one by one: {e}")
+            scores = [None] * len(requests)
+        return [
+            self.enhance_description_with_features(caption, damage_type, user_data, damage_map=damage_map,
+                                                   severity_score=score, rules=rules)
+            for (caption, damage_type, user_data, damage_map), score in zip(requests, scores)
+        ]
+
     def create_enhanced_description(self, caption, damage_type, severity_level, severity_score, 
                                    affected_components, repair_level, cost_range, user_data):
         """Create comprehensive professional description - REMOVED DUPLICATE SUMMARY"""
-        
+        return self.create_enhanced_report(caption, damage_type, severity_level, severity_score,
+                                           affected_components, repair_level, cost_range, user_data)[0]
+
+    def create_enhanced_report(self, caption, damage_type, severity_level, severity_score,
+                               affected_components, repair_level, cost_range, user_data):
+        """(description text, section tree) rendered from the precompiled templates"""
         # Ensure affected_components is a list
         if isinstance(affected_components, str):
             components_list = [comp.strip() for comp in affected_components.split(',')]
         else:
-            components_list = affected_components
-        
-        # Convert to string for display
-        components_str = ', '.join(components_list) if isinstance(components_list, list) else str(components_list)
+            components_list = list(affected_components)
         
         # Debug
         print(f"DEBUG in create_enhanced_description:")
@@ -430,79 +612,7 @@ class DescriptionGenerator:
         print(f"  Components: {components_list}")
         print(f"  Repair: {repair_level}, Cost: {cost_range}")
         
-        # Header with client info if available
-        header = ""
-        if user_data and user_data.get('policy_holder_name'):
-            header = f"CLAIM ASSESSMENT REPORT\n"
-            header += f"Policy Holder: {user_data.get('policy_holder_name', 'N/A')}\n"
-            if user_data.get('contact_email') or user_data.get('contact_phone'):
-                header += f"Contact: {user_data.get('contact_email', '')} {user_data.get('contact_phone', '')}\n"
-            if user_data.get('property_address'):
-                header += f"Location: {user_data.get('property_address', '')}, "
-                header += f"{user_data.get('city', '')}, {user_data.get('state', '')} {user_data.get('zip_code', '')}\n"
-            header += "="*50 + "\n\n"
-        
-        # Detailed Analysis - START HERE (no duplicate summary)
-        analysis = "DETAILED ANALYSIS:\n"
-        analysis += f"Image Analysis: {caption}\n\n"
-        
-        # Use the EXACT same severity level and score
-        severity_descriptions = {
-            'severe': f"CRITICAL DAMAGE DETECTED (Score: {severity_score}/100)\n"
-                      f"The damage assessment indicates extensive structural compromise requiring immediate attention.\n"
-                      f"Multiple critical components are affected, posing safety risks if not addressed promptly.\n",
-            'moderate': f"SIGNIFICANT DAMAGE IDENTIFIED (Score: {severity_score}/100)\n"
-                       f"The assessment reveals considerable damage affecting operational integrity.\n"
-                       f"Professional repairs are necessary to restore full functionality and prevent further deterioration.\n",
-            'minor': f"MINOR DAMAGE OBSERVED (Score: {severity_score}/100)\n"
-                    f"The assessment indicates superficial damage with limited impact on functionality.\n"
-                    f"Repairs can be completed through routine maintenance procedures.\n"
-        }
-        
-        analysis += severity_descriptions.get(severity_level, "")
-        analysis += "\n"
-        
-        # Component Breakdown
-        analysis += "COMPONENT BREAKDOWN:\n"
-        for i, component in enumerate(components_list, 1):
-            analysis += f"{i}. {component}\n"
-        analysis += "\n"
-        
-        # Recommendations
-        recommendations = "RECOMMENDATIONS:\n"
-        
-        if severity_level == 'severe':
-            recommendations += "IMMEDIATE ACTION REQUIRED: Contact certified structural or auto-repair professionals within 24 hours to prevent further deterioration and ensure critical issues are addressed promptly.\n"
-            recommendations += "SAFETY FIRST: Do not enter, touch, or operate the affected area until a qualified technician performs a safety inspection to avoid injury or secondary damage.\n"
-            recommendations += "THOROUGH DOCUMENTATION: Capture high-quality photos and videos of all damaged surfaces from multiple angles, including close-ups, wide shots, and any visible structural impact.\n"
-            recommendations += "PROFESSIONAL ASSESSMENT: Arrange a full structural and functional evaluation to identify hidden issues such as internal cracks, compromised supports, or electrical hazards.\n\n"
-        elif severity_level == 'moderate':
-            recommendations += "PRIORITY REPAIRS: Book repair services within 7-10 days to prevent the moderate damage from escalating into severe structural or functional problems.\n"
-            recommendations += "PREVENTIVE MEASURES: Cover exposed surfaces, seal vulnerable areas, or temporarily isolate the damaged section.\n"
-            recommendations += "MULTIPLE QUOTES: Request 2-3 professional estimates from certified repair shops to compare pricing, part quality, timelines, and warranty options.\n"
-            recommendations += "QUALITY PARTS: Ensure the repair center uses OEM or equivalent high-grade replacement parts to maintain durability, performance, and original manufacturer standards.\n\n"
-        else:
-            recommendations += "SCHEDULED MAINTENANCE: Plan repairs at your convenience—minor issues are not urgent but should still be addressed to maintain long-term safety and appearance.\n"
-            recommendations += "COSMETIC REPAIR: Focus on restoring paint, surface finish, and small dents or scratches to prevent rust formation and keep the property in good condition.\n"
-            recommendations += "PREVENTIVE CARE: After repairs, apply protective coatings, sealants, or wax layers to strengthen surfaces against future exposure or minor impacts.\n"
-            recommendations += "REGULAR INSPECTION: Periodically check the repaired areas for signs of expansion, discoloration, or structural change to ensure the issue remains stable.\n"
-        
-        recommendations += "\n"
-        
-        # Cost Estimate
-        cost_estimate = f"COST ESTIMATE GUIDANCE:\n"
-        cost_estimate += f"Based on damage severity and affected components, the estimated repair cost falls within:\n"
-        cost_estimate += f"**{cost_range}**\n\n"
-        cost_estimate += "Note: This is a preliminary estimate. Actual costs may vary based on:\n"
-        cost_estimate += "- Labor rates in your area\n- Parts availability\n- Additional hidden damage\n- Insurance coverage terms\n"
-        
-        # Footer
-        footer = "\n" + "="*0 + "\n"
-        
-        # Combine all sections - NO DUPLICATE SUMMARY
-        full_description = header + analysis + recommendations + cost_estimate + footer
-        
-        return full_description
+        return render_description(caption, severity_level, severity_score, components_list, cost_range, user_data)
 
     def _get_current_date(self):
         """Get current date in readable format"""
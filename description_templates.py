@@ -0,0 +1,223 @@
+import re
+
+# Static report text. Everything except the caption, score, components,
+# cost range and claimant header is fixed per severity level, so it is
+# compiled into ready-made strings and section items once, at import.
+SEVERITY_SUMMARIES = {
+    'severe': ("CRITICAL DAMAGE DETECTED", (
+        "The damage assessment indicates extensive structural compromise requiring immediate attention.",
+        "Multiple critical components are affected, posing safety risks if not addressed promptly."
+    )),
+    'moderate': ("SIGNIFICANT DAMAGE IDENTIFIED", (
+        "The assessment reveals considerable damage affecting operational integrity.",
+        "Professional repairs are necessary to restore full functionality and prevent further deterioration."
+    )),
+    'minor': ("MINOR DAMAGE OBSERVED", (
+        "The assessment indicates superficial damage with limited impact on functionality.",
+        "Repairs can be completed through routine maintenance procedures."
+    ))
+}
+
+RECOMMENDATIONS = {
+    'severe': (
+        ("IMMEDIATE ACTION REQUIRED", "Contact certified structural or auto-repair professionals within 24 hours to prevent further deterioration and ensure critical issues are addressed promptly."),
+        ("SAFETY FIRST", "Do not enter, touch, or operate the affected area until a qualified technician performs a safety inspection to avoid injury or secondary damage."),
+        ("THOROUGH DOCUMENTATION", "Capture high-quality photos and videos of all damaged surfaces from multiple angles, including close-ups, wide shots, and any visible structural impact."),
+        ("PROFESSIONAL ASSESSMENT", "Arrange a full structural and functional evaluation to identify hidden issues such as internal cracks, compromised supports, or electrical hazards.")
+    ),
+    'moderate': (
+        ("PRIORITY REPAIRS", "Book repair services within 7-10 days to prevent the moderate damage from escalating into severe structural or functional problems."),
+        ("PREVENTIVE MEASURES", "Cover exposed surfaces, seal vulnerable areas, or temporarily isolate the damaged section."),
+        ("MULTIPLE QUOTES", "Request 2-3 professional estimates from certified repair shops to compare pricing, part quality, timelines, and warranty options."),
+        ("QUALITY PARTS", "Ensure the repair center uses OEM or equivalent high-grade replacement parts to maintain durability, performance, and original manufacturer standards.")
+    ),
+    'minor': (
+        ("SCHEDULED MAINTENANCE", "Plan repairs at your convenience—minor issues are not urgent but should still be addressed to maintain long-term safety and appearance."),
+        ("COSMETIC REPAIR", "Focus on restoring paint, surface finish, and small dents or scratches to prevent rust formation and keep the property in good condition."),
+        ("PREVENTIVE CARE", "After repairs, apply protective coatings, sealants, or wax layers to strengthen surfaces against future exposure or minor impacts."),
+        ("REGULAR INSPECTION", "Periodically check the repaired areas for signs of expansion, discoloration, or structural change to ensure the issue remains stable.")
+    )
+}
+# Levels outside the table get the minor recommendations and no severity summary
+DEFAULT_RECOMMENDATIONS = 'minor'
+
+COST_INTRO = "Based on damage severity and affected components, the estimated repair cost falls within:"
+COST_NOTE = "Note: This is a preliminary estimate. Actual costs may vary based on:"
+COST_FACTORS = ("Labor rates in your area", "Parts availability", "Additional hidden damage", "Insurance coverage terms")
+
+COST_LINE_KINDS = {'text', 'range', 'note', 'bullet'}
+
+
+class _LevelTemplate:
+    """The precompiled text around the variable slots for one severity level"""
+
+    __slots__ = ('headline', 'summary', 'after_caption', 'after_score', 'recommendations', 'after_components')
+
+    def __init__(self, level):
+        headline, lines = SEVERITY_SUMMARIES.get(level, (None, ()))
+        recommendations = RECOMMENDATIONS.get(level, RECOMMENDATIONS[DEFAULT_RECOMMENDATIONS])
+        self.headline = headline
+        self.summary = '\n'.join(lines)
+        if headline:
+            # "...caption\n\nHEADLINE (Score: " <score> "/100)\nsummary\n\nCOMPONENT BREAKDOWN:\n"
+            self.after_caption = f"\n\n{headline} (Score: "
+            self.after_score = "/100)\n" + ''.join(line + "\n" for line in lines) + "\nCOMPONENT BREAKDOWN:\n"
+        else:
+            self.after_caption = "\n\n\nCOMPONENT BREAKDOWN:\n"
+            self.after_score = None
+        self.recommendations = tuple({'title': title, 'text': text} for title, text in recommendations)
+        # The severe and moderate blocks have always ended with an extra blank line
+        closing = "\n" if level in ('severe', 'moderate') else ""
+        self.after_components = (
+            "\nRECOMMENDATIONS:\n"
+            + ''.join(f"{title}: {text}\n" for title, text in recommendations)
+            + closing + "\n"
+            + "COST ESTIMATE GUIDANCE:\n" + COST_INTRO + "\n**"
+        )
+
+
+_TEMPLATES = {level: _LevelTemplate(level) for level in SEVERITY_SUMMARIES}
+_UNKNOWN_LEVEL = _LevelTemplate(None)
+
+_COST_CLOSE = "**\n\n" + COST_NOTE + "\n" + ''.join(f"- {factor}\n" for factor in COST_FACTORS) + "\n\n"
+_COST_FACTOR_LINES = tuple({'kind': 'bullet', 'text': factor} for factor in COST_FACTORS)
+
+
+def _header(user_data):
+    """The claimant block (text, section) shown above the analysis, or ('', None)"""
+    if not user_data or not user_data.get('policy_holder_name'):
+        return '', None
+    name = user_data.get('policy_holder_name', 'N/A')
+    parts = ["CLAIM ASSESSMENT REPORT\nPolicy Holder: ", str(name), "\n"]
+    contact = location = None
+    if user_data.get('contact_email') or user_data.get('contact_phone'):
+        contact = f"{user_data.get('contact_email', '')} {user_data.get('contact_phone', '')}"
+        parts += ["Contact: ", contact, "\n"]
+    if user_data.get('property_address'):
+        location = (f"{user_data.get('property_address', '')}, {user_data.get('city', '')}, "
+                    f"{user_data.get('state', '')} {user_data.get('zip_code', '')}")
+        parts += ["Location: ", location, "\n"]
+    parts.append("=" * 50 + "\n\n")
+    return ''.join(parts), {'policy_holder': str(name), 'contact': contact, 'location': location}
+
+
+def render_description(caption, severity_level, severity_score, components, cost_range, user_data=None):
+    """
+    (text, sections) for one assessment. text is the plain-text report the
+    UI shows and history stores; sections is the same content as a tree:
+    header, analysis paragraphs, component names, recommendation items and
+    typed cost lines, for renderers that lay the report out themselves.
+    """
+    template = _TEMPLATES.get(severity_level, _UNKNOWN_LEVEL)
+    caption = str(caption)
+    cost_range = str(cost_range)
+    components = [str(component) for component in components]
+
+    header_text, header = _header(user_data)
+    parts = [header_text, "DETAILED ANALYSIS:\nImage Analysis: ", caption, template.after_caption]
+    analysis = [f"Image Analysis: {caption}".strip()]
+    if template.headline:
+        score = str(severity_score)
+        parts += [score, template.after_score]
+        analysis.append(f"{template.headline} (Score: {score}/100)\n{template.summary}")
+    for i, component in enumerate(components, 1):
+        parts += [str(i), ". ", component, "\n"]
+    parts += [template.after_components, cost_range, _COST_CLOSE]
+
+    sections = {
+        'header': header,
+        'analysis': analysis,
+        'components': components,
+        'recommendations': [dict(item) for item in template.recommendations],
+        'cost': [{'kind': 'text', 'text': COST_INTRO}, {'kind': 'range', 'text': cost_range},
+                 {'kind': 'note', 'text': COST_NOTE}] + [dict(line) for line in _COST_FACTOR_LINES]
+    }
+    return ''.join(parts), sections
+
+
+def render_many(items):
+    """
+    Batch path: render a list of dicts with caption, severity_level,
+    severity_score, components, cost_range and optional user_data keys;
+    returns [(text, sections), ...] in the same order.
+    """
+    return [
+        render_description(item['caption'], item['severity_level'], item['severity_score'],
+                           item['components'], item['cost_range'], item.get('user_data'))
+        for item in items
+    ]
+
+
+def _between(text, title, end_titles):
+    """Body of the section starting at title, up to the first of end_titles (None if absent)"""
+    start = text.find(title)
+    if start == -1:
+        return None
+    start += len(title)
+    ends = [i for i in (text.find(end, start) for end in end_titles) if i != -1]
+    return text[start:min(ends)] if ends else text[start:]
+
+
+def parse_sections(description):
+    """
+    Section tree for a description stored as text only (history entries,
+    older clients). Sections missing from the text come back empty.
+    """
+    text = str(description).replace('\r\n', '\n').replace('\r', '\n')
+    sections = {'header': None, 'analysis': [], 'components': [], 'recommendations': [], 'cost': []}
+
+    analysis = _between(text, 'DETAILED ANALYSIS:', ['COMPONENT BREAKDOWN:', 'RECOMMENDATIONS:'])
+    if analysis is not None:
+        sections['analysis'] = [p.strip() for p in analysis.strip().split('\n\n') if p.strip()]
+
+    components = _between(text, 'COMPONENT BREAKDOWN:', ['RECOMMENDATIONS:'])
+    if components is not None:
+        for line in components.split('\n'):
+            line = re.sub(r'^\d+\.\s*', '', line.strip())
+            if line:
+                sections['components'].append(line)
+
+    recommendations = _between(text, 'RECOMMENDATIONS:', ['COST ESTIMATE GUIDANCE:'])
+    if recommendations is not None:
+        for line in recommendations.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if ':' in line:
+                title, body = line.split(':', 1)
+                sections['recommendations'].append({'title': title.strip(), 'text': body.strip()})
+            else:
+                sections['recommendations'].append({'title': None, 'text': line})
+
+    cost = _between(text, 'COST ESTIMATE GUIDANCE:', [])
+    if cost is not None:
+        for line in cost.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('**') and line.endswith('**'):
+                sections['cost'].append({'kind': 'range', 'text': line.strip('*')})
+            elif line.startswith('- ') or line.startswith('• '):
+                sections['cost'].append({'kind': 'bullet', 'text': line[2:].strip()})
+            elif line.lower().startswith('note:'):
+                sections['cost'].append({'kind': 'note', 'text': line})
+            else:
+                sections['cost'].append({'kind': 'text', 'text': line})
+    return sections
+
+
+def is_section_tree(sections):
+    """True if sections has the shape render_description returns (e.g. when sent back by a client)"""
+    if not isinstance(sections, dict):
+        return False
+    try:
+        return (
+            all(isinstance(p, str) for p in sections['analysis'])
+            and all(isinstance(c, str) for c in sections['components'])
+            and all(isinstance(r['text'], str) and (r['title'] is None or isinstance(r['title'], str))
+                    for r in sections['recommendations'])
+            and all(line['kind'] in COST_LINE_KINDS and isinstance(line['text'], str)
+                    for line in sections['cost'])
+        )
+    except (KeyError, TypeError):
+        return False
@@ -0,0 +1,407 @@
+import base64
+import bisect
+import calendar
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from lazy_imports import lazy_module, optional_module
+
+np = lazy_module('numpy')
+zstandard = optional_module('zstandard')
+
+SEGMENT_MAGIC = b'CIHSEG1\n'
+SEGMENT_FORMAT = 1
+MANIFEST_FORMAT = 1
+ENTRY_BLOCK_ROWS = 128      # entries per compressed block; the date index has one range per block
+ID_BLOCK_ROWS = 1024        # (id, row) pairs per block of the claim id index
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+MISSING = -1
+
+_TRAILER = struct.Struct('<Q')
+
+
+def cold_dir_for(history_path):
+    """Cold tier directory belonging to a history file"""
+    return os.path.splitext(history_path)[0] + '_cold'
+
+
+def default_codec():
+    """zstd when the zstandard package is installed, else zlib (recorded per segment)"""
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def _compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This cold segment is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _day_bound(day, end=False):
+    """Seconds for a YYYY-MM-DD filter bound, on the same clock as the date column"""
+    try:
+        seconds = calendar.timegm(time.strptime(str(day)[:10], '%Y-%m-%d'))
+    except ValueError:
+        return None
+    return seconds + 86399 if end else seconds
+
+
+def _overlaps(date_min, date_max, low, high):
+    return (low is None or date_max >= low) and (high is None or date_min <= high)
+
+
+class ImageStore:
+    """
+    Content-addressed image files for the cold tier: one file per distinct
+    image (sha256 of the decoded bytes), so a photo stored by several
+    assessments takes its space once.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, ref):
+        return os.path.join(self.root, ref[:2], ref)
+
+    def put(self, image_data):
+        """(ref, newly stored) for a base64 image, or (None, False) if it cannot round-trip"""
+        try:
+            raw = base64.b64decode(image_data, validate=True)
+        except (ValueError, TypeError):
+            return None, False
+        if base64.b64encode(raw).decode('ascii') != image_data:
+            # Restoring it would change the entry; keep it inline
+            return None, False
+        ref = hashlib.sha256(raw).hexdigest()
+        path = self._path(ref)
+        if os.path.exists(path):
+            return ref, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        return ref, True
+
+    def get(self, ref):
+        """The base64 image for ref"""
+        with open(self._path(ref), 'rb') as f:
+            return base64.b64encode(f.read()).decode('ascii')
+
+
+def strip_image(entry, images):
+    """Entry with image_data swapped for an image_ref into images, keeping key order; (entry, new)"""
+    image_data = entry.get('image_data')
+    if not isinstance(image_data, str) or not image_data:
+        return entry, False
+    ref, new = images.put(image_data)
+    if ref is None:
+        return entry, False
+    return {('image_ref' if key == 'image_data' else key): (ref if key == 'image_data' else value)
+            for key, value in entry.items()}, new
+
+
+def restore_image(entry, images):
+    """Inverse of strip_image"""
+    ref = entry.get('image_ref')
+    if not ref:
+        return entry
+    return {('image_data' if key == 'image_ref' else key): (images.get(ref) if key == 'image_ref' else value)
+            for key, value in entry.items()}
+
+
+def write_segment(path, entries, dates, ids, columns, dictionaries, codec=None):
+    """
+    Write an immutable segment file. entries are history entries (images
+    already swapped for refs), dates their date-column seconds, ids their
+    assessment ids, columns {name: ndarray or bytes} of column data for the
+    history columns and dictionaries their dictionary values. Layout:
+
+        magic | compressed blobs | footer JSON | footer length | magic
+
+    The footer holds the blob offsets, a date range per entry block and
+    the first id of each id block (the sparse indexes).
+    """
+    codec = codec or default_codec()
+    dates = np.asarray(dates, dtype=np.int64)
+    footer = {'format': SEGMENT_FORMAT, 'codec': codec, 'rows': len(entries),
+              'date_min': int(dates.min()) if len(dates) else MISSING,
+              'date_max': int(dates.max()) if len(dates) else MISSING,
+              'columns': {}, 'dictionaries': dictionaries, 'blocks': [], 'ids': []}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SEGMENT_MAGIC)
+
+        def blob(data):
+            offset = f.tell()
+            f.write(_compress(data, codec))
+            return [offset, f.tell() - offset]
+
+        for name, data in columns.items():
+            if isinstance(data, (bytes, bytearray)):
+                footer['columns'][name] = blob(bytes(data)) + [None]
+            else:
+                data = np.ascontiguousarray(data)
+                footer['columns'][name] = blob(data.tobytes()) + [data.dtype.str]
+
+        for start in range(0, len(entries), ENTRY_BLOCK_ROWS):
+            block = entries[start:start + ENTRY_BLOCK_ROWS]
+            block_dates = dates[start:start + ENTRY_BLOCK_ROWS]
+            text = '\n'.join(json.dumps(entry) for entry in block).encode('utf-8')
+            footer['blocks'].append(blob(text) + [int(block_dates.min()), int(block_dates.max())])
+
+        pairs = sorted((ident, row) for row, ident in enumerate(ids) if ident)
+        for start in range(0, len(pairs), ID_BLOCK_ROWS):
+            block = pairs[start:start + ID_BLOCK_ROWS]
+            footer['ids'].append([block[0][0]] + blob(json.dumps(block).encode('utf-8')))
+
+        encoded = json.dumps(footer).encode('utf-8')
+        f.write(encoded)
+        f.write(_TRAILER.pack(len(encoded)))
+        f.write(SEGMENT_MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return footer
+
+
+class Segment:
+    """Read side of one segment file; blobs are decompressed on demand"""
+
+    def __init__(self, path, number):
+        self.path = path
+        self.number = number
+        with open(path, 'rb') as f:
+            head = f.read(len(SEGMENT_MAGIC))
+            size = f.seek(0, os.SEEK_END)
+            tail_size = _TRAILER.size + len(SEGMENT_MAGIC)
+            f.seek(max(0, size - tail_size))
+            tail = f.read(tail_size)
+            if head != SEGMENT_MAGIC or tail[-len(SEGMENT_MAGIC):] != SEGMENT_MAGIC:
+                raise ValueError(f"Not a history segment: {path}")
+            (length,) = _TRAILER.unpack(tail[:_TRAILER.size])
+            f.seek(size - tail_size - length)
+            self.footer = json.loads(f.read(length))
+        if self.footer.get('format') != SEGMENT_FORMAT:
+            raise ValueError(f"Unsupported segment format in {path}")
+        self.codec = self.footer['codec']
+        self.rows = self.footer['rows']
+        self._first_ids = [block[0] for block in self.footer['ids']]
+        self._block_cache = (None, None)
+        self._lock = threading.Lock()
+
+    def _read(self, offset, length):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return _decompress(f.read(length), self.codec)
+
+    def column(self, name):
+        """Column data written for name: an ndarray, or bytes for heaps"""
+        offset, length, dtype = self.footer['columns'][name]
+        data = self._read(offset, length)
+        return data if dtype is None else np.frombuffer(data, dtype=dtype)
+
+    @property
+    def dictionaries(self):
+        return self.footer['dictionaries']
+
+    def _block(self, index):
+        with self._lock:
+            cached_index, entries = self._block_cache
+            if cached_index == index:
+                return entries
+        offset, length, _, _ = self.footer['blocks'][index]
+        entries = self._read(offset, length).decode('utf-8').split('\n')
+        with self._lock:
+            self._block_cache = (index, entries)
+        return entries
+
+    def entry(self, row):
+        """Entry at row, as stored (with its image_ref)"""
+        return json.loads(self._block(row // ENTRY_BLOCK_ROWS)[row % ENTRY_BLOCK_ROWS])
+
+    def entries(self, low=None, high=None):
+        """Stored entries, skipping blocks whose date range lies outside [low, high]"""
+        if not _overlaps(self.footer['date_min'], self.footer['date_max'], low, high):
+            return
+        for index, (offset, length, date_min, date_max) in enumerate(self.footer['blocks']):
+            if not _overlaps(date_min, date_max, low, high):
+                continue
+            for line in self._read(offset, length).decode('utf-8').split('\n'):
+                yield json.loads(line)
+
+    def find(self, assessment_id):
+        """Row of an assessment id through the sparse id index, or None"""
+        index = bisect.bisect_right(self._first_ids, assessment_id) - 1
+        if index < 0:
+            return None
+        _, offset, length = self.footer['ids'][index]
+        for ident, row in json.loads(self._read(offset, length)):
+            if ident == assessment_id:
+                return row
+        return None
+
+
+class ColdTier:
+    """
+    Compacted history: immutable compressed segments listed in
+    manifest.json, oldest first, plus a deduplicated image store. A segment
+    is first recorded as pending and only becomes visible once the entries
+    it holds have left the history file (see history_retention).
+    """
+
+    def __init__(self, cold_dir):
+        self.cold_dir = cold_dir
+        self.images = ImageStore(os.path.join(cold_dir, 'images'))
+        self._signature = None
+        self._manifest = None
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.cold_dir, 'manifest.json')
+
+    def segment_path(self, name):
+        return os.path.join(self.cold_dir, 'segments', name)
+
+    def signature(self):
+        """Changes whenever segments are committed or removed (None if there is no cold tier)"""
+        try:
+            st = os.stat(self._manifest_path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def manifest(self):
+        signature = self.signature()
+        with self._lock:
+            if self._manifest is None or signature != self._signature:
+                try:
+                    with open(self._manifest_path, 'r') as f:
+                        manifest = json.load(f)
+                except (OSError, ValueError):
+                    manifest = None
+                if not manifest or manifest.get('format') != MANIFEST_FORMAT:
+                    manifest = {'format': MANIFEST_FORMAT, 'next_segment': 0, 'segments': []}
+                self._manifest, self._signature = manifest, signature
+            return self._manifest
+
+    def segments(self):
+        """Committed segments, oldest first"""
+        segments = []
+        for record in self.manifest()['segments']:
+            if record['state'] != 'committed':
+                continue
+            segment = self._segments.get(record['number'])
+            if segment is None:
+                segment = self._segments[record['number']] = Segment(
+                    self.segment_path(record['file']), record['number'])
+            segments.append(segment)
+        return segments
+
+    def segment(self, number):
+        for segment in self.segments():
+            if segment.number == number:
+                return segment
+        raise KeyError(f"No committed cold segment {number}")
+
+    def __len__(self):
+        return sum(segment.rows for segment in self.segments())
+
+    def entry(self, number, row, include_images=True):
+        entry = self.segment(number).entry(row)
+        return restore_image(entry, self.images) if include_images else _without_image(entry)
+
+    def find(self, assessment_id):
+        """(segment number, row) of an assessment id, newest segment first, or None"""
+        for segment in reversed(self.segments()):
+            row = segment.find(str(assessment_id))
+            if row is not None:
+                return segment.number, row
+        return None
+
+    def iter_entries(self, date_from=None, date_to=None, include_images=True):
+        """
+        Cold entries oldest first. date_from / date_to (YYYY-MM-DD) only skip
+        segments and blocks that cannot match; callers still filter rows.
+        """
+        low = _day_bound(date_from) if date_from else None
+        high = _day_bound(date_to, end=True) if date_to else None
+        for segment in self.segments():
+            for entry in segment.entries(low, high):
+                yield restore_image(entry, self.images) if include_images else _without_image(entry)
+
+    # ----- writing (history_retention) -----
+
+    @contextmanager
+    def locked(self):
+        """Exclusive lock for changing the cold tier (one compaction at a time)"""
+        os.makedirs(os.path.join(self.cold_dir, 'segments'), exist_ok=True)
+        with open(os.path.join(self.cold_dir, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+        with self._lock:
+            self._manifest = None
+
+    def add_pending(self, entries, dates, ids, columns, dictionaries, run, first_digest):
+        """Write a segment and record it as pending for a compaction run; returns its record"""
+        manifest = self.manifest()
+        number = manifest['next_segment']
+        name = f"{number:08d}.seg"
+        footer = write_segment(self.segment_path(name), entries, dates, ids, columns, dictionaries)
+        record = {'number': number, 'file': name, 'rows': footer['rows'], 'codec': footer['codec'],
+                  'date_min': footer['date_min'], 'date_max': footer['date_max'],
+                  'state': 'pending', 'run': run, 'first_digest': first_digest}
+        manifest = dict(manifest, next_segment=number + 1, segments=manifest['segments'] + [record])
+        self._write_manifest(manifest)
+        return record
+
+    def finish(self, run, commit):
+        """Make a run's pending segments visible, or drop them and their files"""
+        manifest = self.manifest()
+        segments = []
+        for record in manifest['segments']:
+            if record['state'] == 'pending' and record['run'] == run:
+                if not commit:
+                    try:
+                        os.remove(self.segment_path(record['file']))
+                    except FileNotFoundError:
+                        pass
+                    continue
+                record = {k: v for k, v in record.items() if k not in ('run', 'first_digest')}
+                record['state'] = 'committed'
+            segments.append(record)
+        self._write_manifest(dict(manifest, segments=segments))
+
+    def pending_runs(self):
+        """{run: first_digest} of compactions interrupted before they finished"""
+        return {record['run']: record['first_digest']
+                for record in self.manifest()['segments'] if record['state'] == 'pending'}
+
+
+def _without_image(entry):
+    return {k: v for k, v in entry.items() if k != 'image_ref'}
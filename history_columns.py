@@ -0,0 +1,523 @@
+import calendar
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+
+from cost_engine import PORTFOLIO_GROUPS, entry_cost_paise, summarize_costs
+from history_cold import ColdTier, cold_dir_for
+from history_export import HISTORY_FILE
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+
+COLUMNS_DIR = 'data/history_columns'
+COLUMNS_FORMAT = 2
+SCAN_CHUNK_BYTES = 1024 * 1024
+FLUSH_ROWS = 100000
+MISSING = -1
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Fixed-width columns, one value per assessment
+INT_COLUMNS = {
+    'date': 'int64',            # seconds since the epoch, from the entry's local timestamp
+    'severity_score': 'int16',
+    'cost_min_paise': 'int64',
+    'cost_max_paise': 'int64',
+    'entry_start': 'int64',     # byte span of the entry in the history file, for lazy loads,
+    'entry_end': 'int64',       # or its row in a cold segment (entry_end MISSING)
+    'segment': 'int32'          # cold segment number, MISSING for rows in the history file
+}
+# Where a row's entry lives; not part of the column data kept in cold segments
+LOCATOR_COLUMNS = ('entry_start', 'entry_end', 'segment')
+# Few distinct values: int32 codes into a value list kept in meta.json
+DICTIONARY_COLUMNS = ('damage_type', 'severity_level', 'repair_level', 'cost_range', 'state', 'rules_version')
+# Mostly distinct short strings: one UTF-8 heap plus end offsets per column
+STRING_COLUMNS = ('assessment_id', 'policy_holder_name', 'affected_components', 'city', 'zip_code')
+
+
+def parse_date(value):
+    text = str(value or '')
+    for fmt, length in ((DATE_FORMAT, 19), ('%Y-%m-%d', 10)):
+        try:
+            return calendar.timegm(time.strptime(text[:length], fmt))
+        except ValueError:
+            continue
+    return MISSING
+
+
+def _format_date(seconds):
+    return time.strftime(DATE_FORMAT, time.gmtime(int(seconds))) if seconds != MISSING else ''
+
+
+def _day_bound(day, end=False):
+    seconds = parse_date(day)
+    return seconds + 86399 if end and seconds != MISSING else seconds
+
+
+def _text(value):
+    """
+    The scanner decodes the file as Latin-1 so character offsets are byte
+    offsets; strings carrying raw UTF-8 are decoded properly here.
+    """
+    if value is None:
+        return ''
+    value = str(value)
+    if value.isascii():
+        return value
+    try:
+        return value.encode('latin-1').decode('utf-8')
+    except UnicodeError:
+        return value
+
+
+def scan_history(path, start=0, chunk_size=SCAN_CHUNK_BYTES):
+    """
+    Yield (start byte, end byte, entry) for each entry of the history JSON
+    array from byte offset start (0, or the end of an entry already seen).
+    """
+    decoder = json.JSONDecoder()
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return
+    with f:
+        f.seek(start)
+        base = start          # file offset of buffer[0]
+        buffer = ''
+        pos = 0
+        eof = False
+        started = start > 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != '[':
+                    return
+                started = True
+                pos += 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            if pos < len(buffer):
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        return
+                else:
+                    yield base + pos, base + end, entry
+                    pos = end
+                    continue
+            elif eof:
+                return
+            base += pos
+            buffer = buffer[pos:]
+            pos = 0
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer += chunk.decode('latin-1')
+            else:
+                eof = True
+
+
+class _Batch:
+    """Rows gathered during a scan, written out as column appends"""
+
+    def __init__(self, dictionaries):
+        self.dictionaries = dictionaries
+        self.lookup = {field: {v: i for i, v in enumerate(values)} for field, values in dictionaries.items()}
+        self.ints = {field: [] for field in INT_COLUMNS}
+        self.codes = {field: [] for field in DICTIONARY_COLUMNS}
+        self.strings = {field: [] for field in STRING_COLUMNS}
+        self.rows = 0
+
+    def add(self, start, end, entry):
+        cost_min, cost_max = entry_cost_paise(entry)
+        try:
+            score = int(entry.get('severity_score'))
+        except (TypeError, ValueError):
+            score = MISSING
+        self.ints['date'].append(parse_date(entry.get('date')))
+        self.ints['severity_score'].append(score)
+        self.ints['cost_min_paise'].append(cost_min)
+        self.ints['cost_max_paise'].append(cost_max)
+        self.ints['entry_start'].append(start)
+        self.ints['entry_end'].append(end)
+        self.ints['segment'].append(MISSING)
+        for field in DICTIONARY_COLUMNS:
+            value = _text(entry.get(field))
+            code = self.lookup[field].get(value)
+            if code is None:
+                code = self.lookup[field][value] = len(self.dictionaries[field])
+                self.dictionaries[field].append(value)
+            self.codes[field].append(code)
+        for field in STRING_COLUMNS:
+            self.strings[field].append(_text(entry.get(field)).encode('utf-8'))
+        self.rows += 1
+
+    def arrays(self, heap_sizes):
+        """{column file name: ndarray or heap bytes} for the gathered rows; empties the batch"""
+        arrays = {f"{field}.i": np.asarray(self.ints[field], dtype=dtype) for field, dtype in INT_COLUMNS.items()}
+        for field in DICTIONARY_COLUMNS:
+            arrays[f"{field}.codes"] = np.asarray(self.codes[field], dtype=np.int32)
+        for field in STRING_COLUMNS:
+            values = self.strings[field]
+            arrays[f"{field}.heap"] = b''.join(values)
+            arrays[f"{field}.ends"] = heap_sizes[field] + np.cumsum([len(v) for v in values], dtype=np.int64)
+            if values:
+                heap_sizes[field] = int(arrays[f"{field}.ends"][-1])
+        for values in list(self.ints.values()) + list(self.codes.values()) + list(self.strings.values()):
+            values.clear()
+        self.rows = 0
+        return arrays
+
+    def write(self, gen_dir, heap_sizes):
+        _append_files(gen_dir, self.arrays(heap_sizes))
+
+
+def _append_files(gen_dir, arrays):
+    for name, data in arrays.items():
+        with open(os.path.join(gen_dir, name), 'ab') as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                data.tofile(f)
+
+
+def segment_columns(entries):
+    """
+    (dates, assessment ids, column data, dictionaries) for a cold segment
+    holding entries (as scan_history yields them): the same column files
+    as a generation, minus the locators.
+    """
+    batch = _Batch({field: [] for field in DICTIONARY_COLUMNS})
+    for row, entry in enumerate(entries):
+        batch.add(row, MISSING, entry)
+    ids = [_text(entry.get('assessment_id')) for entry in entries]
+    arrays = batch.arrays({field: 0 for field in STRING_COLUMNS})
+    for field in LOCATOR_COLUMNS:
+        del arrays[f"{field}.i"]
+    return arrays['date.i'], ids, arrays, batch.dictionaries
+
+
+class HistoryColumns:
+    """
+    Compact, memory-mapped view of the history for analytics and the
+    history page. Scores, dates and costs are NumPy arrays, repeated
+    strings are dictionary-encoded, short strings sit in one heap per
+    column, and descriptions / images stay in the history file, read for
+    one entry at a time through its recorded byte span. Rows compacted
+    into the cold tier come first, loaded from the column data kept in
+    their segments. Opening costs a few mmap calls whatever the history
+    size; new entries appended to the history file are picked up
+    incrementally by refresh().
+    """
+
+    def __init__(self, columns_dir=COLUMNS_DIR, history_path=HISTORY_FILE):
+        self.columns_dir = columns_dir
+        self.history_path = history_path
+        self.cold = ColdTier(cold_dir_for(history_path))
+        self.meta = None
+        self._meta_mtime = None
+        self._ints = {}
+        self._codes = {}
+        self._heaps = {}
+        self._ends = {}
+        self._values = {}
+        os.makedirs(self.columns_dir, exist_ok=True)
+        self.refresh()
+        print("✅ History columns initialized!")
+
+    # ----- on-disk layout -----
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.columns_dir, 'meta.json')
+
+    def _gen_dir(self, meta=None):
+        return os.path.join(self.columns_dir, (meta or self.meta)['generation'])
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path, 'r') as f:
+                meta = json.load(f)
+            return meta if meta.get('format') == COLUMNS_FORMAT else None
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _open(self, meta):
+        """Map the first meta['count'] rows of every column"""
+        count = meta['count']
+        gen_dir = self._gen_dir(meta)
+
+        def array(name, dtype):
+            path = os.path.join(gen_dir, name)
+            if not count:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+        def heap(name, size):
+            if not size:
+                return b''
+            with open(os.path.join(gen_dir, name), 'rb') as f:
+                return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+        self._ints = {field: array(f"{field}.i", dtype) for field, dtype in INT_COLUMNS.items()}
+        self._codes = {field: array(f"{field}.codes", np.int32) for field in DICTIONARY_COLUMNS}
+        self._ends = {field: array(f"{field}.ends", np.int64) for field in STRING_COLUMNS}
+        self._heaps = {field: heap(f"{field}.heap", meta['heap_sizes'][field]) for field in STRING_COLUMNS}
+        self._values = {field: np.asarray(values, dtype=object) for field, values in meta['dictionaries'].items()}
+        self.meta = meta
+        self._meta_mtime = os.path.getmtime(self._meta_path)
+
+    # ----- building -----
+
+    def _tail_digest(self, start, end):
+        with open(self.history_path, 'rb') as f:
+            f.seek(start)
+            return hashlib.sha256(f.read(end - start)).hexdigest()
+
+    def _new_meta(self):
+        return {
+            'format': COLUMNS_FORMAT,
+            'generation': uuid.uuid4().hex,
+            'count': 0,
+            'dictionaries': {field: [] for field in DICTIONARY_COLUMNS},
+            'heap_sizes': {field: 0 for field in STRING_COLUMNS},
+            'source_size': 0,
+            'source_mtime': None,
+            'last_entry': None,      # [start, end, sha256] of the last indexed entry
+            'cold_signature': None   # ColdTier.signature() the cold rows were loaded at
+        }
+
+    def _append_cold(self, meta):
+        """Load the rows of every committed cold segment into a new generation"""
+        gen_dir = self._gen_dir(meta)
+        os.makedirs(gen_dir, exist_ok=True)
+        meta['cold_signature'] = self.cold.signature()
+        for segment in self.cold.segments():
+            rows = segment.rows
+            arrays = {
+                'entry_start.i': np.arange(rows, dtype=np.int64),
+                'entry_end.i': np.full(rows, MISSING, dtype=np.int64),
+                'segment.i': np.full(rows, segment.number, dtype=np.int32)
+            }
+            for field, dtype in INT_COLUMNS.items():
+                if field not in LOCATOR_COLUMNS:
+                    arrays[f"{field}.i"] = segment.column(f"{field}.i").astype(dtype)
+            for field in DICTIONARY_COLUMNS:
+                # Segment codes index the segment's own values; map them onto this generation's
+                values = meta['dictionaries'][field]
+                lookup = {value: i for i, value in enumerate(values)}
+                remap = []
+                for value in segment.dictionaries[field]:
+                    if value not in lookup:
+                        lookup[value] = len(values)
+                        values.append(value)
+                    remap.append(lookup[value])
+                codes = segment.column(f"{field}.codes")
+                arrays[f"{field}.codes"] = np.asarray(remap, dtype=np.int32)[codes] if rows else codes
+            for field in STRING_COLUMNS:
+                heap = segment.column(f"{field}.heap")
+                arrays[f"{field}.heap"] = heap
+                arrays[f"{field}.ends"] = segment.column(f"{field}.ends") + meta['heap_sizes'][field]
+                meta['heap_sizes'][field] += len(heap)
+            _append_files(gen_dir, arrays)
+            meta['count'] += rows
+
+    def _append_from(self, meta, start):
+        """Scan the history file from start, appending rows to meta's generation"""
+        gen_dir = self._gen_dir(meta)
+        os.makedirs(gen_dir, exist_ok=True)
+        self._truncate(meta)
+        batch = _Batch(meta['dictionaries'])
+        last = None
+        for entry_start, entry_end, entry in scan_history(self.history_path, start):
+            batch.add(entry_start, entry_end, entry)
+            last = (entry_start, entry_end)
+            if batch.rows >= FLUSH_ROWS:
+                meta['count'] += batch.rows
+                batch.write(gen_dir, meta['heap_sizes'])
+        meta['count'] += batch.rows
+        batch.write(gen_dir, meta['heap_sizes'])
+        if last is not None:
+            meta['last_entry'] = [last[0], last[1], self._tail_digest(*last)]
+        stat = os.stat(self.history_path)
+        meta['source_size'] = stat.st_size
+        meta['source_mtime'] = stat.st_mtime
+
+    def _truncate(self, meta):
+        """Drop bytes an interrupted append left beyond the committed rows"""
+        gen_dir = self._gen_dir(meta)
+        count = meta['count']
+        sizes = {f"{field}.i": count * np.dtype(dtype).itemsize for field, dtype in INT_COLUMNS.items()}
+        sizes.update({f"{field}.codes": count * 4 for field in DICTIONARY_COLUMNS})
+        sizes.update({f"{field}.ends": count * 8 for field in STRING_COLUMNS})
+        sizes.update({f"{field}.heap": meta['heap_sizes'][field] for field in STRING_COLUMNS})
+        for name, size in sizes.items():
+            path = os.path.join(gen_dir, name)
+            with open(path, 'ab') as f:
+                if f.tell() != size:
+                    f.truncate(size)
+
+    def _resume_offset(self, meta, stat, cold_signature):
+        """Where to continue scanning, or None when the columns must be rebuilt"""
+        if meta is None or meta['cold_signature'] != cold_signature or stat.st_size < meta['source_size']:
+            return None
+        if meta['last_entry'] is None:
+            # Nothing indexed from the history file yet, so all of it is new
+            return 0
+        start, end, digest = meta['last_entry']
+        # json.dump rewrites identical earlier entries, so an unchanged last entry means an append
+        return end if self._tail_digest(start, end) == digest else None
+
+    @staticmethod
+    def _unchanged(meta, stat, cold_signature):
+        if meta is None or meta['cold_signature'] != cold_signature:
+            return False
+        if stat is None:
+            return meta['source_mtime'] is None
+        return meta['source_size'] == stat.st_size and meta['source_mtime'] == stat.st_mtime
+
+    def refresh(self):
+        """
+        Bring the columns up to date with the history file: nothing to do if
+        it is unchanged, an incremental scan if entries were appended, a full
+        rebuild if earlier entries changed or the cold tier was compacted
+        into. Safe across worker processes.
+        """
+        try:
+            stat = os.stat(self.history_path)
+        except OSError:
+            stat = None
+        cold_signature = self.cold.signature()
+        if self._unchanged(self.meta, stat, cold_signature):
+            return False
+
+        with open(os.path.join(self.columns_dir, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta = self._read_meta()
+            if self._unchanged(meta, stat, cold_signature):
+                # Another process already caught up
+                if self.meta is None or self._meta_mtime != os.path.getmtime(self._meta_path):
+                    self._open(meta)
+                return True
+
+            old_generation = meta['generation'] if meta else None
+            resume = self._resume_offset(meta, stat, cold_signature) if stat is not None else None
+            if resume is None:
+                meta = self._new_meta()
+                self._append_cold(meta)
+                resume = 0
+            if stat is not None:
+                self._append_from(meta, resume)
+            else:
+                os.makedirs(self._gen_dir(meta), exist_ok=True)
+                self._truncate(meta)
+            self._write_meta(meta)
+            if old_generation and old_generation != meta['generation']:
+                # Readers still holding the old maps keep working; unlinked files live on until closed
+                shutil.rmtree(os.path.join(self.columns_dir, old_generation), ignore_errors=True)
+            self._open(meta)
+        return True
+
+    # ----- reading -----
+
+    def __len__(self):
+        return self.meta['count'] if self.meta else 0
+
+    def ints(self, field):
+        return self._ints[field]
+
+    def codes(self, field):
+        """(int32 codes, object array of values) for a dictionary-encoded column"""
+        return self._codes[field], self._values[field]
+
+    def string(self, field, row):
+        ends = self._ends[field]
+        start = int(ends[row - 1]) if row else 0
+        return bytes(self._heaps[field][start:int(ends[row])]).decode('utf-8')
+
+    def row(self, row):
+        """Metadata for one assessment (no description or image)"""
+        record = {'row': int(row), 'date': _format_date(self._ints['date'][row])}
+        score = int(self._ints['severity_score'][row])
+        record['severity_score'] = score if score != MISSING else None
+        record['cost_min_paise'] = int(self._ints['cost_min_paise'][row])
+        record['cost_max_paise'] = int(self._ints['cost_max_paise'][row])
+        for field in DICTIONARY_COLUMNS:
+            record[field] = self._values[field][self._codes[field][row]]
+        for field in STRING_COLUMNS:
+            record[field] = self.string(field, row)
+        return record
+
+    def rows(self, offset=0, limit=100, newest_first=True):
+        """One page of row metadata, newest (last appended) first by default"""
+        count = len(self)
+        if newest_first:
+            indices = range(count - 1 - offset, max(-1, count - 1 - offset - limit), -1)
+        else:
+            indices = range(offset, min(count, offset + limit))
+        return [self.row(i) for i in indices]
+
+    def entry(self, row):
+        """The full history entry, read from its byte span in the history file or its cold segment"""
+        segment = int(self._ints['segment'][row])
+        if segment != MISSING:
+            return self.cold.entry(segment, int(self._ints['entry_start'][row]))
+        start = int(self._ints['entry_start'][row])
+        end = int(self._ints['entry_end'][row])
+        with open(self.history_path, 'rb') as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def find(self, assessment_id):
+        """Row of an assessment id, or None (a substring search of the id heap)"""
+        needle = str(assessment_id).encode('utf-8')
+        heap = self._heaps['assessment_id']
+        ends = self._ends['assessment_id']
+        if not needle or not len(ends):
+            return None
+        pos = heap.find(needle)
+        while pos != -1:
+            row = int(np.searchsorted(ends, pos, side='right'))
+            start = int(ends[row - 1]) if row else 0
+            if start == pos and int(ends[row]) == pos + len(needle):
+                return row
+            pos = heap.find(needle, pos + 1)
+        return None
+
+    def mask(self, date_from=None, date_to=None, severities=None):
+        """Boolean row mask for the date-range / severity filters of filter_history"""
+        selected = np.ones(len(self), dtype=bool)
+        dates = self._ints['date']
+        if date_from:
+            selected &= dates >= _day_bound(date_from)
+        if date_to:
+            selected &= dates <= _day_bound(date_to, end=True)
+        if severities:
+            wanted = {str(s).strip().lower() for s in severities if str(s).strip()}
+            codes, values = self.codes('severity_level')
+            wanted_codes = [i for i, value in enumerate(values) if str(value).lower() in wanted]
+            selected &= np.isin(codes, wanted_codes)
+        return selected
+
+    def portfolio(self, group_by='severity_level', date_from=None, date_to=None, severities=None):
+        """portfolio_totals() computed straight from the columns"""
+        if group_by not in PORTFOLIO_GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(PORTFOLIO_GROUPS)}")
+        selected = self.mask(date_from, date_to, severities)
+        codes, values = self.codes(group_by)
+        return summarize_costs(self._ints['cost_min_paise'][selected], self._ints['cost_max_paise'][selected],
+                               codes[selected], values, group_by)
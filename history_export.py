@@ -0,0 +1,317 @@
+import argparse
+import csv
+import fcntl
+import io
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+from history_cold import ColdTier, cold_dir_for
+
+HISTORY_FILE = 'data/detection_history.json'
+
+# Column order used for tabular exports (CSV / Parquet)
+EXPORT_FIELDS = [
+    'assessment_id', 'date', 'damage_type', 'image_caption', 'loss_description',
+    'severity_score', 'severity_level', 'affected_components',
+    'repair_level', 'cost_range', 'cost_min_paise', 'cost_max_paise', 'rules_version', 'policy_holder_name', 'contact_email',
+    'contact_phone', 'property_address', 'city', 'state', 'zip_code',
+    'image_data'
+]
+
+# Exported as integers in Parquet; everything else is a string column
+INTEGER_FIELDS = {'severity_score', 'cost_min_paise', 'cost_max_paise'}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+
+def iter_history(path=HISTORY_FILE, chunk_size=64 * 1024, date_from=None, date_to=None,
+                 include_images=True):
+    """
+    Stream every history entry: those compacted into the cold tier first
+    (they are the oldest), then the history file. date_from / date_to only
+    let cold segments that cannot match be skipped; use filter_history for
+    the actual filtering. include_images=False leaves cold images unread.
+    """
+    yield from ColdTier(cold_dir_for(path)).iter_entries(date_from, date_to, include_images)
+    yield from iter_history_file(path, chunk_size)
+
+
+def iter_history_file(path=HISTORY_FILE, chunk_size=64 * 1024):
+    """
+    Stream entries from the history JSON array one at a time.
+    Only the entry currently being decoded is held in memory, so the
+    whole file never has to be loaded with json.load.
+    """
+    decoder = json.JSONDecoder()
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except OSError:
+        return
+
+    with f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            # Skip whitespace and array punctuation between entries
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != '[':
+                    return
+                started = True
+                pos += 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+
+            if pos < len(buffer):
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        return
+                else:
+                    yield entry
+                    pos = end
+                    continue
+            elif eof:
+                return
+
+            # Need more data: drop consumed text and read the next chunk
+            buffer = buffer[pos:]
+            pos = 0
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+
+
+@contextmanager
+def history_lock(path=HISTORY_FILE):
+    """Exclusive lock on the history file, shared by every process that changes it"""
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def append_history(entries, path=HISTORY_FILE):
+    """
+    Append entries to the history JSON array in place, under a file lock
+    shared by all worker processes. The bytes written are exactly what
+    json.dump(history + entries) would produce, so readers that follow the
+    file incrementally (history_columns) see a plain append.
+    """
+    if not entries:
+        return
+    encoded = ', '.join(json.dumps(entry) for entry in entries).encode('utf-8')
+    with history_lock(path):
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            f = open(path, 'w+b')
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 64))
+            tail = f.read()
+            stripped = tail.rstrip()
+            if not stripped.endswith(b']'):
+                # Missing or not a JSON array: start a new one
+                f.seek(0)
+                f.write(b'[' + encoded + b']')
+                f.truncate()
+                return
+            close_at = size - len(tail) + len(stripped) - 1
+            empty = stripped[:-1].rstrip().endswith(b'[')
+            f.seek(close_at)
+            f.write((b'' if empty else b', ') + encoded + b']')
+            f.truncate()
+
+
+def filter_history(entries, date_from=None, date_to=None, severities=None,
+                   include_images=True):
+    """Apply date-range / severity filters and optionally drop image blobs"""
+    severity_set = {s.strip().lower() for s in severities if s.strip()} if severities else None
+
+    for entry in entries:
+        entry_date = str(entry.get('date', ''))[:10]
+        if date_from and entry_date < date_from:
+            continue
+        if date_to and entry_date > date_to:
+            continue
+        if severity_set and str(entry.get('severity_level', '')).lower() not in severity_set:
+            continue
+        if not include_images:
+            entry = {k: v for k, v in entry.items() if k != 'image_data'}
+        yield entry
+
+
+def _export_fields(include_images):
+    if include_images:
+        return EXPORT_FIELDS
+    return [f for f in EXPORT_FIELDS if f != 'image_data']
+
+
+def export_jsonl(entries, include_images=True):
+    """Yield one JSON document per line"""
+    for entry in entries:
+        yield json.dumps(entry) + '\n'
+
+
+def export_csv(entries, include_images=True):
+    """Yield CSV text row by row, header first"""
+    fields = _export_fields(include_images)
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    writer.writerow(fields)
+    yield line.getvalue()
+
+    for entry in entries:
+        line.seek(0)
+        line.truncate()
+        writer.writerow(['' if entry.get(f) is None else entry.get(f) for f in fields])
+        yield line.getvalue()
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_parquet(entries, include_images=True, batch_size=1000):
+    """Return a generator yielding a Parquet file, one row group per batch"""
+    # Import eagerly so a missing dependency fails before streaming starts
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    return _parquet_chunks(pa, pq, entries, include_images, batch_size)
+
+
+def _parquet_chunks(pa, pq, entries, include_images, batch_size):
+    fields = _export_fields(include_images)
+    schema = pa.schema([
+        (f, pa.int64() if f in INTEGER_FIELDS else pa.string()) for f in fields
+    ])
+
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write_batch(rows):
+        columns = {f: [] for f in fields}
+        for row in rows:
+            for f in fields:
+                value = row.get(f)
+                if f in INTEGER_FIELDS:
+                    try:
+                        value = int(value)
+                    except (TypeError, ValueError):
+                        value = None
+                elif value is not None:
+                    value = str(value)
+                columns[f].append(value)
+        writer.write_table(pa.table(columns, schema=schema))
+
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            write_batch(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_batch(batch)
+
+    writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {
+    'csv': export_csv,
+    'jsonl': export_jsonl,
+    'parquet': export_parquet
+}
+
+
+def stream_export(fmt, path=HISTORY_FILE, date_from=None, date_to=None,
+                  severities=None, include_images=True):
+    """Return a generator producing the requested export format"""
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    entries = filter_history(
+        iter_history(path, date_from=date_from, date_to=date_to, include_images=include_images),
+        date_from=date_from,
+        date_to=date_to,
+        severities=severities,
+        include_images=include_images
+    )
+    return EXPORTERS[fmt](entries, include_images=include_images)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export ClaimInsight assessment history")
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='csv')
+    parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+    parser.add_argument('--history', default=HISTORY_FILE, help="History file to read")
+    parser.add_argument('--from', dest='date_from', help="Start date (YYYY-MM-DD, inclusive)")
+    parser.add_argument('--to', dest='date_to', help="End date (YYYY-MM-DD, inclusive)")
+    parser.add_argument('--severity', help="Comma-separated severity levels, e.g. severe,moderate")
+    parser.add_argument('--exclude-images', action='store_true', help="Drop base64 image data")
+    args = parser.parse_args(argv)
+
+    chunks = stream_export(
+        args.format,
+        path=args.history,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        severities=args.severity.split(',') if args.severity else None,
+        include_images=not args.exclude_images
+    )
+
+    binary = args.format == 'parquet'
+    if args.output:
+        out = open(args.output, 'wb' if binary else 'w', encoding=None if binary else 'utf-8', newline=None if binary else '')
+    else:
+        out = sys.stdout.buffer if binary else sys.stdout
+
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
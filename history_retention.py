@@ -0,0 +1,153 @@
+import argparse
+import calendar
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+from history_cold import ColdTier, cold_dir_for, default_codec, strip_image
+from history_columns import MISSING, parse_date, scan_history, segment_columns
+from history_export import HISTORY_FILE, history_lock
+
+RETENTION_DAYS = 90
+SEGMENT_ROWS = 20000     # entries per cold segment (held in memory while one is written)
+
+
+def _cutoff(older_than_days, now=None):
+    """Date-column seconds before which entries move to the cold tier (entry dates are local times)"""
+    local = time.localtime(time.time() if now is None else now)
+    return calendar.timegm(local) - int(older_than_days * 86400)
+
+
+def _first_entry_digest(path):
+    for start, end, _ in scan_history(path):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return hashlib.sha256(f.read(end - start)).hexdigest()
+    return None
+
+
+def _recover(cold, history_path):
+    """Finish compactions interrupted between writing segments and committing them"""
+    runs = cold.pending_runs()
+    if not runs:
+        return
+    first = _first_entry_digest(history_path)
+    for run, digest in runs.items():
+        # The history file still starting with the run's first entry means it was never rewritten
+        committed = digest != first
+        cold.finish(run, commit=committed)
+        print(f"DEBUG: history retention: {'committed' if committed else 'dropped'} interrupted run {run}")
+
+
+def _drop_prefix(path, first_span, first_digest, moved_end):
+    """
+    Rewrite the history file without the entries before moved_end, under
+    the append lock so no new entry is lost. The result is what json.dump
+    of the remaining entries would produce. False if the file changed
+    underneath (its first entry is no longer the one compacted).
+    """
+    with history_lock(path):
+        with open(path, 'rb') as f:
+            f.seek(first_span[0])
+            if hashlib.sha256(f.read(first_span[1] - first_span[0])).hexdigest() != first_digest:
+                return False
+            f.seek(moved_end)
+            head = f.read(64).lstrip(b', \t\r\n')
+            tmp_path = path + '.compact.tmp'
+            with open(tmp_path, 'wb') as out:
+                out.write(b'[' + head)
+                shutil.copyfileobj(f, out)
+                out.flush()
+                os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    return True
+
+
+def compact_history(history_path=HISTORY_FILE, older_than_days=RETENTION_DAYS, segment_rows=SEGMENT_ROWS,
+                    now=None):
+    """
+    Move assessments older than older_than_days from the history file into
+    compressed cold segments, images into the deduplicated image store.
+    Only the oldest run of entries moves (up to the first newer one), so
+    row order is kept and the file is rewritten by dropping a prefix.
+    Returns a summary dict.
+    """
+    cold = ColdTier(cold_dir_for(history_path))
+    summary = {'moved': 0, 'segments': 0, 'images_stored': 0, 'images_shared': 0, 'codec': default_codec(),
+               'hot_bytes_before': 0}
+    if not os.path.exists(history_path):
+        summary['hot_bytes_after'] = 0
+        return summary
+    with cold.locked():
+        _recover(cold, history_path)
+        summary['hot_bytes_before'] = os.path.getsize(history_path)
+        cutoff = _cutoff(older_than_days, now)
+        run = uuid.uuid4().hex
+        first_span = first_digest = moved_end = None
+        scanned, entries = [], []
+
+        def flush():
+            dates, ids, columns, dictionaries = segment_columns(scanned)
+            cold.add_pending(entries, dates, ids, columns, dictionaries, run, first_digest)
+            summary['segments'] += 1
+            summary['moved'] += len(entries)
+            scanned.clear()
+            entries.clear()
+
+        with open(history_path, 'rb') as f:
+            for start, end, scanned_entry in scan_history(history_path):
+                date = parse_date(scanned_entry.get('date'))
+                if date == MISSING or date >= cutoff:
+                    break
+                f.seek(start)
+                raw = f.read(end - start)
+                if first_digest is None:
+                    first_span, first_digest = (start, end), hashlib.sha256(raw).hexdigest()
+                entry, new_image = strip_image(json.loads(raw), cold.images)
+                if 'image_ref' in entry:
+                    summary['images_stored' if new_image else 'images_shared'] += 1
+                scanned.append(scanned_entry)
+                entries.append(entry)
+                moved_end = end
+                if len(entries) >= segment_rows:
+                    flush()
+            if entries:
+                flush()
+
+        if moved_end is None:
+            summary['hot_bytes_after'] = summary['hot_bytes_before']
+            return summary
+        try:
+            committed = _drop_prefix(history_path, first_span, first_digest, moved_end)
+        except Exception:
+            cold.finish(run, commit=False)
+            raise
+        cold.finish(run, commit=committed)
+        if not committed:
+            raise RuntimeError("History file was rewritten during compaction; nothing was moved")
+    summary['hot_bytes_after'] = os.path.getsize(history_path)
+    print(f"DEBUG: history retention: moved {summary['moved']} entries into {summary['segments']} cold segments")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old ClaimInsight assessments into compressed cold storage")
+    parser.add_argument('--history', default=HISTORY_FILE, help="History file to compact")
+    parser.add_argument('--older-than', type=float, default=RETENTION_DAYS,
+                        help=f"Move assessments older than this many days (default: {RETENTION_DAYS})")
+    parser.add_argument('--segment-rows', type=int, default=SEGMENT_ROWS, help="Entries per cold segment")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = compact_history(args.history, older_than_days=args.older_than, segment_rows=args.segment_rows)
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
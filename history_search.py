@@ -0,0 +1,167 @@
+import hashlib
+import html
+import os
+import re
+import sqlite3
+import threading
+
+from history_export import HISTORY_FILE, iter_history
+
+SEARCH_DB = 'data/history_search.db'
+# Bumped when rows change shape; older indexes are rebuilt on open
+INDEX_VERSION = 1
+# rowid is derived from the assessment id (see _rowid), so this is an upsert per assessment
+INSERT_ROW = '''
+    INSERT OR REPLACE INTO history_fts (
+        rowid, assessment_id, date, damage_type, severity_level, severity_score,
+        loss_description, image_caption, affected_components, policy_holder_name, address
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# Private-use characters mark matches in snippets until the text is HTML-escaped
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+
+def _build_match_query(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+    Text inside double quotes is kept as a phrase; every other word
+    becomes a quoted term, so all terms must match (implicit AND).
+    """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query or ''):
+        text = phrase or word
+        tokens = re.findall(r'\w+', text)
+        if tokens:
+            parts.append('"' + ' '.join(tokens) + '"')
+    return ' '.join(parts)
+
+
+def _rowid(assessment_id):
+    """Stable FTS rowid for an assessment id, so re-adding an assessment replaces its row"""
+    return int.from_bytes(hashlib.sha256(str(assessment_id).encode('utf-8')).digest()[:8], 'big') >> 1
+
+
+def _snippet_html(snippet):
+    """Snippet text is user input: escape it, then turn the match markers into <mark> tags"""
+    return (html.escape(snippet or '')
+            .replace(MATCH_START, '<mark>')
+            .replace(MATCH_END, '</mark>'))
+
+
+class HistorySearchIndex:
+    """
+    SQLite FTS5 index over the searchable text of every assessment.
+    Rows are added as assessments are inserted, so searches never have
+    to scan the history file.
+    """
+
+    def __init__(self, path=SEARCH_DB, history_path=HISTORY_FILE):
+        self.path = path
+        self.history_path = history_path
+        self._local = threading.local()
+
+        is_new = not os.path.exists(self.path)
+        conn = self._connect()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                assessment_id UNINDEXED,
+                date UNINDEXED,
+                damage_type,
+                severity_level UNINDEXED,
+                severity_score UNINDEXED,
+                loss_description,
+                image_caption,
+                affected_components,
+                policy_holder_name,
+                address,
+                tokenize = 'porter unicode61'
+            )
+        """)
+        conn.commit()
+
+        # Indexes from before rowids were keyed on the assessment id are rebuilt once
+        if is_new or conn.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            self.rebuild()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(assessment_id, entry):
+        address = ', '.join(
+            str(entry.get(field)) for field in ('property_address', 'city', 'state', 'zip_code')
+            if entry.get(field)
+        )
+        return (
+            _rowid(assessment_id),
+            str(assessment_id),
+            str(entry.get('date', '')),
+            str(entry.get('damage_type') or ''),
+            str(entry.get('severity_level') or ''),
+            entry.get('severity_score'),
+            str(entry.get('loss_description') or ''),
+            str(entry.get('image_caption') or ''),
+            str(entry.get('affected_components') or ''),
+            str(entry.get('policy_holder_name') or ''),
+            address
+        )
+
+    def add(self, entry, assessment_id=None):
+        """Index a single new assessment, replacing any row already indexed for its id"""
+        assessment_id = assessment_id or entry.get('assessment_id')
+        conn = self._connect()
+        conn.execute(INSERT_ROW, self._row(assessment_id, entry))
+        conn.commit()
+
+    def rebuild(self):
+        """Re-index the whole history, cold tier included (backfill for existing data)"""
+        conn = self._connect()
+        conn.execute('DELETE FROM history_fts')
+        batch = []
+        for index, entry in enumerate(iter_history(self.history_path, include_images=False)):
+            batch.append(self._row(entry.get('assessment_id') or f"row-{index}", entry))
+            if len(batch) >= 1000:
+                conn.executemany(INSERT_ROW, batch)
+                batch = []
+        if batch:
+            conn.executemany(INSERT_ROW, batch)
+        conn.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        conn.commit()
+
+    def search(self, query, limit=20, offset=0):
+        """Return ranked matches with highlighted, HTML-escaped snippets"""
+        match = _build_match_query(query)
+        if not match:
+            return []
+
+        conn = self._connect()
+        rows = conn.execute("""
+            SELECT assessment_id, date, damage_type, severity_level, severity_score,
+                   policy_holder_name, bm25(history_fts) AS score,
+                   snippet(history_fts, -1, ?, ?, '...', 12)
+            FROM history_fts
+            WHERE history_fts MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        """, (MATCH_START, MATCH_END, match, limit, offset)).fetchall()
+
+        return [
+            {
+                'assessment_id': row[0],
+                'date': row[1],
+                'damage_type': row[2],
+                'severity_level': row[3],
+                'severity_score': row[4],
+                'policy_holder_name': row[5],
+                'rank': round(-row[6], 4),  # bm25() is lower-is-better; flip for readability
+                'snippet': _snippet_html(row[7])
+            }
+            for row in rows
+        ]
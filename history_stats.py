@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+from cost_engine import entry_cost_paise, format_inr_range
+from history_export import HISTORY_FILE, iter_history
+
+STATS_DB = 'data/history_stats.db'
+# Bumped when the tables change shape; older databases are rebuilt on open
+STATS_VERSION = 1
+
+# Severity score histogram buckets: 0-9, 10-19, ..., 90-100
+SCORE_BUCKETS = 10
+DASHBOARD_DAYS = 365   # days of by_day breakdown in a snapshot
+
+# Each record adds its deltas to a handful of rows, however large the history is
+UPSERT_COUNT = '''
+    INSERT INTO counts (dimension, key, count) VALUES (?, ?, ?)
+    ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count
+'''
+UPSERT_DAY_COUNT = '''
+    INSERT INTO day_counts (day, dimension, key, count) VALUES (?, ?, ?, ?)
+    ON CONFLICT (day, dimension, key) DO UPDATE SET count = count + excluded.count
+'''
+
+
+def entry_deltas(entry):
+    """The (dimension, key) and (day, dimension, key) counters one history entry adds to"""
+    damage_type = str(entry.get('damage_type') or 'Unknown Damage')
+    severity_level = str(entry.get('severity_level') or 'unknown')
+    day = str(entry.get('date', ''))[:10] or 'unknown'
+
+    counts = Counter({('total', ''): 1, ('damage_type', damage_type): 1, ('severity_level', severity_level): 1})
+    day_counts = Counter({
+        (day, 'count', ''): 1,
+        (day, 'damage_type', damage_type): 1,
+        (day, 'severity_level', severity_level): 1
+    })
+
+    try:
+        score = min(100, max(0, int(entry.get('severity_score'))))
+        counts[('score_bucket', str(min(score // 10, SCORE_BUCKETS - 1)))] += 1
+        counts[('score_sum', '')] += score
+    except (TypeError, ValueError):
+        pass
+
+    for component in str(entry.get('affected_components') or '').split(','):
+        component = component.strip()
+        if component:
+            counts[('component', component)] += 1
+
+    cost_min, cost_max = entry_cost_paise(entry)
+    counts[('cost_paise', 'min')] += cost_min
+    counts[('cost_paise', 'max')] += cost_max
+    return counts, day_counts
+
+
+class HistoryStats:
+    """
+    Dashboard aggregates maintained incrementally as assessments are added,
+    as counter rows in SQLite. record() upserts the few rows an entry
+    touches, so writers never reload or rewrite the whole aggregate, and
+    SQLite serialises the worker processes. Reading the stats never touches
+    the history file.
+    """
+
+    def __init__(self, path=STATS_DB, history_path=HISTORY_FILE):
+        self.path = path
+        self.history_path = history_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS counts (
+                    dimension TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, key)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS day_counts (
+                    day TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (day, dimension, key)
+                ) WITHOUT ROWID
+            """)
+
+        # Backfill once; the version is checked under the write lock so workers don't both rebuild
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != STATS_VERSION:
+                self._recompute(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _write(conn, counts, day_counts):
+        conn.executemany(UPSERT_COUNT, [(dimension, key, n) for (dimension, key), n in counts.items()])
+        conn.executemany(UPSERT_DAY_COUNT, [(day, dimension, key, n) for (day, dimension, key), n in day_counts.items()])
+
+    def record(self, entry):
+        """Fold one new history entry into the aggregates"""
+        counts, day_counts = entry_deltas(entry)
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._write(conn, counts, day_counts)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def rebuild(self):
+        """One-off full recompute from the history, cold tier included (used for backfill)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._recompute(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _recompute(self, conn):
+        counts, day_counts = Counter(), Counter()
+        for entry in iter_history(self.history_path, include_images=False):
+            entry_counts, entry_day_counts = entry_deltas(entry)
+            counts.update(entry_counts)
+            day_counts.update(entry_day_counts)
+        conn.execute('DELETE FROM counts')
+        conn.execute('DELETE FROM day_counts')
+        self._write(conn, counts, day_counts)
+        conn.execute(f'PRAGMA user_version = {STATS_VERSION}')
+
+    def snapshot(self, top_components=20, days=DASHBOARD_DAYS):
+        """Return the current aggregates in dashboard form; by_day covers the latest days days"""
+        conn = self._connect()
+        # One read transaction, so the figures are consistent with each other
+        conn.execute('BEGIN')
+        try:
+            counts = {}
+            for dimension, key, count in conn.execute(
+                    "SELECT dimension, key, count FROM counts WHERE dimension != 'component'"):
+                counts.setdefault(dimension, {})[key] = count
+            components = conn.execute(
+                "SELECT key, count FROM counts WHERE dimension = 'component' "
+                "ORDER BY count DESC, key LIMIT ?", (top_components,)
+            ).fetchall()
+            by_day = {}
+            for day, dimension, key, count in conn.execute("""
+                    SELECT day, dimension, key, count FROM day_counts
+                    WHERE day IN (SELECT DISTINCT day FROM day_counts ORDER BY day DESC LIMIT ?)
+                    ORDER BY day""", (days,)):
+                day_stats = by_day.setdefault(day, {'count': 0, 'damage_type': {}, 'severity_level': {}})
+                if dimension == 'count':
+                    day_stats['count'] = count
+                else:
+                    day_stats[dimension][key] = count
+        finally:
+            conn.commit()
+
+        total = counts.get('total', {}).get('', 0)
+        score_sum = counts.get('score_sum', {}).get('', 0)
+        histogram = counts.get('score_bucket', {})
+        cost = counts.get('cost_paise', {})
+        cost_min, cost_max = cost.get('min', 0), cost.get('max', 0)
+        return {
+            'total_assessments': total,
+            'damage_type_counts': counts.get('damage_type', {}),
+            'severity_level_counts': counts.get('severity_level', {}),
+            'by_day': by_day,
+            'severity_score_histogram': [
+                {'range': f"{i * 10}-{i * 10 + 9 if i < SCORE_BUCKETS - 1 else 100}", 'count': histogram.get(str(i), 0)}
+                for i in range(SCORE_BUCKETS)
+            ],
+            'average_severity_score': round(score_sum / total, 1) if total else 0,
+            'top_components': components,
+            'cost_totals': {
+                'min_paise': cost_min,
+                'max_paise': cost_max,
+                'range': format_inr_range(cost_min, cost_max)
+            }
+        }
@@ -0,0 +1,163 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from history_export import HISTORY_FILE, append_history, iter_history
+
+HISTORY_PREFIX = 'history/'
+SYNC_STATE_FILE = 'data/history_sync.json'
+LATE_WRITE_SECONDS = 600   # entries may land this long after newer ones (slow writers, clock skew)
+FETCH_BATCH = 256          # entries downloaded per batch when catching up
+FETCH_WORKERS = 8          # parallel downloads, over the storage client's connection pool
+
+KEY_TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def entry_ident(entry):
+    """Identity of an entry across nodes: its assessment id"""
+    ident = re.sub(r'[^A-Za-z0-9_-]', '', str(entry.get('assessment_id') or ''))
+    if not ident:
+        # Old entries without an id: a content hash gives every node the same identity
+        ident = hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    return ident
+
+
+def _key_ident(key):
+    return key.rsplit('/', 1)[-1][16:-len('.json')]
+
+
+def _key_time(key):
+    """Epoch seconds encoded in a history key"""
+    stamp = key.rsplit('/', 1)[-1][:15]
+    return (datetime.strptime(stamp, KEY_TIME_FORMAT) - datetime(1970, 1, 1)).total_seconds()
+
+
+def _time_prefix(seconds):
+    """Key prefix for a moment; every key from that second on sorts after it"""
+    when = datetime(1970, 1, 1) + timedelta(seconds=max(0, seconds))
+    return f"{HISTORY_PREFIX}{when:%Y/%m/%d}/{when.strftime(KEY_TIME_FORMAT)}"
+
+
+class HistorySync:
+    """
+    Shared history for several app nodes. Each assessment is published as
+    its own object in shared storage, and every node appends the entries
+    it has not seen to its local history file, which the stats, search,
+    columns and export code keep reading as before. Listing starts
+    LATE_WRITE_SECONDS before the newest entry seen, and the keys seen in
+    that window are remembered, so entries written late are still picked up
+    once and only once.
+    """
+
+    def __init__(self, storage, history_path=HISTORY_FILE, state_path=SYNC_STATE_FILE,
+                 late_write_seconds=LATE_WRITE_SECONDS):
+        self.storage = storage
+        self.history_path = history_path
+        self.state_path = state_path
+        self.late_write_seconds = late_write_seconds
+        self._last_pull = 0.0
+        self._pull_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        print("✅ History sync initialized!")
+
+    def publish(self, entry):
+        """
+        Write an entry to shared storage; pull() adds it to local history.
+        Keys are history/YYYY/MM/DD/<publish time>-<identity>.json, so they
+        sort by when they were published, whatever the entry's own date.
+        """
+        key = f"{_time_prefix(time.time())}-{entry_ident(entry)}.json"
+        self.storage.put_bytes(key, json.dumps(entry).encode('utf-8'))
+        return key
+
+    def due(self, interval):
+        """True at most once per interval seconds in this process"""
+        with self._pull_lock:
+            now = time.monotonic()
+            if now - self._last_pull < interval:
+                return False
+            self._last_pull = now
+            return True
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self, keys):
+        newest = max((_key_time(key) for key in keys), default=0)
+        cutoff = newest - self.late_write_seconds
+        state = {'newest': newest, 'recent': sorted(key for key in keys if _key_time(key) >= cutoff)}
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _fetch(self, keys):
+        """(keys, entries) batches for keys, in order, downloaded in parallel"""
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            for start in range(0, len(keys), FETCH_BATCH):
+                batch = keys[start:start + FETCH_BATCH]
+                yield batch, [json.loads(data) for data in pool.map(self.storage.get_bytes, batch)]
+
+    def pull(self):
+        """
+        Append entries published since the last pull to the local history
+        file; returns them so the caller can index them. Worker processes
+        of one node take turns, so each entry is appended (and returned)
+        exactly once per node.
+        """
+        with open(self.state_path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._read_state()
+            if state is None:
+                return self._reconcile()
+
+            recent = set(state['recent'])
+            start_after = _time_prefix(state['newest'] - self.late_write_seconds)
+            new_keys = [key for key, _, _ in self.storage.list(HISTORY_PREFIX, start_after=start_after)
+                        if key.endswith('.json') and key not in recent]
+            added = []
+            for keys, entries in self._fetch(new_keys):
+                append_history(entries, self.history_path)
+                added.extend(entries)
+                # Recorded per batch, so a failed pull never appends the same entry twice
+                recent.update(keys)
+                self._write_state(recent)
+            return added
+
+    def _reconcile(self):
+        """
+        First pull on this node: publish local entries that shared storage
+        lacks (history from before it was shared), then append the shared
+        entries the local file lacks.
+        """
+        local_idents = {entry_ident(entry) for entry in iter_history(self.history_path)}
+        remote_keys = sorted(key for key, _, _ in self.storage.list(HISTORY_PREFIX) if key.endswith('.json'))
+        remote_idents = {_key_ident(key) for key in remote_keys}
+        published = []
+        for entry in iter_history(self.history_path):
+            if entry_ident(entry) not in remote_idents:
+                published.append(self.publish(entry))
+        missing = []
+        for key in remote_keys:
+            ident = _key_ident(key)
+            if ident not in local_idents:
+                local_idents.add(ident)   # once, even if two nodes published it
+                missing.append(key)
+        added = []
+        # Safe to repeat if interrupted: the next attempt sees what was appended
+        for _, entries in self._fetch(missing):
+            append_history(entries, self.history_path)
+            added.extend(entries)
+        self._write_state(set(remote_keys).union(published))
+        print(f"DEBUG: history sync: published {len(published)} local entries, pulled {len(added)}")
+        return added
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+IDEMPOTENCY_DIR = 'data/idempotency'
+KEY_TTL_SECONDS = 3600          # how long a finished response is replayed for its key
+IN_FLIGHT_SECONDS = 300         # a lock older than this was left by a dead worker
+DEFAULT_WAIT_SECONDS = 60.0     # how long a retry waits on the in-flight original
+POLL_SECONDS = 0.1              # wait step when the original runs in another process
+CLEANUP_INTERVAL = 60
+
+KEY_PATTERN = re.compile(r'[\x21-\x7e]{1,255}')   # printable ASCII, no spaces
+
+# Response headers that describe the original transfer rather than the result
+SKIPPED_HEADERS = {'content-length', 'set-cookie', 'date'}
+
+
+class IdempotencyError(Exception):
+    """Raised when a keyed request can't be served; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def request_fingerprint(*parts):
+    """sha256 over the parts of a request that must match for a key to be reused"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def is_replayable(status_code):
+    # Server errors and 429s are worth retrying for real; everything else is the answer
+    return status_code < 500 and status_code != 429
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key support: the first request with a key computes its
+    response and stores it; retries with the same key wait for that
+    computation (single flight) and get the stored response instead of
+    running the pipeline again. Keys and responses live on local disk, so
+    retries landing on another worker process are deduplicated as well.
+    Reusing a key for a different request is rejected with 422.
+    """
+
+    def __init__(self, store_dir=IDEMPOTENCY_DIR, ttl=KEY_TTL_SECONDS, wait_seconds=DEFAULT_WAIT_SECONDS):
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self.wait_seconds = wait_seconds
+        self._events = {}                 # name -> Event, for keys computed in this process
+        self._events_lock = threading.Lock()
+        self._last_cleanup = 0.0
+        os.makedirs(self.store_dir, exist_ok=True)
+        print("✅ Idempotency store initialized!")
+
+    def _paths(self, scope, key):
+        name = hashlib.sha256(f"{scope}\n{key}".encode('utf-8')).hexdigest()
+        base = os.path.join(self.store_dir, name)
+        return name, base + '.json', base + '.body', base + '.lock'
+
+    def _load(self, meta_path, body_path):
+        """The stored response, or None if absent or expired"""
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.ttl:
+                return None
+            with open(meta_path, 'r') as f:
+                record = json.load(f)
+            with open(body_path, 'rb') as f:
+                record['body'] = f.read()
+            return record
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, meta_path, body_path, record, fingerprint):
+        # Body first, then the metadata rename that makes the record visible
+        with open(body_path + '.tmp', 'wb') as f:
+            f.write(record['body'])
+        os.replace(body_path + '.tmp', body_path)
+        meta = {'status': record['status'], 'headers': record['headers'], 'fingerprint': fingerprint,
+                'created': time.time()}
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _read_lock(self, lock_path):
+        """Fingerprint of the in-flight request, or None if the lock is gone or stale"""
+        try:
+            if time.time() - os.path.getmtime(lock_path) > IN_FLIGHT_SECONDS:
+                os.remove(lock_path)
+                return None
+            with open(lock_path, 'r') as f:
+                return f.read().strip() or ''
+        except OSError:
+            return None
+
+    def execute(self, scope, key, fingerprint, compute, replayable=is_replayable):
+        """
+        Run compute() at most once per (scope, key) while its result is kept.
+        compute returns {'status', 'headers', 'body'}; returns (record, replayed).
+        Only results whose status passes replayable(status) are kept.
+        """
+        if not KEY_PATTERN.fullmatch(str(key)):
+            raise IdempotencyError('Idempotency-Key must be 1-255 printable ASCII characters', 400)
+        self._maybe_cleanup()
+        name, meta_path, body_path, lock_path = self._paths(scope, key)
+        deadline = time.monotonic() + self.wait_seconds
+
+        while True:
+            record = self._load(meta_path, body_path)
+            if record is not None:
+                if record['fingerprint'] != fingerprint:
+                    raise IdempotencyError('Idempotency-Key was already used for a different request', 422)
+                return record, True
+
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self._read_lock(lock_path)
+                if owner is None:
+                    continue
+                if owner and owner != fingerprint:
+                    raise IdempotencyError('Idempotency-Key is in use by a different request', 422)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IdempotencyError('A request with this Idempotency-Key is still in progress', 409,
+                                           retry_after=5)
+                event = self._events.get(name)
+                if event is not None:
+                    event.wait(min(remaining, IN_FLIGHT_SECONDS))
+                else:
+                    time.sleep(min(remaining, POLL_SECONDS))
+                continue
+            break
+
+        with os.fdopen(fd, 'w') as f:
+            f.write(fingerprint)
+        # The original may have finished between the check above and taking the lock
+        record = self._load(meta_path, body_path)
+        if record is not None and record['fingerprint'] == fingerprint:
+            os.remove(lock_path)
+            return record, True
+        event = threading.Event()
+        with self._events_lock:
+            self._events[name] = event
+        try:
+            record = compute()
+            if replayable(record['status']):
+                self._save(meta_path, body_path, record, fingerprint)
+            return record, False
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            with self._events_lock:
+                self._events.pop(name, None)
+            event.set()
+
+    def _maybe_cleanup(self):
+        now = time.time()
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        for filename in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, filename)
+            max_age = IN_FLIGHT_SECONDS if filename.endswith('.lock') else self.ttl
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -1,31 +1,48 @@
-import requests
-from PIL import Image
 import os
 import base64
 import json
 import random  # Added import
+from lazy_imports import lazy_module
+from scoring_rules import default_store
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+Image = lazy_module('PIL.Image')
 
 class ImageCaptioner:
-    def __init__(self):
+    def __init__(self, rules=None):
         print("✅ Lightweight Image Captioner initialized!")
         # Using a pre-trained model API or local lightweight model
         # For now, we'll use a simple keyword-based approach
         # You can replace with actual API call if needed
         
-    def generate_caption(self, image_path):
+        # Keyword and descriptor tables live in rules/scoring_rules.json
+        self._rules = rules if rules is not None else default_store()
+
+    @property
+    def rules(self):
+        # Either a pinned CompiledRules or a RulesStore that hot-reloads
+        if hasattr(self._rules, 'get'):
+            return self._rules.get()
+        return self._rules
+        
+    def generate_caption(self, image_path, image=None):
         """
-        Generate caption for uploaded image using lightweight approach
+        Generate caption for uploaded image using lightweight approach.
+        Pass an already decoded array as `image` to skip reading from disk;
+        image_path is then only used for its filename.
         """
         try:
-            # Open and validate image
-            if not os.path.exists(image_path):
-                return "Error: Image file not found"
-            
-            image = Image.open(image_path).convert('RGB')
-            
-            # Get basic image info
-            width, height = image.size
-            image_size_kb = os.path.getsize(image_path) / 1024
+            if image is None:
+                # Open and validate image
+                if not os.path.exists(image_path):
+                    return "Error: Image file not found"
+                
+                image = Image.open(image_path).convert('RGB')
+                
+                # Get basic image info
+                width, height = image.size
+                image_size_kb = os.path.getsize(image_path) / 1024
             
             # Simple keyword-based caption generation
             # This is a placeholder - you can enhance this
@@ -37,26 +54,26 @@ class ImageCaptioner:
             print(f"Caption generation error: {e}")
             return f"Image analysis completed. Damage assessment ready."
 
+    def caption_from_filename(self, filename):
+        """What generate_caption returns for a decoded image: its caption only reads the filename"""
+        try:
+            return self._generate_simple_caption(filename)
+        except Exception as e:
+            print(f"Caption generation error: {e}")
+            return f"Image analysis completed. Damage assessment ready."
+
     def _generate_simple_caption(self, image_path):
         """Generate a simple caption based on filename and basic analysis"""
         filename = os.path.basename(image_path).lower()
         
-        # Keyword matching for common damage types - ENHANCED FLOOD DETECTION
-        damage_keywords = {
-            'hail': ['hail', 'ice', 'stone'],
-            'water': ['water', 'flood', 'rain', 'leak', 'inundated', 'submerged', 'damp', 'wet', 'moisture'],
-            'fire': ['fire', 'burn', 'smoke', 'ash'],
-            'collision': ['collision', 'crash', 'accident', 'impact'],
-            'vandalism': ['vandal', 'scratch', 'broken', 'smashed'],
-            'storm': ['storm', 'wind', 'tree', 'branch'],
-            'theft': ['theft', 'broken', 'window', 'door']
-        }
+        rules = self.rules
         
+        # Keyword matching for common damage types - ENHANCED FLOOD DETECTION
         caption = "Image analysis indicates "
         
         # Check filename for damage clues
         detected_damage = []
-        for damage_type, keywords in damage_keywords.items():
+        for damage_type, keywords in rules.caption_damage_keywords.items():
             for keyword in keywords:
                 if keyword in filename:
                     if damage_type not in detected_damage:
@@ -69,92 +86,97 @@ class ImageCaptioner:
         else:
             caption += "visible damage to property. "
         
-        # ENHANCED FLOOD SEVERITY DETECTION
-        if 'water' in detected_damage or 'flood' in detected_damage:
-            # Flood-specific severity indicators
-            flood_severe_keywords = ['submerged', 'inundated', 'deep', 'standing', 'sewage', 
-                                    'contaminated', 'complete', 'total', 'engine', 'electrical',
-                                    'interior', 'seat', 'carpet', 'upholstery', 'mud', 'debris']
-            
-            flood_moderate_keywords = ['water', 'flood', 'moisture', 'damp', 'wet', 'partially',
-                                      'some', 'moderate', 'noticeable', 'obvious']
-            
-            flood_minor_keywords = ['splash', 'spray', 'light', 'minor', 'small', 'surface']
-            
-            # Check for severity in filename
-            if any(word in filename for word in flood_severe_keywords):
-                flood_descriptors = [
-                    "Complete vehicle submersion detected with severe water intrusion.",
-                    "Deep flood water has entered critical vehicle components requiring extensive repairs.",
-                    "Submerged vehicle shows signs of complete water damage to all systems.",
-                    "Severe flood damage affecting electrical, mechanical, and interior systems.",
-                    "Vehicle appears completely inundated with water damage throughout."
-                ]
-            elif any(word in filename for word in flood_moderate_keywords):
-                flood_descriptors = [
-                    "Significant water damage affecting multiple vehicle systems.",
-                    "Moderate flood damage with water intrusion into interior compartments.",
-                    "Noticeable water damage requiring professional assessment and drying.",
-                    "Vehicle shows evidence of water exposure affecting various components."
-                ]
-            else:
-                flood_descriptors = [
-                    "Water damage observed on vehicle surfaces.",
-                    "Moisture intrusion detected requiring attention.",
-                    "Signs of water exposure visible on the vehicle."
-                ]
-            
-            caption += random.choice(flood_descriptors)
-            
+        # ENHANCED FLOOD SEVERITY DETECTION: flood and non-flood tiers are checked
+        # in order; the last tier of each has no keywords and always applies
+        if any(damage_type in detected_damage for damage_type in rules.caption_flood_types):
+            tiers = rules.caption_flood_tiers
         else:
-            # Original severity detection for non-flood damage
-            minor_keywords = ['minor', 'small', 'tiny', 'little', 'scratch', 'scratches', 
-                             'ding', 'chip', 'mark', 'cosmetic', 'surface', 'paint', 
-                             'light', 'slight', 'superficial']
-            
-            severe_keywords = ['major', 'severe', 'heavy', 'serious', 'critical', 
-                              'broken', 'cracked', 'shattered', 'smashed', 'crash',
-                              'impact', 'collision', 'totaled', 'wrecked', 'demolished',
-                              'structural', 'frame', 'chassis', 'burned', 'flooded']
-            
-            moderate_keywords = ['moderate', 'medium', 'noticeable', 'obvious', 'dents',
-                                'bent', 'twisted', 'multiple', 'several']
-            
-            if any(word in filename for word in minor_keywords):
-                descriptors = [
-                    "Minor surface imperfections observed.",
-                    "Cosmetic damage affecting appearance only.",
-                    "Superficial marks requiring touch-up repair.",
-                    "Light surface damage with no structural impact.",
-                    "Minor dents and scratches visible - cosmetic only.",
-                    "Paint or finish damage requiring minimal repair."
-                ]
-            elif any(word in filename for word in severe_keywords):
-                descriptors = [
-                    "Multiple impact points visible on exterior surfaces.",
-                    "Surface deformation and material stress observed.",
-                    "Visible structural compromise requiring assessment.",
-                    "External damage affecting functional components.",
-                    "Material deterioration and surface imperfections noted.",
-                    "Significant damage requiring professional assessment."
-                ]
-            elif any(word in filename for word in moderate_keywords):
-                descriptors = [
-                    "Moderate damage requiring attention.",
-                    "Several affected areas visible.",
-                    "Noticeable damage impacting appearance.",
-                    "Multiple dents or scratches observed.",
-                    "Functional components may be affected."
-                ]
-            else:
-                descriptors = [
-                    "Damage assessment in progress.",
-                    "Visual inspection completed.",
-                    "Property damage detected.",
-                    "External surfaces show signs of impact.",
-                    "Assessment ready for claim processing."
-                ]
-            
-            caption += random.choice(descriptors)
+            tiers = rules.caption_tiers
+        
+        for keywords, descriptors in tiers:
+            if not keywords or any(word in filename for word in keywords):
+                caption += random.choice(descriptors)
+                break
+        
+        return caption
+
+    def generate_damage_map(self, image, grid_size=8, analysis_side=512, hot_threshold=0.55):
+        """
+        Coarse damage localization for a decoded BGR array.
+        The image is split into a grid_size x grid_size grid and every tile gets
+        edge density, texture variance and colour deviation, each read in O(1)
+        from integral images. Returns a 0-1 heatmap plus bounding regions of
+        connected hot tiles in normalized (x, y, w, h) image coordinates.
+        """
+        height, width = image.shape[:2]
+        
+        # Downscale: nearest-neighbour to ~2x analysis size, then area-average
+        small = image
+        if max(width, height) > analysis_side * 2:
+            factor = analysis_side * 2 / max(width, height)
+            small = cv2.resize(image, (max(1, int(width * factor)), max(1, int(height * factor))),
+                               interpolation=cv2.INTER_NEAREST)
+        scale = analysis_side / max(small.shape[:2])
+        if scale < 1:
+            small = cv2.resize(small, (max(1, int(small.shape[1] * scale)), max(1, int(small.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+        if small.ndim == 2:
+            small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
         
-        return caption
\ No newline at end of file
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        lab = cv2.cvtColor(small, cv2.COLOR_BGR2LAB).astype(np.float32)
+        edges = (cv2.Canny(gray, 50, 150) > 0).astype(np.uint8)
+        
+        # Integral images: sums over any rectangle in four lookups
+        edge_sum = cv2.integral(edges)
+        gray_sum, gray_sqsum = cv2.integral2(gray)
+        lab_sum = cv2.integral(lab)
+        
+        h, w = gray.shape
+        grid_size = max(1, min(grid_size, h, w))
+        ys = np.linspace(0, h, grid_size + 1).astype(int)
+        xs = np.linspace(0, w, grid_size + 1).astype(int)
+        y0, y1 = ys[:-1, None], ys[1:, None]
+        x0, x1 = xs[None, :-1], xs[None, 1:]
+        area = ((y1 - y0) * (x1 - x0)).astype(np.float64)
+        
+        def tile_sums(integral):
+            return integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        
+        edge_density = tile_sums(edge_sum) / area
+        gray_mean = tile_sums(gray_sum) / area
+        texture_variance = np.maximum(tile_sums(gray_sqsum) / area - gray_mean ** 2, 0)
+        tile_colour = np.stack([tile_sums(lab_sum[:, :, c]) for c in range(3)], axis=-1) / area[..., None]
+        global_colour = lab.reshape(-1, 3).mean(axis=0)
+        colour_deviation = np.linalg.norm(tile_colour - global_colour, axis=-1)
+        
+        def normalize(values):
+            top = np.percentile(values, 95)
+            return np.clip(values / top, 0, 1) if top > 0 else np.zeros_like(values)
+        
+        heatmap = (0.4 * normalize(edge_density)
+                   + 0.3 * normalize(np.sqrt(texture_variance))
+                   + 0.3 * normalize(colour_deviation))
+        
+        # Group adjacent hot tiles into regions
+        hot = (heatmap >= hot_threshold).astype(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+        regions = []
+        for label in range(1, count):
+            col, row, cols, rows, tiles = stats[label]
+            regions.append({
+                'x': round(float(col) / grid_size, 4),
+                'y': round(float(row) / grid_size, 4),
+                'w': round(float(cols) / grid_size, 4),
+                'h': round(float(rows) / grid_size, 4),
+                'tiles': int(tiles),
+                'score': round(float(heatmap[labels == label].mean()), 3)
+            })
+        regions.sort(key=lambda r: r['score'] * r['tiles'], reverse=True)
+        
+        return {
+            'grid': grid_size,
+            'heatmap': np.round(heatmap, 3).tolist(),
+            'regions': regions,
+            'coverage': round(float(hot.mean()), 3)
+        }
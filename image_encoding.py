@@ -0,0 +1,97 @@
+from io import BytesIO
+
+from lazy_imports import lazy_module
+
+Image = lazy_module('PIL.Image')
+ImageOps = lazy_module('PIL.ImageOps')
+
+# Formats browsers and ReportLab both render without conversion
+PASSTHROUGH_FORMATS = {'jpeg', 'png'}
+PASSTHROUGH_MODES = {'RGB', 'RGBA', 'L', 'LA', 'P'}
+
+DEFAULT_MAX_PASSTHROUGH_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_SIDE = 4096
+DEFAULT_JPEG_QUALITY = 85
+
+MIME_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+def reencode_reasons(upload, max_bytes=DEFAULT_MAX_PASSTHROUGH_BYTES, max_side=DEFAULT_MAX_SIDE):
+    """List why the original upload bytes can't be stored as-is (empty = pass through)"""
+    reasons = []
+    if upload['format'] not in PASSTHROUGH_FORMATS:
+        reasons.append(f"format {upload['format']}")
+    if upload['mode'] not in PASSTHROUGH_MODES:
+        reasons.append(f"colour mode {upload['mode']}")
+    if upload['size_bytes'] > max_bytes:
+        reasons.append('file size')
+    if max(upload['width'], upload['height']) > max_side:
+        reasons.append('dimensions')
+    if upload.get('orientation', 1) not in (None, 1):
+        # ReportLab ignores EXIF orientation, so rotate the pixels once here
+        reasons.append('EXIF orientation')
+    return reasons
+
+
+def encode_for_storage(upload, quality=DEFAULT_JPEG_QUALITY, progressive=True,
+                       max_bytes=DEFAULT_MAX_PASSTHROUGH_BYTES, max_side=DEFAULT_MAX_SIDE):
+    """
+    Produce the bytes stored as image_data for an upload.
+    Browser/PDF-compatible JPEG and PNG files within limits are kept byte for
+    byte (no quality loss, EXIF preserved, no encode cost). Everything else is
+    re-encoded once: EXIF orientation applied, downscaled to max_side, and
+    written as JPEG (or PNG when transparency has to be kept).
+    Returns (bytes, image_format).
+    """
+    reasons = reencode_reasons(upload, max_bytes=max_bytes, max_side=max_side)
+    buffer = upload['buffer']
+    if not reasons:
+        return buffer.getvalue(), upload['format']
+
+    print(f"DEBUG: re-encoding upload ({', '.join(reasons)})")
+    buffer.seek(0)
+    with Image.open(buffer) as img:
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        out = BytesIO()
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha and upload['format'] == 'png':
+            img.save(out, format='PNG', optimize=True)
+            return out.getvalue(), 'png'
+
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(out, format='JPEG', quality=quality, progressive=progressive, optimize=True)
+        return out.getvalue(), 'jpeg'
+
+
+def encode_for_pdf(image_bytes, box_width, box_height, dpi=150, quality=80):
+    """
+    Image bytes to embed in a PDF where they are drawn box_width x box_height
+    points. Pixels beyond what the box shows at `dpi` are dropped and the
+    result is a baseline JPEG, which ReportLab embeds as is (DCT) instead of
+    storing raw pixels. JPEGs already small enough are returned unchanged.
+    """
+    max_width = max(1, int(round(box_width / 72.0 * dpi)))
+    max_height = max(1, int(round(box_height / 72.0 * dpi)))
+    with Image.open(BytesIO(image_bytes)) as img:
+        if (img.format == 'JPEG' and img.mode in ('RGB', 'L')
+                and img.width <= max_width and img.height <= max_height):
+            return image_bytes
+
+        img.draft('RGB', (max_width, max_height))  # JPEG: decode at a reduced scale when possible
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # PDF JPEGs carry no alpha; flatten onto the white page
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        if img.width > max_width or img.height > max_height:
+            img.thumbnail((max_width, max_height), Image.LANCZOS)
+
+        out = BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+        return out.getvalue()
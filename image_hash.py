@@ -0,0 +1,150 @@
+import itertools
+import json
+import threading
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+HASH_INDEX_FILE = 'data/image_hashes.jsonl'
+
+# Hamming distance (out of 64 bits) at or below which two photos are
+# treated as the same picture after cropping / recompression
+DEFAULT_MAX_DISTANCE = 12
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def phash(image):
+    """64-bit DCT perceptual hash of a decoded BGR/grayscale array"""
+    small = cv2.resize(_to_gray(image), (32, 32), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(np.float32(small))[:8, :8]
+    # Skip the DC term when computing the median so overall brightness doesn't matter
+    median = np.median(dct.flatten()[1:])
+    bits = (dct > median).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing for Hamming-radius lookups over 64-bit hashes.
+    The bits are split into `bands` equal bands, each with a table from band
+    value to hashes. Two hashes within distance r differ in at most r // bands
+    bits of some band (pigeonhole), so a query only probes the band values
+    that close to its own and verifies those candidates' full distance.
+    """
+
+    def __init__(self, bands=4, bits=64):
+        if bits % bands:
+            raise ValueError(f"{bits} bits don't split into {bands} equal bands")
+        self.bands = bands
+        self.band_bits = bits // bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.tables = [{} for _ in range(bands)]
+        self.items = {}  # hash -> [ids]
+        self.size = 0
+        self._flips = {}
+
+    def _band_values(self, value):
+        return [(value >> (band * self.band_bits)) & self.band_mask for band in range(self.bands)]
+
+    def _flip_masks(self, max_bits):
+        """XOR masks of up to max_bits set bits within one band"""
+        masks = self._flips.get(max_bits)
+        if masks is None:
+            masks = [0]
+            for bit_count in range(1, min(max_bits, self.band_bits) + 1):
+                masks.extend(sum(1 << bit for bit in bits)
+                             for bits in itertools.combinations(range(self.band_bits), bit_count))
+            self._flips[max_bits] = masks
+        return masks
+
+    def add(self, value, item_id):
+        self.size += 1
+        ids = self.items.get(value)
+        if ids is not None:
+            ids.append(item_id)
+            return
+        self.items[value] = [item_id]
+        for table, band_value in zip(self.tables, self._band_values(value)):
+            table.setdefault(band_value, []).append(value)
+
+    def search(self, value, max_distance):
+        """Return [(distance, item_id)] for all items within max_distance"""
+        masks = self._flip_masks(max_distance // self.bands)
+        seen = set()
+        matches = []
+        for table, band_value in zip(self.tables, self._band_values(value)):
+            for mask in masks:
+                for candidate in table.get(band_value ^ mask, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming(value, candidate)
+                    if distance <= max_distance:
+                        matches.extend((distance, item_id) for item_id in self.items[candidate])
+
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+
+class ImageHashIndex:
+    """
+    Perceptual-hash index persisted as an append-only log beside the history.
+    The multi-index tables are rebuilt from the log on startup and kept current as new
+    hashes arrive, including those appended by other worker processes.
+    """
+
+    def __init__(self, path=HASH_INDEX_FILE, max_distance=DEFAULT_MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.index = MultiIndexHash()
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._catch_up()
+
+    def _catch_up(self):
+        """Load log lines written since the last read"""
+        try:
+            with open(self.path, 'r', newline='') as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # partially written line; pick it up next time
+                    self._offset += len(line)
+                    try:
+                        record = json.loads(line)
+                        self.index.add(int(record['phash'], 16), record['assessment_id'])
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def find_matches(self, image_phash, limit=5):
+        """Nearest prior assessments whose photo looks like this one"""
+        with self._lock:
+            self._catch_up()
+            matches = self.index.search(image_phash, self.max_distance)
+        return [
+            {'assessment_id': item_id, 'distance': distance}
+            for distance, item_id in matches[:limit]
+        ]
+
+    def add(self, image_phash, assessment_id):
+        with self._lock:
+            self._catch_up()
+            line = json.dumps({'assessment_id': assessment_id, 'phash': f"{image_phash:016x}"}) + '\n'
+            with open(self.path, 'a', newline='') as f:
+                f.write(line)
+            # Re-read from the log rather than inserting directly, so lines other
+            # workers appended in the meantime are not skipped
+            self._catch_up()
@@ -0,0 +1,99 @@
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+# Long side of the copy the metrics are computed on; keeps the gate at a few ms
+ANALYSIS_SIDE = 512
+
+# (reject below/above, warn below/above) for each check
+QUALITY_THRESHOLDS = {
+    'min_width': (200, 640),
+    'min_height': (150, 480),
+    'blur_variance': (15.0, 50.0),        # Laplacian variance on the analysis copy
+    'dark_fraction': (0.60, 0.35),        # share of pixels at or below DARK_LEVEL
+    'bright_fraction': (0.50, 0.25),      # share of pixels at or above BRIGHT_LEVEL
+    'mean_brightness': (30.0, 50.0)
+}
+
+DARK_LEVEL = 15
+BRIGHT_LEVEL = 245
+
+
+def _issue(code, message, value):
+    return {'code': code, 'message': message, 'value': value}
+
+
+def assess_image_quality(image, thresholds=QUALITY_THRESHOLDS, analysis_side=ANALYSIS_SIDE):
+    """
+    Cheap quality gate run on the decoded BGR array before captioning.
+    Checks resolution, sharpness (variance of the Laplacian) and exposure
+    (histogram clipping) on a downscaled grayscale copy.
+    Returns {'passed', 'rejections', 'warnings', 'metrics'}.
+    """
+    height, width = image.shape[:2]
+    rejections = []
+    warnings = []
+
+    reject_w, warn_w = thresholds['min_width']
+    reject_h, warn_h = thresholds['min_height']
+    if width < reject_w or height < reject_h:
+        rejections.append(_issue('low_resolution', f'Image is too small ({width}x{height}); minimum is {reject_w}x{reject_h}', [width, height]))
+    elif width < warn_w or height < warn_h:
+        warnings.append(_issue('low_resolution', f'Low resolution ({width}x{height}); details may be missed', [width, height]))
+
+    # Downscale once; all remaining metrics work on this small copy. Large photos
+    # are first nearest-neighbour sampled to ~2x the analysis size (only the
+    # sampled pixels are read), then area-averaged, so a 12 MP image costs ~2 ms.
+    long_side = max(width, height)
+    small = image
+    if long_side > analysis_side * 2:
+        factor = analysis_side * 2 / long_side
+        small = cv2.resize(image, (max(1, int(width * factor)), max(1, int(height * factor))),
+                           interpolation=cv2.INTER_NEAREST)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    small_height, small_width = gray.shape[:2]
+    scale = analysis_side / max(small_width, small_height)
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, int(small_width * scale)), max(1, int(small_height * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    blur_variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    reject_blur, warn_blur = thresholds['blur_variance']
+    if blur_variance < reject_blur:
+        rejections.append(_issue('blurry', 'Image is too blurry to assess damage', round(blur_variance, 1)))
+    elif blur_variance < warn_blur:
+        warnings.append(_issue('blurry', 'Image is slightly blurry', round(blur_variance, 1)))
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    total = hist.sum() or 1.0
+    dark_fraction = float(hist[:DARK_LEVEL + 1].sum() / total)
+    bright_fraction = float(hist[BRIGHT_LEVEL:].sum() / total)
+    mean_brightness = float(np.dot(hist, np.arange(256)) / total)
+
+    reject_dark, warn_dark = thresholds['dark_fraction']
+    reject_mean, warn_mean = thresholds['mean_brightness']
+    if dark_fraction > reject_dark or mean_brightness < reject_mean:
+        rejections.append(_issue('underexposed', 'Image is too dark', round(mean_brightness, 1)))
+    elif dark_fraction > warn_dark or mean_brightness < warn_mean:
+        warnings.append(_issue('underexposed', 'Image is rather dark', round(mean_brightness, 1)))
+
+    reject_bright, warn_bright = thresholds['bright_fraction']
+    if bright_fraction > reject_bright:
+        rejections.append(_issue('overexposed', 'Image is overexposed (washed out)', round(bright_fraction, 3)))
+    elif bright_fraction > warn_bright:
+        warnings.append(_issue('overexposed', 'Large areas of the image are overexposed', round(bright_fraction, 3)))
+
+    return {
+        'passed': not rejections,
+        'rejections': rejections,
+        'warnings': warnings,
+        'metrics': {
+            'width': width,
+            'height': height,
+            'blur_variance': round(blur_variance, 1),
+            'mean_brightness': round(mean_brightness, 1),
+            'dark_fraction': round(dark_fraction, 3),
+            'bright_fraction': round(bright_fraction, 3)
+        }
+    }
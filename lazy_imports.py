@@ -0,0 +1,85 @@
+import importlib
+import importlib.util
+import threading
+import time
+
+# name -> seconds spent importing, for every lazy module loaded so far
+LOAD_TIMES = {}
+
+_registry = {}
+_lock = threading.RLock()
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module that is only imported on first attribute
+    access, e.g. ``cv2 = lazy_module('cv2')`` at the top of a file.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    LOAD_TIMES[self._name] = time.perf_counter() - start
+                    self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """Shared LazyModule for name (one per module, so load timing is counted once)"""
+    with _lock:
+        module = _registry.get(name)
+        if module is None:
+            module = _registry[name] = LazyModule(name)
+        return module
+
+
+def optional_module(name):
+    """lazy_module(name) if the package is installed, else None (checked without importing it)"""
+    try:
+        found = importlib.util.find_spec(name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        found = False
+    return lazy_module(name) if found else None
+
+
+def load_all(names=None):
+    """
+    Import the lazy modules registered so far, only those in names if given
+    (names never registered, e.g. optional packages not installed, are
+    skipped); returns {name: seconds}
+    """
+    with _lock:
+        modules = [module for name, module in _registry.items() if names is None or name in names]
+    timings = {}
+    for module in modules:
+        if not module.loaded:
+            try:
+                module._load()
+            except ImportError as e:
+                print(f"DEBUG: could not preload {module._name}: {e}")
+                continue
+            timings[module._name] = LOAD_TIMES[module._name]
+    return timings
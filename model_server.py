@@ -0,0 +1,425 @@
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from description_generator import DescriptionGenerator
+from lazy_imports import lazy_module
+from scoring_rules import default_store
+
+np = lazy_module('numpy')
+
+DEFAULT_SOCKET = '/tmp/claim_model_server.sock'
+MAX_BATCH = 16
+BATCH_WINDOW = 0.005     # seconds to wait for more requests before running a batch
+WORKERS = min(4, os.cpu_count() or 1)   # threads for caption / damage map / enhance requests
+CLIENT_TIMEOUT = 30.0
+RETRY_INTERVAL = 30.0    # how long a client stays in fallback mode after the sidecar fails
+
+_HEADER = struct.Struct('>I')
+
+
+class ModelServerUnavailable(RuntimeError):
+    """Raised by the client when the sidecar cannot be reached"""
+
+
+def _send(sock, message):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def _attach_image(spec):
+    """Map an image the client placed in shared memory; no bytes cross the socket"""
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    # The client owns the block; stop this process's tracker from unlinking it
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    image = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+    return shm, image
+
+
+class ModelServer:
+    """
+    Hosts one ImageCaptioner and DescriptionGenerator for every web worker.
+    Connections are handled on threads and feed a single batch thread:
+    requests that arrive within BATCH_WINDOW of each other are coalesced.
+    Score requests are merged into one score_batch call, and enhance
+    requests (the scoring part of every upload) into one enhance_batch
+    call. Damage maps are not batched: each is cv2 work on its own image
+    size, with nothing shared to stack, so they run on a pool of `workers`
+    threads (cv2 releases the GIL) next to the batch, together with the
+    filename-only caption requests.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW, workers=WORKERS):
+        from image_captioner import ImageCaptioner
+
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.captioner = ImageCaptioner()
+        self.desc_generator = DescriptionGenerator()
+        self.pending = queue.Queue()
+        self.workers = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='model-worker')
+        self.started = time.time()
+        self.stats = {'requests': 0, 'batches': 0, 'batched_requests': 0, 'errors': 0, 'max_batch_seen': 0}
+        self._stats_lock = threading.Lock()
+
+    def health(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'queue_depth': self.pending.qsize(),
+            'avg_batch_size': round(stats['batched_requests'] / stats['batches'], 2) if stats['batches'] else 0.0
+        })
+        return stats
+
+    def submit(self, message):
+        """Queue a request for the batch thread and wait for its result"""
+        job = {'message': message, 'done': threading.Event(), 'reply': None}
+        self.pending.put(job)
+        job['done'].wait()
+        return job['reply']
+
+    def _collect_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_one(self, message):
+        op = message['op']
+        if op == 'caption':
+            # Captions only look at the filename, so no image is sent
+            return self.captioner.caption_from_filename(message.get('filename', ''))
+        if op == 'damage_map':
+            shm, image = _attach_image(message['image'])
+            try:
+                return self.captioner.generate_damage_map(image, **message.get('options', {}))
+            finally:
+                del image
+                shm.close()
+        raise ValueError(f'unknown op: {op}')
+
+    def _run_scores(self, jobs):
+        """Merge every score request in the batch into one vectorized call"""
+        captions, damage_types = [], []
+        for job in jobs:
+            captions.extend(job['message']['captions'])
+            damage_types.extend(job['message']['damage_types'])
+        scored = self.desc_generator.score_batch(captions, damage_types)
+        start = 0
+        for job in jobs:
+            end = start + len(job['message']['captions'])
+            job['reply'] = {'ok': True, 'result': {
+                'severity_score': scored['severity_score'][start:end].tolist(),
+                'severity_level': scored['severity_level'][start:end].tolist(),
+                'rules_version': scored['rules_version']
+            }}
+            start = end
+
+    def _run_enhances(self, jobs):
+        """Merge every enhance request in the batch into one enhance_batch call"""
+        results = self.desc_generator.enhance_batch([
+            (job['message']['caption'], job['message']['damage_type'], job['message'].get('user_data'),
+             job['message'].get('damage_map'))
+            for job in jobs
+        ])
+        for job, result in zip(jobs, results):
+            job['reply'] = {'ok': True, 'result': result}
+
+    def _finish(self, job):
+        if not job['reply']['ok']:
+            with self._stats_lock:
+                self.stats['errors'] += 1
+        job['done'].set()
+
+    def _run_job(self, job):
+        try:
+            job['reply'] = {'ok': True, 'result': self._run_one(job['message'])}
+        except Exception as e:
+            job['reply'] = {'ok': False, 'error': str(e)}
+        self._finish(job)
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            with self._stats_lock:
+                self.stats['batches'] += 1
+                self.stats['batched_requests'] += len(batch)
+                self.stats['max_batch_seen'] = max(self.stats['max_batch_seen'], len(batch))
+
+            merged = {'score': [], 'enhance': []}
+            for job in batch:
+                if job['message']['op'] in merged:
+                    merged[job['message']['op']].append(job)
+                else:
+                    self.workers.submit(self._run_job, job)
+
+            for jobs, run in ((merged['score'], self._run_scores), (merged['enhance'], self._run_enhances)):
+                if not jobs:
+                    continue
+                try:
+                    run(jobs)
+                except Exception as e:
+                    for job in jobs:
+                        job['reply'] = {'ok': False, 'error': str(e)}
+                for job in jobs:
+                    self._finish(job)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        server_ref = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        message = _recv(self.request)
+                    except (ConnectionError, OSError, ValueError):
+                        return
+                    if message.get('op') == 'health':
+                        reply = {'ok': True, 'result': server_ref.health()}
+                    else:
+                        with server_ref._stats_lock:
+                            server_ref.stats['requests'] += 1
+                        reply = server_ref.submit(message)
+                    _send(self.request, reply)
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 128  # every web worker thread may connect at once
+
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        with Server(self.socket_path, Handler) as server:
+            print(f"✅ Model server listening on {self.socket_path} (pid {os.getpid()})")
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(self.socket_path)
+
+
+class ModelClient:
+    """
+    Web-worker side of the sidecar. Keeps one connection per thread and puts
+    image arrays in shared memory so only a small JSON header is sent.
+    Any failure raises ModelServerUnavailable and suppresses retries for
+    RETRY_INTERVAL seconds so callers can fall back to local inference.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=CLIENT_TIMEOUT, retry_interval=RETRY_INTERVAL):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def call(self, message, image=None):
+        # Health checks always go through, so they can bring the sidecar back early
+        if not self.available and message.get('op') != 'health':
+            raise ModelServerUnavailable('model server marked down')
+
+        shm = None
+        try:
+            if image is not None:
+                image = np.ascontiguousarray(image)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+                np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+                message = dict(message, image={'name': shm.name, 'shape': list(image.shape), 'dtype': image.dtype.str})
+            sock = self._connection()
+            _send(sock, message)
+            reply = _recv(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            self._drop_connection()
+            self._down_until = time.monotonic() + self.retry_interval
+            print("DEBUG: model server unavailable, using in-process models:", str(e))
+            raise ModelServerUnavailable(str(e))
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        self._down_until = 0.0
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error', 'model server error'))
+        return reply['result']
+
+    def health(self):
+        return self.call({'op': 'health'})
+
+
+class _LocalFallback:
+    """Builds the in-process models only if the sidecar is ever unavailable"""
+
+    def __init__(self):
+        self._models = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._models is None:
+                from image_captioner import ImageCaptioner
+                self._models = (ImageCaptioner(), DescriptionGenerator())
+        return self._models
+
+
+class RemoteCaptioner:
+    """Drop-in for ImageCaptioner that runs on the model server"""
+
+    def __init__(self, client, fallback):
+        self.client = client
+        self.fallback = fallback
+
+    def generate_caption(self, image_path, image=None):
+        if image is None:
+            return self.fallback.get()[0].generate_caption(image_path)
+        try:
+            # The caption comes from the filename; only the damage map needs the pixels
+            return self.client.call({'op': 'caption', 'filename': os.path.basename(str(image_path))})
+        except ModelServerUnavailable:
+            return self.fallback.get()[0].generate_caption(image_path, image=image)
+
+    def generate_damage_map(self, image, **options):
+        try:
+            return self.client.call({'op': 'damage_map', 'options': options}, image=image)
+        except ModelServerUnavailable:
+            return self.fallback.get()[0].generate_damage_map(image, **options)
+
+
+class RemoteDescriptionGenerator:
+    """
+    Drop-in for DescriptionGenerator: scoring runs on the model server. Only
+    the compiled rules (the process-wide rules store) and the helpers that
+    read nothing but them stay local; video keyframe aggregation uses those
+    to turn per-frame results into the claim report.
+    """
+
+    determine_severity_level = DescriptionGenerator.determine_severity_level
+    estimate_cost = DescriptionGenerator.estimate_cost
+    cost_fields = staticmethod(DescriptionGenerator.cost_fields)
+    create_enhanced_report = DescriptionGenerator.create_enhanced_report
+
+    def __init__(self, client, fallback):
+        self.client = client
+        self.fallback = fallback
+        self._rules = default_store()
+
+    @property
+    def rules(self):
+        return self._rules.get()
+
+    def enhance_description_with_features(self, image_caption, damage_type, user_data=None, damage_map=None):
+        try:
+            return self.client.call({
+                'op': 'enhance', 'caption': image_caption, 'damage_type': damage_type,
+                'user_data': user_data, 'damage_map': damage_map
+            })
+        except ModelServerUnavailable:
+            return self.fallback.get()[1].enhance_description_with_features(
+                image_caption, damage_type, user_data, damage_map=damage_map
+            )
+
+    def score_batch(self, captions, damage_types, seed=None):
+        if seed is not None:
+            # Seeded scoring must be reproducible, so keep it in-process
+            return self.fallback.get()[1].score_batch(captions, damage_types, seed=seed)
+        try:
+            result = self.client.call({'op': 'score', 'captions': list(captions), 'damage_types': list(damage_types)})
+            return {
+                'severity_score': np.asarray(result['severity_score'], dtype=np.int64),
+                'severity_level': np.asarray(result['severity_level'], dtype=object),
+                'rules_version': result['rules_version']
+            }
+        except ModelServerUnavailable:
+            return self.fallback.get()[1].score_batch(captions, damage_types)
+
+
+def connect_models(socket_path=DEFAULT_SOCKET):
+    """Return (captioner, desc_generator) proxies backed by the model server"""
+    client = ModelClient(socket_path)
+    fallback = _LocalFallback()
+    return RemoteCaptioner(client, fallback), RemoteDescriptionGenerator(client, fallback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared captioning / scoring model server')
+    parser.add_argument('--socket', default=os.environ.get('MODEL_SERVER_SOCKET', DEFAULT_SOCKET))
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW * 1000)
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='threads for caption / damage map / enhance requests')
+    parser.add_argument('--status', action='store_true', help='print health of a running server and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        try:
+            print(json.dumps(ModelClient(args.socket).health(), indent=2))
+        except ModelServerUnavailable as e:
+            print(f"Model server not reachable at {args.socket}: {e}")
+            raise SystemExit(1)
+        return
+
+    # Exit through serve_forever's cleanup so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    ModelServer(args.socket, args.max_batch, args.batch_window_ms / 1000, args.workers).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
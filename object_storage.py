@@ -0,0 +1,432 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import parse_qs, urlparse
+
+from lazy_imports import optional_module
+
+# boto3 is optional; only needed for s3:// storage (AWS S3, MinIO, Ceph, ...)
+boto3 = optional_module('boto3')
+botocore_config = optional_module('botocore.config')
+botocore_exceptions = optional_module('botocore.exceptions')
+s3_transfer = optional_module('boto3.s3.transfer')
+
+# Optional modules s3:// storage imports on first use
+S3_MODULES = ('boto3', 'boto3.s3.transfer', 'botocore.config', 'botocore.exceptions')
+
+STORAGE_DIR = 'data/storage'
+CACHE_DIR = 'data/storage_cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+EVICT_GRACE_SECONDS = 60               # cached files used this recently are never evicted
+MAX_POOL_CONNECTIONS = 32               # pooled HTTP connections per process, shared by all threads
+MULTIPART_THRESHOLD = 16 * 1024 * 1024  # larger objects go up and down in parallel parts
+MULTIPART_CHUNK_BYTES = 16 * 1024 * 1024
+TRANSFER_CONCURRENCY = 4                # parallel parts per multipart transfer
+
+KEY_PATTERN = re.compile(r'[A-Za-z0-9_.-]+(/[A-Za-z0-9_.-]+)*')
+
+
+class ObjectNotFound(KeyError):
+    """Raised when a key does not exist in the store"""
+
+
+def check_key(key):
+    """Keys are relative, slash-separated paths of safe characters"""
+    key = str(key)
+    if not KEY_PATTERN.fullmatch(key) or any(part in ('.', '..') for part in key.split('/')):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+class ObjectStorage(ABC):
+    """
+    Blob storage shared by every app node: uploaded originals, bulk report
+    ZIPs and job status, and (with shared history) one object per history
+    entry. Keys look like paths ('uploads/<id>.jpg'). Objects handed to
+    local_path() are expected to be written once; small mutable objects
+    such as job status are read with get_bytes(), which never caches.
+    """
+
+    @abstractmethod
+    def put_bytes(self, key, data):
+        pass
+
+    @abstractmethod
+    def put_file(self, key, path, move=False):
+        """Store the file at path under key; move=True hands the file over instead of copying it"""
+
+    @abstractmethod
+    def get_bytes(self, key):
+        pass
+
+    @abstractmethod
+    def local_path(self, key):
+        """Path of a local copy of the object, e.g. for OpenCV or other path-only readers"""
+
+    def open(self, key):
+        """The object as a binary file opened for reading; the caller closes it"""
+        return open(self.local_path(key), 'rb')
+
+    @abstractmethod
+    def stat(self, key):
+        """{'size', 'mtime'} or None if the key does not exist"""
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def list(self, prefix, start_after=None):
+        """(key, size, mtime) for keys under prefix, in key order, after start_after if given"""
+
+
+class FilesystemStorage(ObjectStorage):
+    """Objects as files under root; a shared mount (NFS, EFS) makes it multi-node"""
+
+    def __init__(self, root=STORAGE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        print("✅ Filesystem storage initialized!")
+
+    def _path(self, key):
+        return os.path.join(self.root, *check_key(key).split('/'))
+
+    def _tmp_path(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def put_bytes(self, key, data):
+        path = self._path(key)
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_file(self, key, path, move=False):
+        target = self._path(key)
+        tmp_path = self._tmp_path(target)
+        if move:
+            try:
+                os.replace(path, target)
+                return
+            except OSError:
+                pass  # different filesystem: copy, then drop the original
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        if move:
+            os.remove(path)
+
+    def get_bytes(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+
+    def local_path(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            raise ObjectNotFound(key)
+        return path
+
+    def stat(self, key):
+        try:
+            st = os.stat(self._path(key))
+        except OSError:
+            return None
+        return {'size': st.st_size, 'mtime': st.st_mtime}
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix, start_after=None):
+        # Prefixes name directories ('history/'); sorted walk so keys come out in order
+        prefix = prefix.rstrip('/') + '/'
+        yield from self._walk(os.path.join(self.root, *check_key(prefix.rstrip('/')).split('/')),
+                              prefix, start_after)
+
+    def _walk(self, directory, key_prefix, start_after):
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return
+        for name in names:
+            key = key_prefix + name
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                # Skip whole subtrees that sort before start_after (e.g. earlier days)
+                if start_after and key + '/' < start_after and not start_after.startswith(key + '/'):
+                    continue
+                yield from self._walk(path, key + '/', start_after)
+            elif not name.endswith('.tmp') and (not start_after or key > start_after):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield key, st.st_size, st.st_mtime
+
+
+class DiskCache:
+    """
+    Read-through cache of remote objects on local disk, evicting the least
+    recently used files once it grows past max_bytes. Shared by the worker
+    processes of one node. A file just added or used in the last
+    EVICT_GRACE_SECONDS is never evicted, since a caller may be about to
+    open the path it was handed; the cache can run over max_bytes meanwhile.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._bytes = None          # running total, computed on first use
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name)
+
+    def get(self, key):
+        """Cached path for key, or None"""
+        path = self._path(key)
+        try:
+            os.utime(path)          # mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def fits(self, size):
+        """Whether an object of size bytes can be cached without evicting itself"""
+        return size <= self.max_bytes * 0.9
+
+    def fill(self, key, download):
+        """Cache key by calling download(tmp_path); returns the cached path"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            download(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._added(path)
+        return path
+
+    def adopt(self, key, source_path):
+        """Move a file that was just uploaded into the cache, so reading it back is free"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(source_path, path)
+        except OSError:
+            shutil.move(source_path, path)
+        self._added(path)
+
+    def discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _files(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _added(self, added_path):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            else:
+                self._bytes += os.path.getsize(added_path)
+            if self._bytes <= self.max_bytes:
+                return
+            # Down to 90% so eviction is not repeated on every fill
+            files = sorted(self._files(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            target = self.max_bytes * 0.9
+            recent = time.time() - EVICT_GRACE_SECONDS
+            for path, size, mtime in files:
+                if total <= target:
+                    break
+                if path == added_path or mtime >= recent:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._bytes = total
+
+
+class S3Storage(ObjectStorage):
+    """
+    S3-compatible object storage (AWS S3, MinIO, Ceph RGW) via boto3. One
+    client per process holds a pool of keep-alive connections shared by
+    all request threads; large files are transferred as parallel multipart
+    uploads and ranged downloads; local_path() reads through a disk cache.
+    Credentials come from the usual AWS environment variables or profile.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, cache=None,
+                 max_pool_connections=MAX_POOL_CONNECTIONS, multipart_threshold=MULTIPART_THRESHOLD,
+                 multipart_chunk_bytes=MULTIPART_CHUNK_BYTES, client=None):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for s3:// storage (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.cache = cache if cache is not None else DiskCache()
+        if client is None:
+            options = {
+                'max_pool_connections': max_pool_connections,
+                'retries': {'max_attempts': 5, 'mode': 'standard'}
+            }
+            if endpoint_url:
+                # Self-hosted stores are usually addressed by path, not bucket subdomain
+                options['s3'] = {'addressing_style': 'path'}
+            client = boto3.session.Session().client(
+                's3', endpoint_url=endpoint_url, region_name=region, config=botocore_config.Config(**options)
+            )
+        self.client = client
+        self.transfer = s3_transfer.TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunk_bytes,
+            max_concurrency=TRANSFER_CONCURRENCY
+        )
+        print("✅ S3 storage initialized!")
+
+    def _key(self, key):
+        return self.prefix + check_key(key)
+
+    @staticmethod
+    def _missing(error):
+        code = error.response.get('Error', {}).get('Code')
+        return code in ('NoSuchKey', 'NotFound', '404')
+
+    def put_bytes(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        self.cache.discard(key)
+
+    def put_file(self, key, path, move=False):
+        self.client.upload_file(path, self.bucket, self._key(key), Config=self.transfer)
+        if move:
+            self.cache.adopt(key, path)
+        else:
+            self.cache.discard(key)
+
+    def get_bytes(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except botocore_exceptions.ClientError as e:
+            if self._missing(e):
+                raise ObjectNotFound(key)
+            raise
+        with response['Body'] as body:
+            return body.read()
+
+    def local_path(self, key):
+        path = self.cache.get(key)
+        if path is not None:
+            return path
+
+        def download(tmp_path):
+            try:
+                self.client.download_file(self.bucket, self._key(key), tmp_path, Config=self.transfer)
+            except botocore_exceptions.ClientError as e:
+                if self._missing(e):
+                    raise ObjectNotFound(key)
+                raise
+
+        return self.cache.fill(key, download)
+
+    def open(self, key):
+        """
+        The object as a binary file. Objects too big for the cache are
+        downloaded into an anonymous temporary file instead, which
+        disappears when it is closed, so they never push the cache out.
+        """
+        path = self.cache.get(key)
+        if path is None:
+            stat = self.stat(key)
+            if stat is None:
+                raise ObjectNotFound(key)
+            if not self.cache.fits(stat['size']):
+                f = tempfile.TemporaryFile(dir=self.cache.cache_dir)
+                try:
+                    self.client.download_fileobj(self.bucket, self._key(key), f, Config=self.transfer)
+                    f.seek(0)
+                except BaseException:
+                    f.close()
+                    raise
+                return f
+            path = self.local_path(key)
+        return open(path, 'rb')
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except botocore_exceptions.ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+        return {'size': head['ContentLength'], 'mtime': head['LastModified'].timestamp()}
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        self.cache.discard(key)
+
+    def list(self, prefix, start_after=None):
+        options = {'Bucket': self.bucket, 'Prefix': self.prefix + prefix}
+        if start_after:
+            options['StartAfter'] = self.prefix + start_after
+        for page in self.client.get_paginator('list_objects_v2').paginate(**options):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):], item['Size'], item['LastModified'].timestamp()
+
+
+def storage_modules(url):
+    """Lazy modules the storage for a STORAGE_URL will import"""
+    return S3_MODULES if url and urlparse(url).scheme == 's3' else ()
+
+
+def open_storage(url=None, cache_dir=CACHE_DIR, cache_bytes=CACHE_MAX_BYTES):
+    """
+    Storage for a STORAGE_URL:
+      (unset)                                  local directory data/storage
+      file:///mnt/shared/claiminsight          a directory, e.g. a shared mount
+      s3://bucket/prefix?endpoint=http://minio:9000&region=us-east-1
+    """
+    if not url:
+        return FilesystemStorage(STORAGE_DIR)
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        return FilesystemStorage((parsed.netloc + parsed.path) or STORAGE_DIR)
+    if parsed.scheme == 's3':
+        query = parse_qs(parsed.query)
+        return S3Storage(
+            parsed.netloc,
+            prefix=parsed.path,
+            endpoint_url=query.get('endpoint', [None])[0],
+            region=query.get('region', [None])[0],
+            cache=DiskCache(cache_dir, cache_bytes)
+        )
+    raise ValueError(f"Unsupported STORAGE_URL scheme: {parsed.scheme!r}")
@@ -0,0 +1,163 @@
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+from claim_report import render_claim_pdf, resolve_report_fields
+
+BASELINE_FILE = 'pdf_benchmark_baseline.json'
+SAMPLE_IMAGE_DIR = 'Damage Image'
+MAX_REPORT_BYTES = 1024 * 1024    # stay well under what email gateways accept
+SIZE_TOLERANCE = 0.05             # report dates vary in length, so sizes move a little
+TIME_TOLERANCE = 0.50             # render times are noisy across machines and runs
+TIME_SLACK_MS = 20.0              # absolute allowance so millisecond-scale cases don't flake
+
+SAMPLE_DESCRIPTION = """DAMAGE ASSESSMENT REPORT
+
+DETAILED ANALYSIS:
+Water intrusion is visible across the lower panels and the interior floor. The waterline suggests the vehicle stood in moving water for several hours.
+
+Electrical components below the waterline are likely affected and should be inspected before the vehicle is started.
+
+COMPONENT BREAKDOWN:
+1. Engine compartment - water ingress
+2. Interior upholstery and carpets
+3. Electrical wiring and control modules
+4. Brake and fuel systems
+
+RECOMMENDATIONS:
+Immediate Action: Do not start the engine until it has been inspected.
+Documentation: Photograph all affected areas before any cleanup.
+Professional Inspection: Book a certified flood-damage assessor.
+Drying: Remove carpets and seats to prevent mould growth.
+
+COST ESTIMATE GUIDANCE:
+**1,20,000 - 3,50,000**
+- Parts replacement for electrical modules
+- Labour for interior strip-down and drying
+Note: Final costs depend on the inspection of the engine and electrical systems.
+"""
+
+
+def _synthetic_photo(width, height, image_format):
+    """A noisy gradient standing in for a full-resolution phone photo"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(width * height)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(base + rng.integers(-40, 40, size=base.shape), 0, 255).astype(np.uint8)
+    out = BytesIO()
+    Image.fromarray(pixels, 'RGB').save(out, format=image_format, quality=92)
+    return out.getvalue()
+
+
+def benchmark_cases(image_dir=SAMPLE_IMAGE_DIR):
+    """(name, image bytes or None) for every report shape the benchmark renders"""
+    cases = [('no_image', None)]
+    if os.path.isdir(image_dir):
+        for root, _, files in os.walk(image_dir):
+            for name in sorted(files):
+                if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        cases.append((f"sample/{name}", f.read()))
+    cases.append(('photo_4000x3000.jpg', _synthetic_photo(4000, 3000, 'JPEG')))
+    cases.append(('photo_2000x1500.png', _synthetic_photo(2000, 1500, 'PNG')))
+    return cases
+
+
+def _report_data(image_bytes):
+    data = {
+        'description': SAMPLE_DESCRIPTION,
+        'damage_type': 'Flood Damage',
+        'severity_score': 78,
+        'severity_level': 'severe',
+        'affected_components': 'Engine, Interior, Electrical systems',
+        'cost_min_paise': 12000000,
+        'cost_max_paise': 35000000,
+        'policy_holder_name': 'Benchmark Holder',
+        'state': 'Maharashtra',
+        'zip_code': '400001',
+        'damage_map': {'regions': [{'x': 0.1, 'y': 0.5, 'w': 0.5, 'h': 0.3}]}
+    }
+    if image_bytes:
+        data['image_data'] = base64.b64encode(image_bytes).decode('ascii')
+    return data
+
+
+def run_benchmark(repeat=3, optimize=True, image_dir=SAMPLE_IMAGE_DIR):
+    """{case: {'bytes', 'ms'}}; ms is the median of `repeat` renders"""
+    results = {}
+    for name, image_bytes in benchmark_cases(image_dir):
+        data = _report_data(image_bytes)
+        fields = resolve_report_fields(data)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pdf = render_claim_pdf(data, fields=fields, optimize=optimize)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {'bytes': len(pdf), 'ms': round(statistics.median(timings), 1)}
+    return results
+
+
+def compare(results, baseline, max_bytes=MAX_REPORT_BYTES,
+            size_tolerance=SIZE_TOLERANCE, time_tolerance=TIME_TOLERANCE):
+    """Regression messages for results against a baseline (empty = pass)"""
+    problems = []
+    for name, result in results.items():
+        if result['bytes'] > max_bytes:
+            problems.append(f"{name}: {result['bytes']} bytes exceeds the {max_bytes} byte limit")
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if result['bytes'] > reference['bytes'] * (1 + size_tolerance):
+            problems.append(f"{name}: size {result['bytes']} bytes vs baseline {reference['bytes']}")
+        if result['ms'] > reference['ms'] * (1 + time_tolerance) + TIME_SLACK_MS:
+            problems.append(f"{name}: render time {result['ms']} ms vs baseline {reference['ms']}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Track ClaimInsight PDF report size and render time")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline JSON to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results as the new baseline")
+    parser.add_argument('--repeat', type=int, default=3, help="Renders per case (median time is reported)")
+    parser.add_argument('--max-bytes', type=int, default=MAX_REPORT_BYTES, help="Hard per-report size limit")
+    parser.add_argument('--unoptimized', action='store_true', help="Also render without optimization, for comparison")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(repeat=args.repeat)
+    plain = run_benchmark(repeat=1, optimize=False) if args.unoptimized else {}
+
+    print(f"{'report':<28}{'bytes':>12}{'ms':>10}" + (f"{'unoptimized':>14}" if plain else ''))
+    for name, result in results.items():
+        line = f"{name:<28}{result['bytes']:>12}{result['ms']:>10}"
+        if plain:
+            line += f"{plain[name]['bytes']:>14}"
+        print(line)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline at {args.baseline}; checking the size limit only", file=sys.stderr)
+
+    problems = compare(results, baseline, max_bytes=args.max_bytes)
+    for problem in problems:
+        print(f"REGRESSION: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005    # seconds between stack samples
+MAX_OVERHEAD = 0.02         # sampling never takes more than this share of the profiled time
+MAX_SECONDS = 60
+MAX_DEPTH = 128             # frames kept per stack (innermost ones)
+MEMORY_FRAMES = 25          # traceback depth recorded by tracemalloc
+MEMORY_TOP = 30
+
+# (file name suffix, function names or None for any) -> pipeline stage. The
+# innermost match names the stage, so an image decoded while drawing a PDF
+# page is counted as image decode.
+STAGE_RULES = (
+    ('image_captioner.py', None, 'captioning'),
+    ('model_server.py', {'generate_caption', 'generate_damage_map'}, 'captioning'),
+    ('description_generator.py', {'calculate_severity_score', 'determine_severity_level', 'score_batch',
+                                  'detect_affected_components', 'estimate_cost'}, 'scoring'),
+    ('model_server.py', {'score_batch', '_run_scores'}, 'scoring'),
+    ('scoring_rules.py', {'matches', 'level_for', 'is_flood'}, 'scoring'),
+    ('cost_engine.py', None, 'scoring'),
+    ('claim_report.py', {'render_claim_pdf', 'draw_text_with_wrapping', 'draw_recommendation_item',
+                         'draw_damage_overlay'}, 'canvas page drawing'),
+    ('pdf_generator.py', None, 'canvas page drawing'),
+    (os.path.join('reportlab', 'pdfgen', 'canvas.py'), None, 'canvas page drawing'),
+    ('upload_ingest.py', {'read_upload', 'decode_image'}, 'image decode'),
+    ('image_encoding.py', None, 'image decode'),
+    (os.path.join('PIL', 'Image.py'), {'open', 'load', 'convert'}, 'image decode'),
+    (os.path.join('PIL', 'ImageFile.py'), {'load'}, 'image decode'),
+)
+
+# Memory mode: where the history and PDF code lives
+MEMORY_AREAS = {
+    'history': ('history_export.py', 'history_columns.py', 'history_cold.py', 'history_stats.py',
+                'history_search.py', 'history_sync.py', 'history_retention.py'),
+    'pdf': ('claim_report.py', 'pdf_generator.py', 'image_encoding.py', os.sep + 'reportlab' + os.sep)
+}
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this process"""
+
+    def __init__(self, message="A profile is already running in this process", status_code=409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_running = threading.Lock()
+_labels = {}
+
+
+def _stage(code):
+    for suffix, names, stage in STAGE_RULES:
+        if code.co_filename.endswith(suffix) and (names is None or code.co_name in names):
+            return stage
+    return None
+
+
+def _label(code):
+    """(frame name, stage) for a code object, cached so a sample costs a dict lookup per frame"""
+    label = _labels.get(code)
+    if label is None:
+        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        label = _labels[code] = (name, _stage(code))
+    return label
+
+
+def _stack(frame):
+    """Frame names root first, with a [stage] frame wherever the pipeline stage changes"""
+    codes = []
+    while frame is not None and len(codes) < MAX_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    names = []
+    current = None
+    for code in reversed(codes):
+        name, stage = _label(code)
+        if stage and stage != current:
+            names.append(f"[{stage}]")
+            current = stage
+        names.append(name)
+    return tuple(names)
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL, max_overhead=MAX_OVERHEAD):
+    """
+    Sample the stacks of every other thread in this process for seconds
+    (the calling thread does the sampling, so it is left out).
+    After each sample the sampler sleeps at least long enough to keep its
+    own cost under max_overhead. Returns {'samples': Counter of
+    (thread name, stack) -> count, 'sample_count', 'duration', ...}.
+    """
+    seconds = min(max(float(seconds), 0.1), MAX_SECONDS)
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        samples = Counter()
+        taken = 0
+        busy = 0.0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            before = time.perf_counter()
+            if before >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident != me:
+                    samples[(names.get(ident, f"thread-{ident}"), _stack(frame))] += 1
+            del frames, frame   # don't keep other threads' frames alive while sleeping
+            taken += 1
+            cost = time.perf_counter() - before
+            busy += cost
+            time.sleep(max(interval - cost, cost / max_overhead - cost, 0))
+        duration = time.perf_counter() - start
+    finally:
+        _running.release()
+    return {'samples': samples, 'sample_count': taken, 'duration': duration,
+            'interval': duration / taken if taken else interval, 'overhead': busy / duration if duration else 0.0}
+
+
+def to_collapsed(profile):
+    """Collapsed stacks ("thread;frame;frame count" per line) for flamegraph.pl, speedscope and others"""
+    lines = []
+    for (thread, stack), count in sorted(profile['samples'].items(), key=lambda item: -item[1]):
+        lines.append(';'.join((thread,) + stack) + f" {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(profile, name='ClaimInsight'):
+    """speedscope file format: one sampled profile per thread, weights in seconds"""
+    frames = []
+    frame_index = {}
+    threads = {}
+    for (thread, stack), count in profile['samples'].items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({'name': frame})
+            indices.append(frame_index[frame])
+        threads.setdefault(thread, []).append((indices, count * profile['interval']))
+    profiles = []
+    for thread, stacks in sorted(threads.items()):
+        total = sum(weight for _, weight in stacks)
+        profiles.append({
+            'type': 'sampled', 'name': thread, 'unit': 'seconds', 'startValue': 0, 'endValue': total,
+            'samples': [indices for indices, _ in stacks], 'weights': [weight for _, weight in stacks]
+        })
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name, 'exporter': 'ClaimInsight sampling_profiler', 'activeProfileIndex': 0,
+        'shared': {'frames': frames}, 'profiles': profiles
+    }
+
+
+def _area(traceback):
+    for frame in traceback:
+        for area, patterns in MEMORY_AREAS.items():
+            if any(pattern in frame.filename for pattern in patterns):
+                return area
+    return None
+
+
+def memory_growth(seconds, areas=None, top=MEMORY_TOP):
+    """
+    tracemalloc snapshots at the start and end of a window of seconds:
+    the allocation sites whose live memory grew the most, tagged with the
+    area (history / pdf) they belong to. areas limits the result to those.
+    Tracing is switched on only for the window unless it was already on.
+    """
+    seconds = min(max(float(seconds), 0.1), MAX_SECONDS)
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(MEMORY_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+    finally:
+        _running.release()
+
+    growth = []
+    for stat in after.compare_to(before, 'traceback'):
+        if stat.size_diff <= 0:
+            continue
+        area = _area(stat.traceback)
+        if areas and area not in areas:
+            continue
+        growth.append({
+            'area': area,
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'traceback': [f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)]
+        })
+        if len(growth) >= top:
+            break
+    return {
+        'mode': 'memory',
+        'seconds': seconds,
+        'traced_bytes': current,
+        'peak_traced_bytes': peak,
+        'tracing_was_on': not started,
+        'growth': growth
+    }
@@ -0,0 +1,508 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+
+from cost_engine import BASIS_POINTS, CostModel
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'scoring_rules.json')
+RELOAD_CHECK_SECONDS = 1.0
+IMAGE_ZONES = ('upper', 'central', 'lower')   # vertical bands of a photo, for component_zones
+MATCH_CACHE_SIZE = 4096  # captions come from a small set of templates, so most repeat
+
+# Budget for vectorized scoring: the CLI check rejects a rule set slower than this,
+# the running app only warns (timings vary with load, so they never block a reload)
+MAX_BATCH_MICROSECONDS_PER_ROW = 500.0
+
+BENCHMARK_CAPTIONS = [
+    ("Image analysis indicates possible water damage. Complete vehicle submersion detected with severe water intrusion.", "Flood"),
+    ("Image analysis indicates possible water damage. Noticeable water damage requiring professional assessment and drying.", "Water Damage"),
+    ("Image analysis indicates possible hail damage. Minor dents and scratches visible - cosmetic only.", "Hail"),
+    ("Image analysis indicates possible collision damage. Visible structural compromise requiring assessment.", "Collision"),
+    ("Image analysis indicates possible fire damage. Significant damage requiring professional assessment.", "Fire"),
+    ("Image analysis indicates visible damage to property. Several affected areas visible.", "Storm"),
+    ("Image analysis indicates possible vandalism damage. Paint or finish damage requiring minimal repair.", "Vandalism"),
+    ("visible property damage; signs of surface damage and debris", "Other")
+]
+
+
+class RulesError(ValueError):
+    """Raised when a rules file fails validation"""
+
+
+def _fail(path, message):
+    raise RulesError(f"{path}: {message}")
+
+
+def _keywords(value, path, allow_empty=False):
+    if not isinstance(value, list) or (not value and not allow_empty):
+        _fail(path, 'expected a non-empty list of keywords')
+    for i, keyword in enumerate(value):
+        if not isinstance(keyword, str) or not keyword.strip():
+            _fail(f"{path}[{i}]", 'keywords must be non-empty strings')
+        if '\x00' in keyword:
+            _fail(f"{path}[{i}]", 'keywords must not contain NUL characters')
+        if keyword != keyword.lower():
+            _fail(f"{path}[{i}]", f"'{keyword}' must be lower case (captions are matched lower-cased)")
+    return tuple(value)
+
+
+def _integer(value, path):
+    if isinstance(value, bool) or not isinstance(value, int):
+        _fail(path, 'expected an integer')
+    return value
+
+
+def _score_range(value, path):
+    if not isinstance(value, list) or len(value) != 2:
+        _fail(path, 'expected [low, high]')
+    low, high = _integer(value[0], f"{path}[0]"), _integer(value[1], f"{path}[1]")
+    if not 0 <= low <= high:
+        _fail(path, 'expected 0 <= low <= high')
+    return (low, high)
+
+
+def _weighted(value, path):
+    if not isinstance(value, list):
+        _fail(path, 'expected a list of [keyword, points]')
+    pairs = []
+    for i, pair in enumerate(value):
+        if not isinstance(pair, list) or len(pair) != 2:
+            _fail(f"{path}[{i}]", 'expected [keyword, points]')
+        keyword = _keywords([pair[0]], f"{path}[{i}][0]")[0]
+        pairs.append((keyword, _integer(pair[1], f"{path}[{i}][1]")))
+    return tuple(pairs)
+
+
+def _section(data, key, kind):
+    if key not in data:
+        _fail(key, 'missing')
+    if not isinstance(data[key], kind):
+        _fail(key, f"expected {kind.__name__}")
+    return data[key]
+
+
+def _string_lists(value, path):
+    if not isinstance(value, dict) or not value:
+        _fail(path, 'expected a non-empty object of keyword lists')
+    return {_keywords([key], path)[0]: tuple(_text_list(items, f"{path}.{key}")) for key, items in value.items()}
+
+
+def _text_list(value, path):
+    if not isinstance(value, list) or not value or not all(isinstance(v, str) and v for v in value):
+        _fail(path, 'expected a non-empty list of strings')
+    return tuple(value)
+
+
+def _match_rules(value, path, payload):
+    """[{'match': [...], payload: ...}, ...]; the last entry must be a catch-all"""
+    if not isinstance(value, list) or not value:
+        _fail(path, 'expected a non-empty list')
+    rules = []
+    for i, rule in enumerate(value):
+        if not isinstance(rule, dict):
+            _fail(f"{path}[{i}]", 'expected an object')
+        rules.append((_keywords(rule.get('match'), f"{path}[{i}].match", allow_empty=True), payload(rule, f"{path}[{i}]")))
+    if rules[-1][0]:
+        _fail(path, 'the last entry must have an empty match list (catch-all)')
+    return tuple(rules)
+
+
+def _tiers(value, path):
+    """[{'keywords': [...], 'descriptors': [...]}, ...]; the last tier is the catch-all"""
+    if not isinstance(value, list) or not value:
+        _fail(path, 'expected a non-empty list of tiers')
+    tiers = []
+    for i, tier in enumerate(value):
+        if not isinstance(tier, dict):
+            _fail(f"{path}[{i}]", 'expected an object')
+        tiers.append((
+            _keywords(tier.get('keywords'), f"{path}[{i}].keywords", allow_empty=True),
+            _text_list(tier.get('descriptors'), f"{path}[{i}].descriptors")
+        ))
+    if tiers[-1][0]:
+        _fail(path, 'the last tier must have an empty keywords list (catch-all)')
+    return tuple(tiers)
+
+
+class CompiledRules:
+    """
+    Immutable, validated rule set. Tables are tuples; every keyword the scorer
+    looks for is deduplicated into one vocabulary with a column per keyword,
+    and the per-table column/points lists used by score_batch are built once
+    here instead of on every call.
+    """
+
+    def __init__(self, data, source=None):
+        if not isinstance(data, dict):
+            _fail('rules', 'expected a JSON object')
+        self.source = source
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        self.version = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+        self.loaded_at = time.time()
+        self.benchmark = None
+
+        # Severity scoring
+        bands = _section(data, 'severity_bands', list)
+        self.severity_bands = tuple(
+            (_integer(band[0], f"severity_bands[{i}][0]"), str(band[1])) if isinstance(band, list) and len(band) == 2
+            else _fail(f"severity_bands[{i}]", 'expected [minimum score, level]')
+            for i, band in enumerate(bands)
+        )
+        minimums = [minimum for minimum, _ in self.severity_bands]
+        if not minimums or minimums != sorted(minimums, reverse=True) or len(set(minimums)) != len(minimums):
+            _fail('severity_bands', 'minimum scores must be strictly descending')
+        self.default_level = _section(data, 'default_level', str)
+        self.levels = tuple(level for _, level in self.severity_bands) + (self.default_level,)
+
+        self.default_base_score = _integer(data.get('default_base_score'), 'default_base_score')
+        self.base_scores = _weighted(_section(data, 'base_scores', list), 'base_scores')
+        self.flood_damage_words = _keywords(data.get('flood_damage_words'), 'flood_damage_words')
+
+        flood = _section(data, 'flood_severity_indicators', dict)
+        self.flood_severity_indicators = {
+            tier: _weighted(flood.get(tier, []), f"flood_severity_indicators.{tier}")
+            for tier in ('severe', 'moderate', 'minor')
+        }
+        severity = _section(data, 'severity_indicators', dict)
+        self.severity_indicators = {
+            tier: _weighted(severity.get(tier, []), f"severity_indicators.{tier}")
+            for tier in ('minor', 'moderate', 'severe')
+        }
+        self.extent_indicators = _weighted(_section(data, 'extent_indicators', list), 'extent_indicators')
+        self.urgency_indicators = _weighted(_section(data, 'urgency_indicators', list), 'urgency_indicators')
+        self.flood_context_adjustments = tuple(
+            (_keywords(item[0], f"flood_context_adjustments[{i}][0]"), _integer(item[1], f"flood_context_adjustments[{i}][1]"))
+            if isinstance(item, list) and len(item) == 2
+            else _fail(f"flood_context_adjustments[{i}]", 'expected [keywords, points]')
+            for i, item in enumerate(_section(data, 'flood_context_adjustments', list))
+        )
+
+        bias = _section(data, 'flood_bias', dict)
+        self.flood_boost_chance = _integer(bias.get('boost_chance'), 'flood_bias.boost_chance')
+        self.flood_boost_range = _score_range(bias.get('boost_range'), 'flood_bias.boost_range')
+        self.flood_minimum_score = _integer(bias.get('minimum_score'), 'flood_bias.minimum_score')
+        self.flood_minimum_range = _score_range(bias.get('minimum_range'), 'flood_bias.minimum_range')
+        self.flood_severe_chance = _integer(bias.get('severe_chance'), 'flood_bias.severe_chance')
+        self.flood_severe_range = _score_range(bias.get('severe_range'), 'flood_bias.severe_range')
+        self.flood_moderate_floor_range = _score_range(bias.get('moderate_floor_range'), 'flood_bias.moderate_floor_range')
+        self.flood_moderate_cap_range = _score_range(bias.get('moderate_cap_range'), 'flood_bias.moderate_cap_range')
+        for name in ('boost_chance', 'severe_chance'):
+            if not 0 <= bias[name] <= 100:
+                _fail(f"flood_bias.{name}", 'expected a percentage 0-100')
+
+        dents = _section(data, 'dent_adjustments', dict)
+        self.small_dent_phrases = _keywords(dents.get('small_phrases'), 'dent_adjustments.small_phrases')
+        self.large_dent_phrases = _keywords(dents.get('large_phrases'), 'dent_adjustments.large_phrases')
+        self.small_dent_points = _integer(dents.get('small'), 'dent_adjustments.small')
+        self.large_dent_points = _integer(dents.get('large'), 'dent_adjustments.large')
+        self.other_dent_points = _integer(dents.get('other'), 'dent_adjustments.other')
+        scratches = _section(data, 'scratch_adjustments', dict)
+        self.deep_scratch_phrases = _keywords(scratches.get('deep_phrases'), 'scratch_adjustments.deep_phrases')
+        self.deep_scratch_points = _integer(scratches.get('deep'), 'scratch_adjustments.deep')
+        self.other_scratch_points = _integer(scratches.get('other'), 'scratch_adjustments.other')
+
+        # Repair guidance and costs, keyed by severity level
+        self.repair_levels = dict(_section(data, 'repair_levels', dict))
+        self.cost_model = self._compile_costs(_section(data, 'costs', dict))
+        for key, table in (('repair_levels', self.repair_levels), ('costs.severity_base_paise', self.cost_model.severity_base)):
+            missing = [level for level in self.levels if level not in table]
+            if missing:
+                _fail(key, f"no entry for level(s) {', '.join(missing)}")
+        # Unadjusted display strings, for callers that only need a label
+        self.cost_ranges = self.cost_model.display_ranges()
+
+        def fallback_payload(rule, path):
+            if 'choices' not in rule:
+                return _integer(rule.get('score'), f"{path}.score")
+            if not isinstance(rule['choices'], list) or not rule['choices']:
+                _fail(f"{path}.choices", 'expected a non-empty list of scores')
+            return tuple(_integer(v, f"{path}.choices[{i}]") for i, v in enumerate(rule['choices']))
+        self.fallback_scores = _match_rules(_section(data, 'fallback_scores', list), 'fallback_scores', fallback_payload)
+
+        # Component detection
+        self.component_keywords = {
+            key: _keywords(words, f"component_keywords.{key}")
+            for key, words in _section(data, 'component_keywords', dict).items()
+        }
+        # Where in a photo each component usually shows; damage map regions in
+        # a zone put its components first (optional, older rule files have none)
+        zones = data.get('component_zones', {})
+        if not isinstance(zones, dict) or set(zones) - set(IMAGE_ZONES):
+            _fail('component_zones', f"expected an object with keys from {', '.join(IMAGE_ZONES)}")
+        self.component_zones = {zone: _keywords(words, f"component_zones.{zone}") for zone, words in zones.items()}
+        self.flood_component_choices = _text_list(data.get('flood_component_choices'), 'flood_component_choices')
+        self.damage_components = _string_lists(_section(data, 'damage_components', dict), 'damage_components')
+        self.default_components = _match_rules(
+            _section(data, 'default_components', list), 'default_components',
+            lambda rule, path: _text_list(rule.get('components'), f"{path}.components")
+        )
+
+        # Filename-based captioning (ImageCaptioner)
+        captions = _section(data, 'captions', dict)
+        self.caption_damage_keywords = {
+            key: _keywords(words, f"captions.damage_keywords.{key}")
+            for key, words in _section(captions, 'damage_keywords', dict).items()
+        }
+        self.caption_flood_types = _keywords(captions.get('flood_damage_types'), 'captions.flood_damage_types')
+        self.caption_flood_tiers = _tiers(_section(captions, 'flood_tiers', list), 'captions.flood_tiers')
+        self.caption_tiers = _tiers(_section(captions, 'tiers', list), 'captions.tiers')
+
+        self._compile_vocabulary()
+
+    @staticmethod
+    def _compile_costs(costs):
+        severity_base = {
+            str(level): _score_range(bounds, f"costs.severity_base_paise.{level}")
+            for level, bounds in _section(costs, 'severity_base_paise', dict).items()
+        }
+        extras = []
+        for i, extra in enumerate(_section(costs, 'component_extras_paise', list)):
+            if not isinstance(extra, dict):
+                _fail(f"costs.component_extras_paise[{i}]", 'expected an object')
+            extras.append((
+                _keywords(extra.get('match'), f"costs.component_extras_paise[{i}].match"),
+                _score_range(extra.get('range'), f"costs.component_extras_paise[{i}].range")
+            ))
+
+        labour_share = _integer(costs.get('labour_share_bp'), 'costs.labour_share_bp')
+        if not 0 <= labour_share <= BASIS_POINTS:
+            _fail('costs.labour_share_bp', f"expected 0-{BASIS_POINTS} basis points")
+        rounding = _integer(costs.get('rounding_paise'), 'costs.rounding_paise')
+        if rounding < 1:
+            _fail('costs.rounding_paise', 'expected a positive integer')
+
+        regional = _section(costs, 'regional_multipliers_bp', dict)
+
+        def multiplier(value, path):
+            if _integer(value, path) <= 0:
+                _fail(path, 'expected a positive multiplier in basis points (10000 = 1.0x)')
+            return value
+
+        states = {}
+        for state, value in _section(regional, 'states', dict).items():
+            states[_keywords([state], 'costs.regional_multipliers_bp.states')[0]] = \
+                multiplier(value, f"costs.regional_multipliers_bp.states.{state}")
+        zips = {}
+        for prefix, value in _section(regional, 'zip_prefixes', dict).items():
+            if not prefix.isdigit():
+                _fail(f"costs.regional_multipliers_bp.zip_prefixes.{prefix}", 'zip prefixes must be digits')
+            zips[prefix] = multiplier(value, f"costs.regional_multipliers_bp.zip_prefixes.{prefix}")
+
+        return CostModel(
+            severity_base, tuple(extras), labour_share, rounding,
+            multiplier(regional.get('default'), 'costs.regional_multipliers_bp.default'), states, zips
+        )
+
+    def _compile_vocabulary(self):
+        vocabulary = {}
+
+        def column(keyword):
+            return vocabulary.setdefault(keyword, len(vocabulary))
+
+        self.flood_weight_columns = tuple(
+            (column(k), p) for tier in ('severe', 'moderate', 'minor') for k, p in self.flood_severity_indicators[tier]
+        )
+        self.severity_weight_columns = tuple(
+            (column(k), p) for tier in ('minor', 'moderate', 'severe') for k, p in self.severity_indicators[tier]
+        )
+        self.extent_columns = tuple((column(k), p) for k, p in self.extent_indicators)
+        self.urgency_columns = tuple((column(k), p) for k, p in self.urgency_indicators)
+        self.context_columns = tuple(([column(k) for k in keywords], p) for keywords, p in self.flood_context_adjustments)
+        self.dent_column = column('dent')
+        self.small_dent_columns = tuple(column(k) for k in self.small_dent_phrases)
+        self.large_dent_columns = tuple(column(k) for k in self.large_dent_phrases)
+        self.scratch_column = column('scratch')
+        self.deep_scratch_columns = tuple(column(k) for k in self.deep_scratch_phrases)
+        self.vocabulary = vocabulary
+        self._keyword_tuple = tuple(vocabulary)
+        self._match_cache = {}
+
+    def matches(self, text_lower):
+        """Set of scoring keywords present in text; each distinct keyword is tested once"""
+        hits = self._match_cache.get(text_lower)
+        if hits is None:
+            hits = frozenset(keyword for keyword in self._keyword_tuple if keyword in text_lower)
+            if len(self._match_cache) >= MATCH_CACHE_SIZE:
+                self._match_cache.clear()
+            self._match_cache[text_lower] = hits
+        return hits
+
+    def level_for(self, score):
+        """Severity level for a 0-100 score"""
+        for minimum, level in self.severity_bands:
+            if score >= minimum:
+                return level
+        return self.default_level
+
+    def is_flood(self, damage_type_lower):
+        return any(word in damage_type_lower for word in self.flood_damage_words)
+
+    def summary(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.loaded_at)),
+            'keywords': len(self.vocabulary),
+            'benchmark': self.benchmark
+        }
+
+
+def benchmark_rules(rules, rows=2000):
+    """
+    Score a synthetic batch with the candidate rules. Catches rules that are
+    valid JSON but break scoring, and measures cost per row.
+    """
+    from description_generator import DescriptionGenerator
+
+    generator = DescriptionGenerator(seed=0, rules=rules, quiet=True)
+    captions = [BENCHMARK_CAPTIONS[i % len(BENCHMARK_CAPTIONS)][0] + f" Ref {i}." for i in range(rows)]
+    damage_types = [BENCHMARK_CAPTIONS[i % len(BENCHMARK_CAPTIONS)][1] for i in range(rows)]
+
+    start = time.perf_counter()
+    result = generator.score_batch(captions, damage_types)
+    elapsed = time.perf_counter() - start
+
+    scores = result['severity_score']
+    if int(scores.min()) < 0 or int(scores.max()) > 100:
+        raise RulesError('benchmark: scores outside 0-100')
+    unknown = set(result['severity_level'].tolist()) - set(rules.levels)
+    if unknown:
+        raise RulesError(f"benchmark: unexpected severity levels {sorted(unknown)}")
+    for caption, damage_type in BENCHMARK_CAPTIONS:
+        generator.detect_affected_components(caption, damage_type)
+
+    per_row = elapsed / rows * 1e6
+    return {'rows': rows, 'seconds': round(elapsed, 4), 'microseconds_per_row': round(per_row, 2)}
+
+
+def load_rules(path=RULES_FILE, max_microseconds_per_row=MAX_BATCH_MICROSECONDS_PER_ROW, strict=False):
+    """
+    Read, validate, compile and benchmark a rules file; raises RulesError if
+    unusable. Going over the time budget only adds a warning to the benchmark
+    summary, unless strict (the CLI check) is set.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulesError(f"{path}: {e}")
+
+    rules = CompiledRules(data, source=path)
+    rules.benchmark = benchmark_rules(rules)
+    if rules.benchmark['microseconds_per_row'] > max_microseconds_per_row:
+        message = (f"benchmark: {rules.benchmark['microseconds_per_row']}us per row exceeds "
+                   f"{max_microseconds_per_row}us budget")
+        if strict:
+            raise RulesError(message)
+        rules.benchmark['warning'] = message
+        print(f"DEBUG: scoring rules {rules.version}: {message}")
+    return rules
+
+
+class RulesStore:
+    """
+    Holds the active CompiledRules and hot-reloads it when the file changes.
+    A background thread checks the file's mtime every check_interval seconds
+    and recompiles there, so readers only ever take the current reference.
+    New rules are published by a single attribute swap only after they
+    validate and score the benchmark batch correctly; a slow benchmark is
+    only a warning. A broken edit leaves the previous rules active and is
+    reported in last_error.
+    """
+
+    def __init__(self, path=RULES_FILE, check_interval=RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self.last_error = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._mtime = self._file_mtime()
+        self.current = load_rules(path)
+        self._start_watcher()
+        # Threads don't survive fork, so a store created before a pre-fork
+        # server forks starts its watcher again in each worker
+        store = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: store() is not None and store()._start_watcher())
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _start_watcher(self):
+        if self.check_interval and not self._stop.is_set():
+            threading.Thread(target=self._watch, name='rules-reload', daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"DEBUG: scoring rules check failed: {e}")
+
+    def check(self):
+        """Reload if the file changed since the last check; True if new rules were published"""
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        return self.reload()
+
+    def close(self):
+        """Stop the background checks"""
+        self._stop.set()
+
+    def get(self):
+        return self.current
+
+    def reload(self):
+        with self._reload_lock:
+            try:
+                rules = load_rules(self.path)
+            except RulesError as e:
+                self.last_error = str(e)
+                print(f"DEBUG: scoring rules reload rejected, keeping {self.current.version}: {e}")
+                return False
+            if rules.version != self.current.version:
+                print(f"DEBUG: scoring rules {self.current.version} -> {rules.version}")
+            self.current = rules
+            self.last_error = None
+            return True
+
+    def summary(self):
+        summary = self.current.summary()
+        summary['last_error'] = self.last_error
+        return summary
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    """Process-wide store for RULES_FILE, shared by ImageCaptioner and DescriptionGenerator"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RulesStore(RULES_FILE)
+        return _default_store
+
+
+def main():
+    """Validate and benchmark a rules file before deploying it; fails if over the time budget"""
+    path = sys.argv[1] if len(sys.argv) > 1 else RULES_FILE
+    try:
+        rules = load_rules(path, strict=True)
+    except RulesError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(json.dumps(rules.summary(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
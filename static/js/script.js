@@ -70,23 +70,44 @@ function handleFileSelect(e) {
     }
 }
 
+// Accepted uploads; the limits match MAX_IMAGE_BYTES / MAX_VIDEO_BYTES on the server
+const IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif'];
+const VIDEO_TYPES = ['video/mp4', 'video/quicktime'];
+const MAX_IMAGE_BYTES = 16 * 1024 * 1024;
+const MAX_VIDEO_BYTES = 200 * 1024 * 1024;
+
+function isVideoFile(file) {
+    return VIDEO_TYPES.includes(file.type);
+}
+
 function handleFiles(file) {
     // Validate file type
-    const validTypes = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif'];
-    if (!validTypes.includes(file.type)) {
-        showError('Please select a valid image file (JPEG, PNG, or GIF)');
+    const video = isVideoFile(file);
+    if (!video && !IMAGE_TYPES.includes(file.type)) {
+        showError('Please select a valid image (JPEG, PNG, or GIF) or video (MP4 or MOV) file');
         return;
     }
     
-    // Validate file size (max 16MB)
-    if (file.size > 16 * 1024 * 1024) {
-        showError('File size too large. Please select an image smaller than 16MB.');
+    // Validate file size (16MB for photos, 200MB for videos)
+    if (file.size > (video ? MAX_VIDEO_BYTES : MAX_IMAGE_BYTES)) {
+        showError(video
+            ? 'File size too large. Please select a video smaller than 200MB.'
+            : 'File size too large. Please select an image smaller than 16MB.');
         return;
     }
     
     // Display file name
     fileName.textContent = file.name;
     
+    // Videos are not previewed; the assessment shows the keyframe it used
+    previewImage.classList.toggle('hidden', video);
+    if (video) {
+        previewContainer.classList.remove('hidden');
+        generateBtn.disabled = false;
+        hideError();
+        return;
+    }
+    
     // Preview image
     const reader = new FileReader();
     reader.onload = function(e) {
@@ -114,7 +135,7 @@ async function processImage() {
     const zipCode = document.getElementById('zipCode').value || '';
     
     if (!file) {
-        showError('Please select an image file first.');
+        showError('Please select an image or video file first.');
         return;
     }
     
@@ -139,12 +160,26 @@ async function processImage() {
     formData.append('zip_code', zipCode);
     
     try {
-        const response = await fetch('/upload', {
-            method: 'POST',
-            body: formData
-        });
-        
-        const data = await response.json();
+        let data;
+        if (canUploadInChunks(file)) {
+            data = await uploadResumable(file, {
+                damage_type: damageType,
+                custom_damage: customDamage,
+                policy_holder_name: policyHolderName,
+                contact_email: contactEmail,
+                contact_phone: contactPhone,
+                property_address: propertyAddress,
+                city: city,
+                state: state,
+                zip_code: zipCode
+            });
+        } else {
+            const response = await fetch('/upload', {
+                method: 'POST',
+                body: formData
+            });
+            data = await response.json();
+        }
         
         if (data.success) {
             // Store the complete result data globally
@@ -266,12 +301,15 @@ async function downloadPDF() {
         // Prepare all data for PDF generation
         const pdfData = {
             description: currentResultData.loss_description,
+            description_sections: currentResultData.description_sections || null,
             damage_type: currentResultData.damage_type,
             severity_score: currentResultData.severity_score,
             severity_level: currentResultData.severity_level,
             affected_components: currentResultData.affected_components,
             repair_level: currentResultData.repair_level,
             cost_range: currentResultData.cost_range,
+            cost_min_paise: currentResultData.cost_min_paise ?? null,
+            cost_max_paise: currentResultData.cost_max_paise ?? null,
             policy_holder_name: currentResultData.policy_holder_name || '',
             contact_info: formatContactInfo(currentResultData.contact_email, currentResultData.contact_phone),
             location: formatLocation(
@@ -280,7 +318,8 @@ async function downloadPDF() {
                 currentResultData.state,
                 currentResultData.zip_code
             ),
-            image_data: currentResultData.image_data
+            image_data: currentResultData.image_data,
+            damage_map: currentResultData.damage_map || null
         };
         
         console.log('Sending PDF data:', pdfData);
@@ -349,6 +388,93 @@ function hideError() {
     errorAlert.classList.add('hidden');
 }
 
+// Resumable chunked upload (/api/uploads) for videos and large photos on unreliable networks
+const CHUNKED_UPLOAD_THRESHOLD = 2 * 1024 * 1024;
+const CHUNK_SIZE = 1024 * 1024;
+const PARALLEL_CHUNKS = 3;
+const CHUNK_RETRIES = 5;
+
+function canUploadInChunks(file) {
+    // Videos always go in chunks, so a dropped connection doesn't restart the whole upload
+    return (isVideoFile(file) || file.size > CHUNKED_UPLOAD_THRESHOLD) && window.crypto && window.crypto.subtle;
+}
+
+async function sha256Hex(buffer) {
+    const digest = await crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadResumable(file, fields) {
+    // The session id is kept per file, so a reload or dropped connection resumes where it stopped
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let status = null;
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        const response = await fetch(`/api/uploads/${savedId}`);
+        if (response.ok) {
+            status = await response.json();
+        }
+    }
+    if (!status) {
+        const response = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size, chunk_size: CHUNK_SIZE, fields: fields })
+        });
+        status = await response.json();
+        if (!response.ok) {
+            throw new Error(status.error || 'Could not start upload');
+        }
+        localStorage.setItem(resumeKey, status.upload_id);
+    }
+    
+    const uploadId = status.upload_id;
+    const chunkSize = status.chunk_size;
+    const missing = status.missing.slice();
+    
+    async function sendChunk(index) {
+        const offset = index * chunkSize;
+        const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+        const checksum = await sha256Hex(chunk);
+        for (let attempt = 1; attempt <= CHUNK_RETRIES; attempt++) {
+            let response = null;
+            try {
+                response = await fetch(`/api/uploads/${uploadId}/chunks/${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+                    body: chunk
+                });
+            } catch (error) {
+                // Connection dropped; retried below
+            }
+            if (response && response.ok) {
+                return;
+            }
+            // Corrupted in transit (422) or server trouble is retried; anything else is final
+            if (response && response.status < 500 && response.status !== 422 && response.status !== 429) {
+                const data = await response.json();
+                throw new Error(data.error || 'Chunk rejected');
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+        throw new Error('Upload failed after several retries');
+    }
+    
+    async function worker() {
+        while (missing.length) {
+            await sendChunk(missing.shift());
+        }
+    }
+    await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+    
+    const response = await fetch(`/api/uploads/${uploadId}/finalize`, { method: 'POST' });
+    const data = await response.json();
+    if (response.ok) {
+        localStorage.removeItem(resumeKey);
+    }
+    return data;
+}
+
 // Custom damage type handling
 document.getElementById('damageType').addEventListener('change', function() {
     const customDamageGroup = document.getElementById('customDamageGroup');
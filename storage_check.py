@@ -0,0 +1,124 @@
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from history_export import iter_history
+from history_sync import HistorySync
+from object_storage import DiskCache, ObjectNotFound, S3Storage, open_storage
+
+BUCKET = 'claiminsight-check'
+LARGE_OBJECT_BYTES = 20 * 1024 * 1024   # over MULTIPART_THRESHOLD, so it goes up and down in parts
+SMALL_CACHE_BYTES = 1024 * 1024         # too small for the large object, to exercise the streaming path
+
+
+def _check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok   {message}")
+
+
+def check_basic(storage):
+    """put/get/stat/list/delete on small objects"""
+    storage.put_bytes('check/a.txt', b'alpha')
+    storage.put_bytes('check/b.txt', b'beta')
+    _check(storage.get_bytes('check/a.txt') == b'alpha', "get_bytes returns what put_bytes wrote")
+    stat = storage.stat('check/b.txt')
+    _check(stat is not None and stat['size'] == 4, "stat reports the object size")
+    _check(storage.stat('check/missing.txt') is None, "stat of a missing key is None")
+    keys = [key for key, _, _ in storage.list('check/')]
+    _check(keys == ['check/a.txt', 'check/b.txt'], "list returns keys in order")
+    keys = [key for key, _, _ in storage.list('check/', start_after='check/a.txt')]
+    _check(keys == ['check/b.txt'], "list honours start_after")
+    with open(storage.local_path('check/a.txt'), 'rb') as f:
+        _check(f.read() == b'alpha', "local_path is a readable copy")
+    storage.delete('check/a.txt')
+    try:
+        storage.get_bytes('check/a.txt')
+        _check(False, "get_bytes of a deleted key raises ObjectNotFound")
+    except ObjectNotFound:
+        _check(True, "get_bytes of a deleted key raises ObjectNotFound")
+
+
+def check_large(storage, work_dir):
+    """A multipart object larger than the cache is still readable"""
+    source = os.path.join(work_dir, 'large.bin')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(LARGE_OBJECT_BYTES))
+    with open(source, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    storage.put_file('check/large.bin', source)
+    _check(storage.stat('check/large.bin')['size'] == LARGE_OBJECT_BYTES, "large object uploaded in parts")
+    with storage.open('check/large.bin') as f:
+        _check(hashlib.sha256(f.read()).hexdigest() == digest, "open streams an object too big to cache")
+    path = storage.local_path('check/large.bin')
+    _check(os.path.exists(path), "local_path of an object bigger than the cache still exists")
+    with open(path, 'rb') as f:
+        _check(hashlib.sha256(f.read()).hexdigest() == digest, "local_path copy matches the upload")
+    storage.put_bytes('check/after.txt', b'after')
+    storage.local_path('check/after.txt')
+    _check(os.path.exists(path), "a recently used cached file survives the next fill")
+
+    moved = os.path.join(work_dir, 'moved.bin')
+    with open(moved, 'wb') as f:
+        f.write(os.urandom(LARGE_OBJECT_BYTES))
+    storage.put_file('check/moved.bin', moved, move=True)
+    _check(os.path.exists(storage.local_path('check/moved.bin')), "a moved upload bigger than the cache stays cached")
+
+
+def check_history_sync(storage, work_dir):
+    """Two nodes sharing one storage see each other's entries exactly once"""
+    nodes = []
+    for name in ('node1', 'node2'):
+        history_path = os.path.join(work_dir, name, 'history.json')
+        os.makedirs(os.path.dirname(history_path))
+        nodes.append(HistorySync(storage, history_path, os.path.join(work_dir, name, 'sync.json')))
+    for node in nodes:
+        node.pull()
+    nodes[0].publish({'assessment_id': 'first', 'timestamp': time.time()})
+    nodes[1].publish({'assessment_id': 'second', 'timestamp': time.time()})
+    for node in nodes:
+        node.pull()
+        node.pull()
+    for node in nodes:
+        ids = sorted(entry['assessment_id'] for entry in iter_history(node.history_path))
+        _check(ids == ['first', 'second'], f"{os.path.basename(os.path.dirname(node.history_path))} has both entries once")
+
+
+def run_checks(storage, work_dir):
+    check_basic(storage)
+    check_large(storage, work_dir)
+    check_history_sync(storage, work_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-trip checks for ClaimInsight object storage")
+    parser.add_argument('--url', help="s3:// STORAGE_URL of a scratch bucket to check; "
+                                      "without it the checks run against an in-process moto S3")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache = DiskCache(os.path.join(work_dir, 'cache'), SMALL_CACHE_BYTES)
+        if args.url:
+            storage = open_storage(args.url, cache_dir=cache.cache_dir, cache_bytes=cache.max_bytes)
+            run_checks(storage, work_dir)
+        else:
+            try:
+                from moto import mock_aws
+            except ImportError:
+                print("moto is required without --url (pip install moto)", file=sys.stderr)
+                return 2
+            for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+                os.environ.setdefault(name, 'testing')
+            with mock_aws():
+                storage = S3Storage(BUCKET, prefix='check-run', region='us-east-1', cache=cache)
+                storage.client.create_bucket(Bucket=BUCKET)
+                run_checks(storage, work_dir)
+    print("All storage checks passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
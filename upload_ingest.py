@@ -0,0 +1,108 @@
+from io import BytesIO
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+Image = lazy_module('PIL.Image')
+
+# First bytes of every format we accept
+MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif')
+]
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50 * 1000 * 1000   # ~50 MP; anything bigger is treated as a decompression bomb
+MAX_IMAGE_SIDE = 12000
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload fails validation; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_format(head):
+    """Identify the image format from its magic bytes, or None"""
+    for magic, fmt in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def read_upload(stream, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_IMAGE_PIXELS,
+                max_side=MAX_IMAGE_SIDE, chunk_size=CHUNK_SIZE):
+    """
+    Read an uploaded image stream into memory, validating as early as possible:
+    the magic bytes are checked on the first chunk, the byte size while reading,
+    and the pixel dimensions from the header before anything is decoded.
+    Nothing is written to disk, so there is nothing to clean up on failure.
+    """
+    head = stream.read(chunk_size)
+    image_format = sniff_format(head)
+    if image_format is None:
+        raise UploadRejected('Invalid image file')
+
+    buffer = BytesIO()
+    buffer.write(head)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise UploadRejected(f'File too large (max {max_bytes // (1024 * 1024)}MB)', 413)
+        buffer.write(chunk)
+    size_bytes = buffer.tell()
+
+    # Image.open only parses the header; pixel data is not decoded here
+    buffer.seek(0)
+    try:
+        with Image.open(buffer) as img:
+            width, height = img.size
+            mode = img.mode
+            try:
+                orientation = img.getexif().get(0x0112, 1)  # EXIF Orientation tag
+            except Exception:
+                orientation = 1
+    except Image.DecompressionBombError:
+        raise UploadRejected('Image dimensions too large', 413)
+    except Exception:
+        raise UploadRejected('Invalid image file')
+
+    if width <= 0 or height <= 0:
+        raise UploadRejected('Invalid image file')
+    if width > max_side or height > max_side or width * height > max_pixels:
+        raise UploadRejected(f'Image dimensions too large ({width}x{height})', 413)
+
+    return {
+        'format': image_format,
+        'width': width,
+        'height': height,
+        'mode': mode,
+        'orientation': orientation,
+        'size_bytes': size_bytes,
+        'buffer': buffer
+    }
+
+
+def decode_image(upload):
+    """Decode the in-memory upload into a BGR array without copying the bytes"""
+    data = np.frombuffer(upload['buffer'].getbuffer(), dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is not None:
+        return image
+
+    # OpenCV builds without GIF support: fall back to PIL for the first frame
+    try:
+        upload['buffer'].seek(0)
+        with Image.open(upload['buffer']) as img:
+            rgb = np.asarray(img.convert('RGB'))
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    except Exception:
+        return None
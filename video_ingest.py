@@ -0,0 +1,193 @@
+import heapq
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+
+VIDEO_EXTENSIONS = {'mp4', 'mov'}
+
+CHUNK_SIZE = 1024 * 1024
+MAX_VIDEO_BYTES = 200 * 1024 * 1024
+
+SAMPLE_FPS = 4              # frames per second actually decoded and scored
+SCENE_CHANGE_THRESHOLD = 0.35  # Bhattacharyya distance between sampled frames
+MIN_SEGMENT_SECONDS = 1.5   # ignore scene "changes" faster than this (camera shake)
+MAX_KEYFRAMES = 8
+KEYFRAME_MAX_SIDE = 1280    # keyframes are kept downscaled so memory stays bounded
+ANALYSIS_SIDE = 256
+
+
+def is_video(head):
+    """MP4 / QuickTime files carry an 'ftyp' box right after the first size field"""
+    return len(head) >= 12 and head[4:8] == b'ftyp'
+
+
+def check_video_file(path, max_bytes=MAX_VIDEO_BYTES):
+    """Apply spool_video's checks to a video that is already on disk"""
+    with open(path, 'rb') as f:
+        if not is_video(f.read(12)):
+            raise ValueError('Invalid video file')
+    if os.path.getsize(path) > max_bytes:
+        raise ValueError(f'Video too large (max {max_bytes // (1024 * 1024)}MB)')
+
+
+def spool_video(stream, max_bytes=MAX_VIDEO_BYTES, chunk_size=CHUNK_SIZE, suffix='.mp4'):
+    """
+    Copy an uploaded video to a temporary file chunk by chunk (OpenCV needs a
+    path). Memory use is one chunk; the caller must delete the returned path.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix='claim_video_')
+    try:
+        written = 0
+        with os.fdopen(fd, 'wb') as out:
+            head = stream.read(chunk_size)
+            if not is_video(head):
+                raise ValueError('Invalid video file')
+            while head:
+                written += len(head)
+                if written > max_bytes:
+                    raise ValueError(f'Video too large (max {max_bytes // (1024 * 1024)}MB)')
+                out.write(head)
+                head = stream.read(chunk_size)
+        return path
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def _downscale(frame, max_side):
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def extract_keyframes(path, max_keyframes=MAX_KEYFRAMES, sample_fps=SAMPLE_FPS,
+                      scene_threshold=SCENE_CHANGE_THRESHOLD, min_segment_seconds=MIN_SEGMENT_SECONDS):
+    """
+    Stream through a video and pick keyframes.
+    Frames between samples are grabbed but never retrieved: OpenCV's FFmpeg
+    backend still decodes them in grab(), but the colour conversion, copy
+    and analysis are skipped. Sampled frames are split into scenes by
+    colour-histogram distance; the sharpest frame (Laplacian variance) of
+    each scene is its candidate, and only the best max_keyframes candidates
+    are kept, so memory does not grow with video length. Returns keyframes
+    in time order.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('Could not open video')
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(fps / sample_fps)))
+
+        kept = []          # min-heap of (sharpness, frame_index, keyframe)
+        segment_best = None
+        segment_start = 0.0
+        previous_hist = None
+        frame_index = -1
+
+        def close_segment(candidate):
+            if candidate is None:
+                return
+            entry = (candidate['sharpness'], candidate['frame_index'], candidate)
+            if len(kept) < max_keyframes:
+                heapq.heappush(kept, entry)
+            elif entry[0] > kept[0][0]:
+                heapq.heapreplace(kept, entry)
+
+        while True:
+            if not capture.grab():
+                break
+            frame_index += 1
+            if frame_index % step:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+
+            timestamp = frame_index / fps
+            small = _downscale(frame, ANALYSIS_SIDE)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+            hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+            cv2.normalize(hist, hist)
+
+            if previous_hist is not None:
+                change = cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+                if change > scene_threshold and timestamp - segment_start >= min_segment_seconds:
+                    close_segment(segment_best)
+                    segment_best = None
+                    segment_start = timestamp
+            previous_hist = hist
+
+            if segment_best is None or sharpness > segment_best['sharpness']:
+                segment_best = {
+                    'frame_index': frame_index,
+                    'timestamp': round(timestamp, 2),
+                    'sharpness': round(sharpness, 1),
+                    'image': _downscale(frame, KEYFRAME_MAX_SIDE).copy()
+                }
+
+        close_segment(segment_best)
+    finally:
+        capture.release()
+
+    return sorted((entry[2] for entry in kept), key=lambda k: k['frame_index'])
+
+
+def assess_keyframes(keyframes, assess_frame, max_workers=4):
+    """Run assess_frame(keyframe) over all keyframes in parallel, keeping order"""
+    if not keyframes:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keyframes))) as pool:
+        return list(pool.map(assess_frame, keyframes))
+
+
+def aggregate_claim(frame_results, desc_generator, damage_type, user_data=None):
+    """
+    Combine per-frame assessments into one claim-level assessment.
+    The claim takes the worst frame's score; components are merged across
+    frames, most frequently seen first.
+    """
+    rules = desc_generator.rules
+    worst = max(frame_results, key=lambda r: r['severity_score'])
+    severity_score = worst['severity_score']
+    severity_level = desc_generator.determine_severity_level(severity_score, rules=rules)
+
+    component_counts = Counter()
+    for result in frame_results:
+        for component in str(result['affected_components']).split(','):
+            if component.strip():
+                component_counts[component.strip()] += 1
+    components = [c for c, _ in component_counts.most_common()]
+
+    cost_estimate, cost_range = desc_generator.estimate_cost(severity_level, components, user_data, rules=rules)
+    repair_level = rules.repair_levels.get(severity_level, 'Medium (functional repair)')
+    caption = (f"Walk-around video: {len(frame_results)} keyframes analysed. "
+               f"Most severe view at {worst['timestamp']}s: {worst['image_caption']}")
+
+    description, sections = desc_generator.create_enhanced_report(
+        caption, damage_type, severity_level, severity_score,
+        components, repair_level, cost_range, user_data
+    )
+    return {
+        'image_caption': caption,
+        'description': description,
+        'description_sections': sections,
+        'severity_score': severity_score,
+        'severity_level': severity_level,
+        'affected_components': ', '.join(components),
+        'repair_level': repair_level,
+        'cost_range': cost_range,
+        **desc_generator.cost_fields(cost_estimate),
+        'rules_version': rules.version,
+        'representative_frame': worst
+    }